@@ -50,6 +50,17 @@ class BaseLLMClient(abc.ABC):
         """Generate top-k tokens for the next token prediction."""
         raise NotImplementedError
 
+    async def generate_topk_per_token_batch(
+        self, texts: List[str], history: Optional[List[str]] = None, **extra: Any
+    ) -> List[List[Token]]:
+        """
+        Generate top-k tokens for the next token prediction of each text.
+        Backends that can score several prompts in one request should override this.
+        """
+        return [
+            await self.generate_topk_per_token(text, history, **extra) for text in texts
+        ]
+
     @abc.abstractmethod
     async def generate_inputs_prob(
         self, text: str, history: Optional[List[str]] = None, **extra: Any
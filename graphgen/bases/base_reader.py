@@ -1,5 +1,14 @@
+import gzip
+import io
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List
+from typing import Any, BinaryIO, Dict, Iterator, List, TextIO, Union
+
+try:
+    import zstandard
+
+    _ZSTD_AVAILABLE = True
+except ImportError:
+    _ZSTD_AVAILABLE = False
 
 
 class BaseReader(ABC):
@@ -10,7 +19,45 @@ class BaseReader(ABC):
     def __init__(self, text_column: str = "content"):
         self.text_column = text_column
 
+    @staticmethod
+    def open_file(file_path: str, mode: str = "r") -> Union[TextIO, BinaryIO]:
+        """
+        Open a file as utf-8 text, or as bytes with mode "rb",
+        decompressing .gz and .zst files on the fly.
+        """
+        if mode not in ("r", "rb"):
+            raise ValueError(
+                f"Unsupported mode: {mode}. Supported modes are: ['r', 'rb']"
+            )
+        binary = mode == "rb"
+        if file_path.endswith(".gz"):
+            if binary:
+                return gzip.open(file_path, "rb")
+            return gzip.open(file_path, "rt", encoding="utf-8")
+        if file_path.endswith(".zst"):
+            if not _ZSTD_AVAILABLE:
+                raise ImportError(
+                    f"zstandard is required to read {file_path}, "
+                    "install it with `pip install zstandard`"
+                )
+            stream = zstandard.ZstdDecompressor().stream_reader(open(file_path, "rb"))
+            if binary:
+                return stream
+            return io.TextIOWrapper(stream, encoding="utf-8")
+        if binary:
+            return open(file_path, "rb")
+        return open(file_path, "r", encoding="utf-8")
+
     @abstractmethod
+    def iter_read(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Read documents from the specified file path one at a time,
+        without loading the whole file into memory.
+
+        :param file_path: Path to the input file.
+        :return: Iterator of dictionaries containing the data.
+        """
+
     def read(self, file_path: str) -> List[Dict[str, Any]]:
         """
         Read data from the specified file path.
@@ -18,3 +65,4 @@ class BaseReader(ABC):
         :param file_path: Path to the input file.
         :return: List of dictionaries containing the data.
         """
+        return list(self.iter_read(file_path))
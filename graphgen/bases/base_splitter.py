@@ -1,8 +1,10 @@
 import copy
 import re
 from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
-from typing import Callable, Iterable, List, Literal, Optional, Union
+from itertools import accumulate
+from typing import Callable, Iterable, List, Literal, Optional, Tuple, Union
 
 from graphgen.bases.datatypes import Chunk
 from graphgen.utils import logger
@@ -50,54 +52,78 @@ class BaseSplitter(ABC):
                 chunks.append(new_chunk)
         return chunks
 
-    def _join_chunks(self, chunks: List[str], separator: str) -> Optional[str]:
-        text = separator.join(chunks)
+    def _finish_chunk(self, text: str) -> Optional[str]:
         if self.strip_whitespace:
             text = text.strip()
         if text == "":
             return None
         return text
 
-    def _merge_splits(self, splits: Iterable[str], separator: str) -> List[str]:
-        # We now want to combine these smaller pieces into medium size chunks to send to the LLM.
-        separator_len = self.length_function(separator)
+    def _join_chunks(self, chunks: Iterable[str], separator: str) -> Optional[str]:
+        return self._finish_chunk(separator.join(chunks))
 
-        chunks = []
-        current_chunk: List[str] = []
-        total = 0
-        for d in splits:
-            _len = self.length_function(d)
-            if (
-                total + _len + (separator_len if len(current_chunk) > 0 else 0)
-                > self.chunk_size
-            ):
+    def _pack(self, lengths: List[int], separator_len: int) -> List[Tuple[int, int]]:
+        """
+        Group consecutive splits of the given lengths into chunks of at most
+        chunk_size, overlapping by up to chunk_overlap.
+        A chunk is measured as the sum of its split lengths, which matters when
+        length_function counts tokens rather than characters.
+        Chunk boundaries are found by bisecting prefix sums of the lengths,
+        so the work is per chunk rather than per split.
+
+        :return: [start, end) ranges of split indices, one per chunk
+        """
+        # the splits lo..hi-1 measure cum[hi] - cum[lo] - separator_len
+        cum = [0, *accumulate(_len + separator_len for _len in lengths)]
+        ranges = []
+        lo = hi = 0
+        while True:
+            # the first split from hi on that no longer fits into the chunk
+            hi = (
+                bisect_right(cum, cum[lo] + self.chunk_size + separator_len, hi + 1) - 1
+            )
+            if hi >= len(lengths):
+                break
+            if hi > lo:
+                total = cum[hi] - cum[lo] - separator_len
                 if total > self.chunk_size:
                     logger.warning(
                         "Created a chunk of size %s, which is longer than the specified %s",
                         total,
                         self.chunk_size,
                     )
-                if len(current_chunk) > 0:
-                    chunk = self._join_chunks(current_chunk, separator)
-                    if chunk is not None:
-                        chunks.append(chunk)
-                    # Keep on popping if:
-                    # - we have a larger chunk than in the chunk overlap
-                    # - or if we still have any chunks and the length is long
-                    while total > self.chunk_overlap or (
-                        total + _len + (separator_len if len(current_chunk) > 0 else 0)
-                        > self.chunk_size
-                        and total > 0
-                    ):
-                        total -= self.length_function(current_chunk[0]) + (
-                            separator_len if len(current_chunk) > 1 else 0
-                        )
-                        current_chunk = current_chunk[1:]
-            current_chunk.append(d)
-            total += _len + (separator_len if len(current_chunk) > 1 else 0)
-        chunk = self._join_chunks(current_chunk, separator)
-        if chunk is not None:
-            chunks.append(chunk)
+                ranges.append((lo, hi))
+                # Drop splits from the start until the rest is within the
+                # chunk overlap and leaves room for split hi, or is empty
+                keep = min(
+                    self.chunk_overlap,
+                    max(self.chunk_size - lengths[hi] - separator_len, 0),
+                )
+                lo = bisect_left(cum, cum[hi] - separator_len - keep, lo, hi)
+            hi += 1
+        ranges.append((lo, len(lengths)))
+        return ranges
+
+    def _merge_splits(
+        self,
+        splits: Iterable[str],
+        separator: str,
+        lengths: Optional[List[int]] = None,
+    ) -> List[str]:
+        """
+        Merge splits into chunks of at most chunk_size.
+        The length of every split is computed once, or taken from lengths.
+        """
+        # We now want to combine these smaller pieces into medium size chunks to send to the LLM.
+        splits = list(splits)
+        if lengths is None:
+            lengths = [self.length_function(d) for d in splits]
+
+        chunks = []
+        for lo, hi in self._pack(lengths, self.length_function(separator)):
+            chunk = self._join_chunks(splits[lo:hi], separator)
+            if chunk is not None:
+                chunks.append(chunk)
         return chunks
 
     @staticmethod
@@ -54,6 +54,10 @@ class BaseKVStorage(Generic[T], StorageNameSpace):
     async def upsert(self, data: dict[str, T]):
         raise NotImplementedError
 
+    async def update(self, data: dict[str, T]):
+        """insert or overwrite, unlike upsert which keeps existing keys"""
+        raise NotImplementedError
+
     async def drop(self):
         raise NotImplementedError
 
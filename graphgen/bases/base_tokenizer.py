@@ -22,6 +22,10 @@ class BaseTokenizer(ABC):
     def count_tokens(self, text: str) -> int:
         return len(self.encode(text))
 
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """Count the tokens of many texts, implementations may batch natively."""
+        return [self.count_tokens(text) for text in texts]
+
     def chunk_by_token_size(
         self,
         content: str,
@@ -66,9 +66,21 @@ def main():
         os.path.join(working_dir, f"{unique_id}_{mode}.log"),
     )
 
-    graph_gen = GraphGen(unique_id=unique_id, working_dir=working_dir)
+    graph_gen = GraphGen(
+        unique_id=unique_id,
+        working_dir=working_dir,
+        kv_backends=config.get("storage", {}).get("kv_backends"),
+        qa_backend=config.get("storage", {}).get("qa_backend", "json"),
+        max_llm_cache_entries=config.get("llm_cache", {}).get("max_entries", 0),
+        max_llm_concurrency=config.get("max_llm_concurrency", 0),
+    )
 
-    graph_gen.insert(read_config=config["read"], split_config=config["split"])
+    graph_gen.insert(
+        read_config=config["read"],
+        split_config=config["split"],
+        extract_config=config.get("extract"),
+        dedup_config=config.get("dedup"),
+    )
 
     graph_gen.search(search_config=config["search"])
 
@@ -2,26 +2,38 @@ import asyncio
 import os
 import time
 from dataclasses import dataclass
-from typing import Dict, cast
+from itertools import islice
+from typing import Dict, List, cast
 
 import gradio as gr
 
-from graphgen.bases.base_storage import StorageNameSpace
+from graphgen.bases.base_llm_client import BaseLLMClient
+from graphgen.bases.base_storage import (
+    BaseKVStorage,
+    BaseListStorage,
+    StorageNameSpace,
+)
 from graphgen.bases.datatypes import Chunk
 from graphgen.models import (
+    AdaptiveConcurrencyLimiter,
+    HuggingFaceClient,
     JsonKVStorage,
     JsonListStorage,
+    JsonlListStorage,
+    MinHashLSH,
     NetworkXStorage,
     OpenAIClient,
+    ResponseCache,
+    SQLiteKVStorage,
     Tokenizer,
 )
 from graphgen.operators import (
     build_kg,
     chunk_documents,
     generate_cot,
+    iter_read_files,
     judge_statement,
     quiz,
-    read_files,
     search_all,
     traverse_graph_for_aggregated,
     traverse_graph_for_atomic,
@@ -36,6 +48,20 @@ from graphgen.utils import (
 
 sys_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
+_KV_STORAGES = {
+    "json": JsonKVStorage,
+    "sqlite": SQLiteKVStorage,
+}
+
+# namespaces that default to another backend than json, the extraction status
+# is written per chunk and a JSON file would be rewritten at every checkpoint
+_DEFAULT_KV_BACKENDS = {"extraction": "sqlite"}
+
+_LIST_STORAGES = {
+    "json": JsonListStorage,
+    "jsonl": JsonlListStorage,
+}
+
 
 @dataclass
 class GraphGen:
@@ -45,12 +71,34 @@ class GraphGen:
     # llm
     tokenizer_instance: Tokenizer = None
     synthesizer_llm_client: OpenAIClient = None
-    trainee_llm_client: OpenAIClient = None
+    trainee_llm_client: BaseLLMClient = None
 
     # webui
     progress_bar: gr.Progress = None
 
+    # kv storage backend per namespace, e.g. {"text_chunks": "sqlite"}, default json
+    kv_backends: Dict[str, str] = None
+    # qa storage backend, "jsonl" appends results to disk as they are produced
+    qa_backend: str = "json"
+
+    # persistent llm response cache, max_llm_cache_entries <= 0 disables it
+    max_llm_cache_entries: int = 0
+
+    # upper bound of the adaptive concurrency limit of each llm client,
+    # max_llm_concurrency <= 0 keeps the fixed per-operator concurrency
+    max_llm_concurrency: int = 0
+
     def __post_init__(self):
+        # MinHash index of the last insert with dedup enabled
+        self.dedup_index: MinHashLSH = None
+        # ids of the chunks not merged into the graph yet, loaded on first insert
+        self._unmerged_ids: set = None
+        self.llm_cache: ResponseCache = (
+            ResponseCache(self.working_dir, max_entries=self.max_llm_cache_entries)
+            if self.max_llm_cache_entries > 0
+            else None
+        )
+
         self.tokenizer_instance: Tokenizer = self.tokenizer_instance or Tokenizer(
             model_name=os.getenv("TOKENIZER_MODEL")
         )
@@ -62,47 +110,130 @@ class GraphGen:
                 api_key=os.getenv("SYNTHESIZER_API_KEY"),
                 base_url=os.getenv("SYNTHESIZER_BASE_URL"),
                 tokenizer=self.tokenizer_instance,
+                cache=self.llm_cache,
+                concurrency_limiter=self._init_concurrency_limiter(),
             )
         )
 
-        self.trainee_llm_client: OpenAIClient = self.trainee_llm_client or OpenAIClient(
-            model_name=os.getenv("TRAINEE_MODEL"),
-            api_key=os.getenv("TRAINEE_API_KEY"),
-            base_url=os.getenv("TRAINEE_BASE_URL"),
-            tokenizer=self.tokenizer_instance,
+        self.trainee_llm_client: BaseLLMClient = (
+            self.trainee_llm_client or self._init_trainee_client()
         )
 
-        self.full_docs_storage: JsonKVStorage = JsonKVStorage(
-            self.working_dir, namespace="full_docs"
-        )
-        self.text_chunks_storage: JsonKVStorage = JsonKVStorage(
-            self.working_dir, namespace="text_chunks"
-        )
+        self.full_docs_storage: BaseKVStorage = self._init_kv_storage("full_docs")
+        self.text_chunks_storage: BaseKVStorage = self._init_kv_storage("text_chunks")
+        # per-chunk extraction status, see ExtractionLog
+        self.extraction_storage: BaseKVStorage = self._init_kv_storage("extraction")
         self.graph_storage: NetworkXStorage = NetworkXStorage(
             self.working_dir, namespace="graph"
         )
-        self.search_storage: JsonKVStorage = JsonKVStorage(
-            self.working_dir, namespace="search"
-        )
-        self.rephrase_storage: JsonKVStorage = JsonKVStorage(
-            self.working_dir, namespace="rephrase"
-        )
-        self.qa_storage: JsonListStorage = JsonListStorage(
+        self.search_storage: BaseKVStorage = self._init_kv_storage("search")
+        self.rephrase_storage: BaseKVStorage = self._init_kv_storage("rephrase")
+        if self.qa_backend not in _LIST_STORAGES:
+            raise ValueError(
+                f"Unsupported qa storage backend: {self.qa_backend}. "
+                f"Supported backends are: {list(_LIST_STORAGES.keys())}"
+            )
+        self.qa_storage: BaseListStorage = _LIST_STORAGES[self.qa_backend](
             os.path.join(self.working_dir, "data", "graphgen", f"{self.unique_id}"),
             namespace="qa",
         )
 
+    def _init_trainee_client(self) -> BaseLLMClient:
+        backend = os.getenv("TRAINEE_BACKEND") or "openai"
+        if backend == "openai":
+            return OpenAIClient(
+                model_name=os.getenv("TRAINEE_MODEL"),
+                api_key=os.getenv("TRAINEE_API_KEY"),
+                base_url=os.getenv("TRAINEE_BASE_URL"),
+                batch_completions=os.getenv("TRAINEE_BATCH_COMPLETIONS", "").lower()
+                in ("1", "true"),
+                tokenizer=self.tokenizer_instance,
+                cache=self.llm_cache,
+                concurrency_limiter=self._init_concurrency_limiter(),
+            )
+        if backend == "huggingface":
+            return HuggingFaceClient(
+                model_name=os.getenv("TRAINEE_MODEL"),
+                tokenizer=self.tokenizer_instance,
+            )
+        raise ValueError(
+            f"Unsupported trainee backend: {backend}. "
+            f"Supported backends are: ['openai', 'huggingface']"
+        )
+
+    def _init_concurrency_limiter(self) -> AdaptiveConcurrencyLimiter:
+        if self.max_llm_concurrency <= 0:
+            return None
+        return AdaptiveConcurrencyLimiter(
+            initial_limit=min(20, self.max_llm_concurrency),
+            max_limit=self.max_llm_concurrency,
+        )
+
+    def _init_kv_storage(self, namespace: str) -> BaseKVStorage:
+        backend = (self.kv_backends or {}).get(
+            namespace, _DEFAULT_KV_BACKENDS.get(namespace, "json")
+        )
+        if backend not in _KV_STORAGES:
+            raise ValueError(
+                f"Unsupported kv storage backend: {backend}. "
+                f"Supported backends are: {list(_KV_STORAGES.keys())}"
+            )
+        return _KV_STORAGES[backend](self.working_dir, namespace=namespace)
+
     @async_to_sync_method
-    async def insert(self, read_config: Dict, split_config: Dict):
+    async def insert(
+        self,
+        read_config: Dict,
+        split_config: Dict,
+        extract_config: Dict = None,
+        dedup_config: Dict = None,
+    ):
         """
         insert chunks into the graph
         """
-        # Step 1: Read files
-        data = read_files(read_config["input_file"])
-        if len(data) == 0:
+        extract_config = extract_config or {}
+        dedup_index = self._init_dedup_index(dedup_config or {})
+        self.dedup_index = dedup_index or self.dedup_index
+        # Step 1: Read files, shard_size > 0 inserts the docs shard by shard
+        # so that large inputs are never held in memory at once
+        docs = iter_read_files(read_config["input_file"])
+        shard_size = read_config.get("shard_size", 0)
+        result = None
+        num_docs = 0
+        while True:
+            shard = list(islice(docs, shard_size) if shard_size > 0 else docs)
+            if not shard:
+                break
+            num_docs += len(shard)
+            logger.info("[Read] %d docs read", num_docs)
+            result = (
+                await self._insert_docs(
+                    shard, split_config, extract_config, dedup_index
+                )
+                or result
+            )
+        if num_docs == 0:
             logger.warning("No data to process")
-            return
+        return result
+
+    def _init_dedup_index(self, dedup_config: Dict) -> MinHashLSH:
+        if not dedup_config.get("enabled", False):
+            return None
+        return MinHashLSH(
+            self.working_dir,
+            threshold=dedup_config.get("threshold", 0.8),
+            num_perm=dedup_config.get("num_perm", 128),
+            num_bands=dedup_config.get("num_bands", 32),
+            shingle_size=dedup_config.get("shingle_size", 5),
+        )
 
+    async def _insert_docs(
+        self,
+        data: List[dict],
+        split_config: Dict,
+        extract_config: Dict,
+        dedup_index: MinHashLSH = None,
+    ):
         # TODO: configurable whether to use coreference resolution
 
         # Step 2: Split chunks and filter existing ones
@@ -116,33 +247,62 @@ class GraphGen:
         _add_doc_keys = await self.full_docs_storage.filter_keys(list(new_docs.keys()))
         new_docs = {k: v for k, v in new_docs.items() if k in _add_doc_keys}
 
+        inserting_chunks = {}
         if len(new_docs) == 0:
             logger.warning("All docs are already in the storage")
-            return
-        logger.info("[New Docs] inserting %d docs", len(new_docs))
-
-        inserting_chunks = await chunk_documents(
-            new_docs,
-            split_config["chunk_size"],
-            split_config["chunk_overlap"],
-            self.tokenizer_instance,
-            self.progress_bar,
-        )
+        else:
+            logger.info("[New Docs] inserting %d docs", len(new_docs))
+            inserting_chunks = await chunk_documents(
+                new_docs,
+                split_config["chunk_size"],
+                split_config["chunk_overlap"],
+                self.tokenizer_instance,
+                self.progress_bar,
+                length_unit=split_config.get("length_unit", "char"),
+                num_workers=split_config.get("num_workers", 0),
+            )
 
-        _add_chunk_keys = await self.text_chunks_storage.filter_keys(
-            list(inserting_chunks.keys())
-        )
-        inserting_chunks = {
-            k: v for k, v in inserting_chunks.items() if k in _add_chunk_keys
-        }
+            _add_chunk_keys = await self.text_chunks_storage.filter_keys(
+                list(inserting_chunks.keys())
+            )
+            inserting_chunks = {
+                k: v for k, v in inserting_chunks.items() if k in _add_chunk_keys
+            }
+            if dedup_index is not None and inserting_chunks:
+                duplicates = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    dedup_index.filter_near_duplicates,
+                    {k: v["content"] for k, v in inserting_chunks.items()},
+                )
+                if duplicates:
+                    logger.info(
+                        "[Dedup] skip %d near-duplicate chunks", len(duplicates)
+                    )
+                    inserting_chunks = {
+                        k: v for k, v in inserting_chunks.items() if k not in duplicates
+                    }
+            if len(inserting_chunks) == 0:
+                logger.warning("All chunks are already in the storage")
 
-        if len(inserting_chunks) == 0:
-            logger.warning("All chunks are already in the storage")
+        unmerged_chunks = await self._get_unmerged_chunks()
+        if unmerged_chunks:
+            logger.info(
+                "[Resume] %d chunks of an interrupted insert", len(unmerged_chunks)
+            )
+        if len(inserting_chunks) == 0 and len(unmerged_chunks) == 0:
             return
 
         logger.info("[New Chunks] inserting %d chunks", len(inserting_chunks))
         await self.full_docs_storage.upsert(new_docs)
         await self.text_chunks_storage.upsert(inserting_chunks)
+        await self.extraction_storage.update(
+            {k: {"status": "pending"} for k in inserting_chunks}
+        )
+        self._unmerged_ids.update(inserting_chunks)
+        # persist the chunks with their status before spending on extraction
+        await self._insert_done()
+        if dedup_index is not None:
+            await dedup_index.index_done_callback()
 
         # Step 3: Extract entities and relations from chunks
         logger.info("[Entity and Relation Extraction]...")
@@ -150,9 +310,17 @@ class GraphGen:
             llm_client=self.synthesizer_llm_client,
             kg_instance=self.graph_storage,
             chunks=[
-                Chunk(id=k, content=v["content"]) for k, v in inserting_chunks.items()
+                Chunk(id=k, content=v["content"])
+                for k, v in {**unmerged_chunks, **inserting_chunks}.items()
             ],
             progress_bar=self.progress_bar,
+            max_loop=extract_config.get("max_loop", 3),
+            glean_mode=extract_config.get("glean_mode", "llm"),
+            merge_batch_size=extract_config.get("merge_batch_size", 0),
+            extraction_storage=self.extraction_storage,
+        )
+        await self._forget_merged_chunks(
+            [*unmerged_chunks.keys(), *inserting_chunks.keys()]
         )
         if not _add_entities_and_relations:
             logger.warning("No entities or relations extracted")
@@ -161,11 +329,41 @@ class GraphGen:
         await self._insert_done()
         return _add_entities_and_relations
 
+    async def _get_unmerged_chunks(self) -> Dict[str, dict]:
+        """
+        Chunks whose extraction has not reached the graph yet.
+        Chunks inserted before extraction status was tracked count as merged.
+        The extraction storage is only scanned once, later inserts keep the ids
+        up to date.
+        """
+        if self._unmerged_ids is None:
+            chunk_ids = await self.extraction_storage.all_keys()
+            records = await self.extraction_storage.get_by_ids(
+                chunk_ids, fields={"status"}
+            )
+            self._unmerged_ids = {
+                chunk_id
+                for chunk_id, record in zip(chunk_ids, records)
+                if record is not None and record["status"] != "merged"
+            }
+        chunk_ids = list(self._unmerged_ids)
+        chunks = await self.text_chunks_storage.get_by_ids(chunk_ids)
+        return {k: v for k, v in zip(chunk_ids, chunks) if v is not None}
+
+    async def _forget_merged_chunks(self, chunk_ids: List[str]):
+        records = await self.extraction_storage.get_by_ids(chunk_ids, fields={"status"})
+        self._unmerged_ids.difference_update(
+            chunk_id
+            for chunk_id, record in zip(chunk_ids, records)
+            if record is not None and record["status"] == "merged"
+        )
+
     async def _insert_done(self):
         tasks = []
         for storage_instance in [
             self.full_docs_storage,
             self.text_chunks_storage,
+            self.extraction_storage,
             self.graph_storage,
             self.search_storage,
         ]:
@@ -231,6 +429,7 @@ class GraphGen:
             self.graph_storage,
             self.rephrase_storage,
             re_judge,
+            batch_size=quiz_and_judge_config.get("judge_batch_size", 16),
         )
         await self.rephrase_storage.index_done_callback()
         await _update_relations.index_done_callback()
@@ -240,32 +439,47 @@ class GraphGen:
         # Step 1: partition the graph
         # TODO: implement graph partitioning, e.g. Partitioner().partition(self.graph_storage)
         mode = generate_config["mode"]
+        data_format = generate_config["data_format"]
+        # fail on an unknown format before any QA is generated
+        format_generation_results({}, output_data_format=data_format)
+        logger.info("Output data format: %s", data_format)
+
+        async def _save_results(results: dict):
+            # formatted QAs are stored as they are generated, the list storage
+            # writes them to disk in batches
+            await self.qa_storage.upsert(
+                format_generation_results(results, output_data_format=data_format)
+            )
+
         if mode == "atomic":
-            results = await traverse_graph_for_atomic(
+            await traverse_graph_for_atomic(
                 self.synthesizer_llm_client,
                 self.tokenizer_instance,
                 self.graph_storage,
                 partition_config["method_params"],
                 self.text_chunks_storage,
                 self.progress_bar,
+                on_result=_save_results,
             )
         elif mode == "multi_hop":
-            results = await traverse_graph_for_multi_hop(
+            await traverse_graph_for_multi_hop(
                 self.synthesizer_llm_client,
                 self.tokenizer_instance,
                 self.graph_storage,
                 partition_config["method_params"],
                 self.text_chunks_storage,
                 self.progress_bar,
+                on_result=_save_results,
             )
         elif mode == "aggregated":
-            results = await traverse_graph_for_aggregated(
+            await traverse_graph_for_aggregated(
                 self.synthesizer_llm_client,
                 self.tokenizer_instance,
                 self.graph_storage,
                 partition_config["method_params"],
                 self.text_chunks_storage,
                 self.progress_bar,
+                on_result=_save_results,
             )
         elif mode == "cot":
             # 检查是否有预计算的社区信息
@@ -276,26 +490,31 @@ class GraphGen:
                 method_params=partition_config["method_params"],
                 precomputed_communities=precomputed_communities,
             )
+            await _save_results(results)
         else:
             raise ValueError(f"Unknown generation mode: {mode}")
         # Step 2： generate QA pairs
         # TODO
 
-        # Step 3: format
-        results = format_generation_results(
-            results, output_data_format=generate_config["data_format"]
-        )
-
-        await self.qa_storage.upsert(results)
         await self.qa_storage.index_done_callback()
 
+        if self.llm_cache is not None:
+            self.llm_cache.flush()
+            logger.info("LLM cache stats: %s", self.llm_cache.stats)
+
     @async_to_sync_method
     async def clear(self):
         await self.full_docs_storage.drop()
         await self.text_chunks_storage.drop()
+        await self.extraction_storage.drop()
+        self._unmerged_ids = set()
         await self.search_storage.drop()
         await self.graph_storage.clear()
         await self.rephrase_storage.drop()
         await self.qa_storage.drop()
+        if self.dedup_index is not None:
+            await self.dedup_index.drop()
+        elif os.path.exists(MinHashLSH.index_file(self.working_dir)):
+            os.remove(MinHashLSH.index_file(self.working_dir))
 
         logger.info("All caches are cleared")
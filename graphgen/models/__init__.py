@@ -1,10 +1,14 @@
 from .community.community_detector import CommunityDetector
+from .dedup import MinHashLSH
 from .evaluate.length_evaluator import LengthEvaluator
 from .evaluate.mtld_evaluator import MTLDEvaluator
 from .evaluate.reward_evaluator import RewardEvaluator
 from .evaluate.uni_evaluator import UniEvaluator
 from .kg_builder.light_rag_kg_builder import LightRAGKGBuilder
+from .llm.hf_client import HuggingFaceClient
+from .llm.limitter import AdaptiveConcurrencyLimiter
 from .llm.openai_client import OpenAIClient
+from .llm.response_cache import ResponseCache
 from .llm.topk_token_model import TopkTokenModel
 from .reader import CsvReader, JsonlReader, JsonReader, TxtReader
 from .search.db.uniprot_search import UniProtSearch
@@ -12,6 +16,7 @@ from .search.kg.wiki_search import WikiSearch
 from .search.web.bing_search import BingSearch
 from .search.web.google_search import GoogleSearch
 from .splitter import ChineseRecursiveTextSplitter, RecursiveCharacterSplitter
-from .storage.json_storage import JsonKVStorage, JsonListStorage
+from .storage.json_storage import JsonKVStorage, JsonListStorage, JsonlListStorage
 from .storage.networkx_storage import NetworkXStorage
+from .storage.sqlite_storage import SQLiteKVStorage
 from .tokenizer import Tokenizer
@@ -0,0 +1 @@
+from .minhash_lsh import MinHashLSH
@@ -0,0 +1,190 @@
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from graphgen.utils import logger
+
+# Mersenne prime of the universal hash family (a * h + b) % _PRIME,
+# with a, b, h < 2^31 the products fit into uint64
+_PRIME = np.uint64((1 << 31) - 1)
+# base of the polynomial shingle hash, arithmetic wraps around mod 2^64
+_BASE = np.uint64(1_000_003)
+# shingles hashed at once, bounds the (shingles, num_perm) intermediate
+_BLOCK = 4096
+
+
+class MinHashLSH:
+    """
+    Near-duplicate detection of texts by MinHash signatures of character
+    shingles, looked up by locality sensitive hashing over bands of the
+    signatures. Candidates sharing a band are kept as duplicates if the share
+    of equal signature values, an estimate of their Jaccard similarity,
+    reaches the threshold.
+
+    The signatures are saved in the working dir, so that texts of earlier
+    inserts are matched as well.
+    """
+
+    def __init__(
+        self,
+        working_dir: str,
+        namespace: str = "minhash",
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        num_bands: int = 32,
+        shingle_size: int = 5,
+        seed: int = 42,
+    ):
+        if num_perm % num_bands != 0:
+            raise ValueError(
+                f"num_perm {num_perm} must be divisible by num_bands {num_bands}"
+            )
+        os.makedirs(working_dir, exist_ok=True)
+        self.file_name = self.index_file(working_dir, namespace)
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.shingle_size = shingle_size
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+
+        self._reset()
+        self._load()
+
+    @staticmethod
+    def index_file(working_dir: str, namespace: str = "minhash") -> str:
+        return os.path.join(working_dir, f"{namespace}.npz")
+
+    def _reset(self):
+        self._ids: List[str] = []
+        # key -> index of its signature
+        self._index: Dict[str, int] = {}
+        self._signatures: List[np.ndarray] = []
+        # band -> band values -> indices of the signatures
+        self._buckets: List[Dict[bytes, List[int]]] = [
+            defaultdict(list) for _ in range(self.num_bands)
+        ]
+
+    def _params(self) -> np.ndarray:
+        return np.array(
+            [self.num_perm, self.num_bands, self.shingle_size, self.seed],
+            dtype=np.int64,
+        )
+
+    def _load(self):
+        if not os.path.exists(self.file_name):
+            return
+        with np.load(self.file_name) as data:
+            if not np.array_equal(data["params"], self._params()):
+                logger.warning(
+                    "MinHash index %s was built with other parameters, start a new one",
+                    self.file_name,
+                )
+                return
+            for key, signature in zip(data["ids"].tolist(), data["signatures"]):
+                self._add(key, signature)
+        logger.info(
+            "Load MinHash index %s with %d signatures", self.file_name, len(self._ids)
+        )
+
+    async def index_done_callback(self):
+        tmp_file = self.file_name + ".tmp"
+        with open(tmp_file, "wb") as f:
+            np.savez(
+                f,
+                params=self._params(),
+                ids=np.array(self._ids, dtype=str),
+                signatures=(
+                    np.stack(self._signatures)
+                    if self._signatures
+                    else np.zeros((0, self.num_perm), dtype=np.uint32)
+                ),
+            )
+        os.replace(tmp_file, self.file_name)
+
+    async def drop(self):
+        """Forget all signatures and delete the saved index."""
+        self._reset()
+        if os.path.exists(self.file_name):
+            os.remove(self.file_name)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of the character shingles of the normalized text."""
+        text = " ".join(text.lower().split())
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(
+            np.uint64
+        )
+        size = max(1, min(self.shingle_size, len(codes)))
+        if len(codes) == 0:
+            codes = np.zeros(1, dtype=np.uint64)
+
+        count = len(codes) - size + 1
+        hashes = np.zeros(count, dtype=np.uint64)
+        for j in range(size):
+            hashes = hashes * _BASE + codes[j : j + count]
+        hashes = np.unique(hashes % _PRIME)
+
+        signature = np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        for start in range(0, len(hashes), _BLOCK):
+            block = hashes[start : start + _BLOCK, None]
+            np.minimum(
+                signature,
+                ((block * self._a + self._b) % _PRIME).min(axis=0),
+                out=signature,
+            )
+        return signature.astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [band.tobytes() for band in np.split(signature, self.num_bands)]
+
+    def _add(self, key: str, signature: np.ndarray):
+        index = len(self._ids)
+        self._ids.append(key)
+        self._index[key] = index
+        self._signatures.append(signature)
+        for band, band_key in enumerate(self._band_keys(signature)):
+            self._buckets[band][band_key].append(index)
+
+    def query(self, signature: np.ndarray, key: Optional[str] = None) -> Optional[str]:
+        """
+        Key of an indexed text that is a near-duplicate of the signature.
+
+        :param signature: MinHash signature of the queried text
+        :param key: key of the queried text, it is never its own duplicate
+        """
+        seen = {self._index.get(key)}
+        for band, band_key in enumerate(self._band_keys(signature)):
+            for index in self._buckets[band].get(band_key, ()):
+                if index in seen:
+                    continue
+                seen.add(index)
+                similarity = np.mean(self._signatures[index] == signature)
+                if similarity >= self.threshold:
+                    return self._ids[index]
+        return None
+
+    def filter_near_duplicates(self, texts: Dict[str, str]) -> Dict[str, str]:
+        """
+        Index the texts that are not near-duplicates of an indexed text or of
+        an earlier one of texts. Texts whose key is already indexed are kept
+        and not indexed again.
+
+        :param texts: key -> text
+        :return: key -> key of the indexed text it duplicates, for the dropped texts
+        """
+        duplicates = {}
+        for key, text in texts.items():
+            if key in self._index:
+                continue
+            signature = self.signature(text)
+            original = self.query(signature, key)
+            if original is None:
+                self._add(key, signature)
+            else:
+                duplicates[key] = original
+        return duplicates
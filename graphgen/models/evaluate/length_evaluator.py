@@ -18,5 +18,4 @@ class LengthEvaluator(BaseEvaluator):
         return await loop.run_in_executor(None, self._calculate_length, pair.answer)
 
     def _calculate_length(self, text: str) -> float:
-        tokens = self.tokenizer.encode(text)
-        return len(tokens)
+        return self.tokenizer.count_tokens(text)
@@ -1,11 +1,13 @@
+import asyncio
 import re
 from collections import Counter, defaultdict
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
 from graphgen.bases import BaseGraphStorage, BaseKGBuilder, BaseLLMClient, Chunk
 from graphgen.templates import KG_EXTRACTION_PROMPT, KG_SUMMARIZATION_PROMPT
 from graphgen.utils import (
+    KeyLock,
     detect_if_chinese,
     detect_main_language,
     handle_single_entity_extraction,
@@ -15,12 +17,113 @@ from graphgen.utils import (
     split_string_by_multi_markers,
 )
 
+GLEAN_MODES = ["llm", "logprob", "heuristic"]
+
+
+def _split_records(result: str) -> List[str]:
+    return split_string_by_multi_markers(
+        result,
+        [
+            KG_EXTRACTION_PROMPT["FORMAT"]["record_delimiter"],
+            KG_EXTRACTION_PROMPT["FORMAT"]["completion_delimiter"],
+        ],
+    )
+
 
 @dataclass
 class LightRAGKGBuilder(BaseKGBuilder):
     llm_client: BaseLLMClient = None
     max_loop: int = 3
 
+    # how to decide whether to glean again:
+    # "llm" asks IF_LOOP and reads the generated answer,
+    # "logprob" asks IF_LOOP for a single token and compares P(yes) with P(no),
+    # "heuristic" decides from the records found so far without any request
+    glean_mode: str = "llm"
+    # heuristic: glean while the chunk has fewer records per 100 tokens than this
+    min_records_per_100_tokens: float = 2.0
+    # except in "llm" mode, a loop is skipped once its average number of new
+    # records over the first glean_budget_warmup gleans drops below min_glean_yield
+    min_glean_yield: float = 1.0
+    glean_budget_warmup: int = 20
+
+    # descriptions longer than this are summarized by the LLM
+    max_summary_tokens: int = 200
+    # summaries are free-form chat answers that cannot share a request, so they
+    # are bounded by a semaphore of their own instead of being batched
+    max_summary_concurrent: int = 20
+
+    # loop index -> [gleans, new records]
+    _glean_yield: Dict[int, List[int]] = field(
+        default_factory=lambda: defaultdict(lambda: [0, 0])
+    )
+    # merges of the same node or edge are serialized, different keys run freely
+    _node_locks: KeyLock = field(default_factory=KeyLock)
+    _edge_locks: KeyLock = field(default_factory=KeyLock)
+
+    def __post_init__(self):
+        if self.glean_mode not in GLEAN_MODES:
+            raise ValueError(
+                f"Unsupported glean mode: {self.glean_mode}. "
+                f"Supported glean modes are: {GLEAN_MODES}"
+            )
+        self._summary_semaphore = asyncio.Semaphore(self.max_summary_concurrent)
+
+    def _within_glean_budget(self, loop_idx: int) -> bool:
+        if self.glean_mode == "llm":
+            return True
+        gleans, new_records = self._glean_yield[loop_idx]
+        if gleans < self.glean_budget_warmup:
+            return True
+        return new_records / gleans >= self.min_glean_yield
+
+    async def _should_glean(  # pylint: disable=too-many-arguments
+        self,
+        loop_idx: int,
+        language: str,
+        history: List[dict],
+        system_prompt: str,
+        content: str,
+        records: set,
+        last_result: str,
+        last_yield: int,
+    ) -> bool:
+        if not self._within_glean_budget(loop_idx):
+            return False
+
+        if self.glean_mode == "heuristic":
+            if loop_idx > 0 and last_yield == 0:
+                return False
+            # the model stopped before finishing the list
+            if (
+                KG_EXTRACTION_PROMPT["FORMAT"]["completion_delimiter"]
+                not in last_result
+            ):
+                return True
+            num_tokens = self.llm_client.tokenizer.count_tokens(content)
+            return len(records) < self.min_records_per_100_tokens * num_tokens / 100
+
+        if self.glean_mode == "logprob":
+            tokens = await self.llm_client.generate_topk_per_token(
+                text=KG_EXTRACTION_PROMPT[language]["IF_LOOP"],
+                history=history,
+                system_prompt=system_prompt,
+            )
+            probs = defaultdict(float)
+            for candidate in tokens[0].top_candidates or [tokens[0]]:
+                probs[
+                    candidate.text.strip().strip('"').strip("'").lower()
+                ] += candidate.prob
+            return probs["yes"] > probs["no"]
+
+        if_loop_result = await self.llm_client.generate_answer(
+            text=KG_EXTRACTION_PROMPT[language]["IF_LOOP"],
+            history=history,
+            system_prompt=system_prompt,
+        )
+        if_loop_result = if_loop_result.strip().strip('"').strip("'").lower()
+        return if_loop_result == "yes"
+
     async def extract(
         self, chunk: Chunk
     ) -> Tuple[Dict[str, List[dict]], Dict[Tuple[str, str], List[dict]]]:
@@ -34,28 +137,42 @@ class LightRAGKGBuilder(BaseKGBuilder):
 
         # step 1: language_detection
         language = "Chinese" if detect_if_chinese(content) else "English"
-        KG_EXTRACTION_PROMPT["FORMAT"]["language"] = language
+        prompt_format = {**KG_EXTRACTION_PROMPT["FORMAT"], "language": language}
 
-        hint_prompt = KG_EXTRACTION_PROMPT[language]["TEMPLATE"].format(
-            **KG_EXTRACTION_PROMPT["FORMAT"], input_text=content
+        # the instructions and examples are the same for every chunk of a language,
+        # sending them as the system prompt lets the server cache their prefill
+        system_prompt = KG_EXTRACTION_PROMPT[language]["SYSTEM"].format(**prompt_format)
+        hint_prompt = KG_EXTRACTION_PROMPT[language]["USER"].format(
+            **prompt_format, input_text=content
         )
 
         # step 2: initial glean
-        final_result = await self.llm_client.generate_answer(hint_prompt)
+        final_result = await self.llm_client.generate_answer(
+            hint_prompt, system_prompt=system_prompt
+        )
         logger.debug("First extraction result: %s", final_result)
 
         # step3: iterative refinement
         history = pack_history_conversations(hint_prompt, final_result)
+        seen_records = set(_split_records(final_result))
+        last_result, last_yield = final_result, len(seen_records)
         for loop_idx in range(self.max_loop):
-            if_loop_result = await self.llm_client.generate_answer(
-                text=KG_EXTRACTION_PROMPT[language]["IF_LOOP"], history=history
-            )
-            if_loop_result = if_loop_result.strip().strip('"').strip("'").lower()
-            if if_loop_result != "yes":
+            if not await self._should_glean(
+                loop_idx,
+                language,
+                history,
+                system_prompt,
+                content,
+                seen_records,
+                last_result,
+                last_yield,
+            ):
                 break
 
             glean_result = await self.llm_client.generate_answer(
-                text=KG_EXTRACTION_PROMPT[language]["CONTINUE"], history=history
+                text=KG_EXTRACTION_PROMPT[language]["CONTINUE"],
+                history=history,
+                system_prompt=system_prompt,
             )
             logger.debug("Loop %s glean: %s", loop_idx + 1, glean_result)
 
@@ -64,14 +181,14 @@ class LightRAGKGBuilder(BaseKGBuilder):
             )
             final_result += glean_result
 
+            new_records = set(_split_records(glean_result)) - seen_records
+            seen_records |= new_records
+            last_result, last_yield = glean_result, len(new_records)
+            self._glean_yield[loop_idx][0] += 1
+            self._glean_yield[loop_idx][1] += last_yield
+
         # step 4: parse the final result
-        records = split_string_by_multi_markers(
-            final_result,
-            [
-                KG_EXTRACTION_PROMPT["FORMAT"]["record_delimiter"],
-                KG_EXTRACTION_PROMPT["FORMAT"]["completion_delimiter"],
-            ],
-        )
+        records = _split_records(final_result)
 
         nodes = defaultdict(list)
         edges = defaultdict(list)
@@ -104,40 +221,43 @@ class LightRAGKGBuilder(BaseKGBuilder):
         kg_instance: BaseGraphStorage,
     ) -> None:
         entity_name, node_data = node_data
-        entity_types = []
-        source_ids = []
-        descriptions = []
-
-        node = await kg_instance.get_node(entity_name)
-        if node is not None:
-            entity_types.append(node["entity_type"])
-            source_ids.extend(
-                split_string_by_multi_markers(node["source_id"], ["<SEP>"])
-            )
-            descriptions.append(node["description"])
+        async with self._node_locks(entity_name):
+            entity_types = []
+            source_ids = []
+            descriptions = []
+
+            node = await kg_instance.get_node(entity_name)
+            if node is not None:
+                entity_types.append(node["entity_type"])
+                source_ids.extend(
+                    split_string_by_multi_markers(node["source_id"], ["<SEP>"])
+                )
+                descriptions.append(node["description"])
 
-        # take the most frequent entity_type
-        entity_type = sorted(
-            Counter([dp["entity_type"] for dp in node_data] + entity_types).items(),
-            key=lambda x: x[1],
-            reverse=True,
-        )[0][0]
+            # take the most frequent entity_type
+            entity_type = sorted(
+                Counter([dp["entity_type"] for dp in node_data] + entity_types).items(),
+                key=lambda x: x[1],
+                reverse=True,
+            )[0][0]
 
-        description = "<SEP>".join(
-            sorted(set([dp["description"] for dp in node_data] + descriptions))
-        )
-        description = await self._handle_kg_summary(entity_name, description)
+            description = "<SEP>".join(
+                sorted(set([dp["description"] for dp in node_data] + descriptions))
+            )
+            description = await self._handle_kg_summary(entity_name, description)
 
-        source_id = "<SEP>".join(
-            set([dp["source_id"] for dp in node_data] + source_ids)
-        )
+            source_id = "<SEP>".join(
+                set([dp["source_id"] for dp in node_data] + source_ids)
+            )
 
-        node_data = {
-            "entity_type": entity_type,
-            "description": description,
-            "source_id": source_id,
-        }
-        await kg_instance.upsert_node(entity_name, node_data=node_data)
+            node_data = {
+                "entity_type": entity_type,
+                "description": description,
+                "source_id": source_id,
+                # memoized for the generation steps, see get_language
+                "language": detect_main_language(description),
+            }
+            await kg_instance.upsert_node(entity_name, node_data=node_data)
 
     async def merge_edges(
         self,
@@ -146,78 +266,86 @@ class LightRAGKGBuilder(BaseKGBuilder):
     ) -> None:
         (src_id, tgt_id), edge_data = edges_data
 
-        source_ids = []
-        descriptions = []
-
-        edge = await kg_instance.get_edge(src_id, tgt_id)
-        if edge is not None:
-            source_ids.extend(
-                split_string_by_multi_markers(edge["source_id"], ["<SEP>"])
-            )
-            descriptions.append(edge["description"])
+        async with self._edge_locks((src_id, tgt_id)):
+            source_ids = []
+            descriptions = []
 
-        description = "<SEP>".join(
-            sorted(set([dp["description"] for dp in edge_data] + descriptions))
-        )
-        source_id = "<SEP>".join(
-            set([dp["source_id"] for dp in edge_data] + source_ids)
-        )
-
-        for insert_id in [src_id, tgt_id]:
-            if not await kg_instance.has_node(insert_id):
-                await kg_instance.upsert_node(
-                    insert_id,
-                    node_data={
-                        "source_id": source_id,
-                        "description": description,
-                        "entity_type": "UNKNOWN",
-                    },
+            edge = await kg_instance.get_edge(src_id, tgt_id)
+            if edge is not None:
+                source_ids.extend(
+                    split_string_by_multi_markers(edge["source_id"], ["<SEP>"])
                 )
+                descriptions.append(edge["description"])
 
-        description = await self._handle_kg_summary(
-            f"({src_id}, {tgt_id})", description
-        )
+            description = "<SEP>".join(
+                sorted(set([dp["description"] for dp in edge_data] + descriptions))
+            )
+            source_id = "<SEP>".join(
+                set([dp["source_id"] for dp in edge_data] + source_ids)
+            )
 
-        await kg_instance.upsert_edge(
-            src_id,
-            tgt_id,
-            edge_data={"source_id": source_id, "description": description},
-        )
+            for insert_id in [src_id, tgt_id]:
+                async with self._node_locks(insert_id):
+                    if not await kg_instance.has_node(insert_id):
+                        await kg_instance.upsert_node(
+                            insert_id,
+                            node_data={
+                                "source_id": source_id,
+                                "description": description,
+                                "entity_type": "UNKNOWN",
+                            },
+                        )
+
+            description = await self._handle_kg_summary(
+                f"({src_id}, {tgt_id})", description
+            )
+
+            await kg_instance.upsert_edge(
+                src_id,
+                tgt_id,
+                edge_data={
+                    "source_id": source_id,
+                    "description": description,
+                    "language": detect_main_language(description),
+                },
+            )
 
     async def _handle_kg_summary(
         self,
         entity_or_relation_name: str,
         description: str,
-        max_summary_tokens: int = 200,
+        max_summary_tokens: Optional[int] = None,
     ) -> str:
         """
         Handle knowledge graph summary
 
         :param entity_or_relation_name
         :param description
-        :param max_summary_tokens
+        :param max_summary_tokens: defaults to self.max_summary_tokens
         :return summary
         """
+        max_summary_tokens = max_summary_tokens or self.max_summary_tokens
 
         tokenizer_instance = self.llm_client.tokenizer
+        if tokenizer_instance.count_tokens(description) < max_summary_tokens:
+            return description
+
         language = detect_main_language(description)
         if language == "en":
             language = "English"
         else:
             language = "Chinese"
-        KG_EXTRACTION_PROMPT["FORMAT"]["language"] = language
-
-        tokens = tokenizer_instance.encode(description)
-        if len(tokens) < max_summary_tokens:
-            return description
 
-        use_description = tokenizer_instance.decode(tokens[:max_summary_tokens])
+        use_description = tokenizer_instance.decode(
+            tokenizer_instance.encode(description)[:max_summary_tokens]
+        )
         prompt = KG_SUMMARIZATION_PROMPT[language]["TEMPLATE"].format(
             entity_name=entity_or_relation_name,
             description_list=use_description.split("<SEP>"),
             **KG_SUMMARIZATION_PROMPT["FORMAT"],
         )
-        new_description = await self.llm_client.generate_answer(prompt)
+        async with self._summary_semaphore:
+            new_description = await self.llm_client.generate_answer(prompt)
         logger.info(
             "Entity or relation %s summary: %s",
             entity_or_relation_name,
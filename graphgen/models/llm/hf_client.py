@@ -0,0 +1,296 @@
+import asyncio
+import copy
+import threading
+from typing import Any, List, Optional
+
+from graphgen.bases.base_llm_client import BaseLLMClient
+from graphgen.bases.datatypes import Token
+
+
+def _common_prefix_length(sequences: List[List[int]]) -> int:
+    length = min(len(s) for s in sequences)
+    for i in range(length):
+        token_id = sequences[0][i]
+        if any(s[i] != token_id for s in sequences[1:]):
+            return i
+    return length
+
+
+class HuggingFaceClient(BaseLLMClient):
+    """
+    In-process transformers causal LM, mainly used as the trainee model.
+
+    Next-token scoring runs in right-padded batches. The key/value cache of the
+    token prefix shared by a batch (e.g. the STATEMENT_JUDGEMENT_PROMPT
+    instructions) is computed once and reused while following batches share it.
+    """
+
+    def __init__(
+        self,
+        *,
+        model_name: str,
+        device: Optional[str] = None,
+        dtype: str = "auto",
+        topk_per_token: int = 5,  # number of topk tokens to generate for each token
+        batch_size: int = 16,
+        use_chat_template: bool = True,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        # pylint: disable=import-outside-toplevel
+        import torch
+        import transformers
+        from packaging import version
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        self.torch = torch
+        self.model_name = model_name
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.topk_per_token = topk_per_token
+        self.batch_size = batch_size
+
+        self.hf_tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # "dtype" replaced "torch_dtype" in transformers 4.56
+        dtype_arg = (
+            "dtype"
+            if version.parse(transformers.__version__) >= version.parse("4.56")
+            else "torch_dtype"
+        )
+        self.model = AutoModelForCausalLM.from_pretrained(
+            model_name, **{dtype_arg: dtype}
+        )
+        self.model.to(self.device).eval()
+        self.use_chat_template = (
+            use_chat_template and self.hf_tokenizer.chat_template is not None
+        )
+        self.pad_token_id = (
+            self.hf_tokenizer.pad_token_id
+            if self.hf_tokenizer.pad_token_id is not None
+            else self.hf_tokenizer.eos_token_id or 0
+        )
+
+        self.token_usage: list = []
+        # the model is not safe to call from several threads at once
+        self._lock = threading.Lock()
+        self._prefix_ids: List[int] = []
+        self._prefix_cache = None
+
+    def _build_prompt(
+        self,
+        text: str,
+        history: Optional[List[str]] = None,
+        system_prompt: Optional[str] = None,
+    ) -> str:
+        system_prompt = system_prompt or self.system_prompt
+        if not self.use_chat_template:
+            return f"{system_prompt}\n\n{text}" if system_prompt else text
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        if history:
+            assert len(history) % 2 == 0, "History should have even number of elements."
+            messages.extend(history)
+        messages.append({"role": "user", "content": text})
+        return self.hf_tokenizer.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True
+        )
+
+    def _encode(self, prompt: str) -> List[int]:
+        # special tokens are already part of the chat template
+        return self.hf_tokenizer.encode(
+            prompt, add_special_tokens=not self.use_chat_template
+        )
+
+    def _to_token(self, token_id: int, prob: float) -> Token:
+        return Token(self.hf_tokenizer.decode([token_id]), prob)
+
+    def _get_prefix_cache(self, prefix_ids: List[int]):
+        """Return the cache of prefix_ids, reusing the last one if it still applies."""
+        if (
+            not self._prefix_ids
+            or self._prefix_ids != prefix_ids[: len(self._prefix_ids)]
+        ):
+            input_ids = self.torch.tensor([prefix_ids], device=self.device)
+            outputs = self.model(input_ids=input_ids, use_cache=True)
+            self._prefix_ids = prefix_ids
+            self._prefix_cache = outputs.past_key_values
+        return self._prefix_ids, self._prefix_cache
+
+    def _pad(self, sequences: List[List[int]]):
+        max_len = max(len(s) for s in sequences)
+        input_ids = self.torch.full(
+            (len(sequences), max_len), self.pad_token_id, device=self.device
+        )
+        attention_mask = self.torch.zeros(
+            (len(sequences), max_len), dtype=self.torch.long, device=self.device
+        )
+        for i, s in enumerate(sequences):
+            input_ids[i, : len(s)] = self.torch.tensor(s, device=self.device)
+            attention_mask[i, : len(s)] = 1
+        return input_ids, attention_mask
+
+    def _next_token_logprobs(self, sequences: List[List[int]]):
+        """Log-probs of the token following each sequence, shape (batch, vocab)."""
+        prefix_len = 0
+        past_key_values = None
+        if len(sequences) > 1:
+            # keep at least one token per row to read the logits from
+            common = _common_prefix_length(sequences)
+            common = min(common, min(len(s) for s in sequences) - 1)
+            if common > 0:
+                prefix_ids, prefix_cache = self._get_prefix_cache(sequences[0][:common])
+                prefix_len = len(prefix_ids)
+                past_key_values = copy.deepcopy(prefix_cache)
+                past_key_values.batch_repeat_interleave(len(sequences))
+
+        suffixes = [s[prefix_len:] for s in sequences]
+        input_ids, attention_mask = self._pad(suffixes)
+        if prefix_len:
+            attention_mask = self.torch.cat(
+                [
+                    self.torch.ones(
+                        (len(sequences), prefix_len),
+                        dtype=attention_mask.dtype,
+                        device=self.device,
+                    ),
+                    attention_mask,
+                ],
+                dim=1,
+            )
+        position_ids = prefix_len + self.torch.arange(
+            input_ids.shape[1], device=self.device
+        ).expand(len(sequences), -1)
+        logits = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=past_key_values,
+            use_cache=past_key_values is not None,
+        ).logits
+        last = self.torch.tensor([len(s) - 1 for s in suffixes], device=self.device)
+        rows = self.torch.arange(len(sequences), device=self.device)
+        return self.torch.log_softmax(logits[rows, last].float(), dim=-1)
+
+    def _topk_per_token_batch(self, prompts: List[str]) -> List[List[Token]]:
+        results = []
+        with self._lock, self.torch.inference_mode():
+            for start in range(0, len(prompts), self.batch_size):
+                sequences = [
+                    self._encode(p) for p in prompts[start : start + self.batch_size]
+                ]
+                logprobs = self._next_token_logprobs(sequences)
+                top_logprobs, top_ids = logprobs.topk(max(1, self.topk_per_token))
+                for row_logprobs, row_ids in zip(
+                    top_logprobs.exp().tolist(), top_ids.tolist()
+                ):
+                    candidates = [
+                        self._to_token(token_id, prob)
+                        for token_id, prob in zip(row_ids, row_logprobs)
+                    ]
+                    token = self._to_token(row_ids[0], row_logprobs[0])
+                    token.top_candidates = candidates
+                    results.append([token])
+                self.token_usage.extend(
+                    {
+                        "prompt_tokens": len(s),
+                        "completion_tokens": 1,
+                        "total_tokens": len(s) + 1,
+                    }
+                    for s in sequences
+                )
+        return results
+
+    def _inputs_prob_batch(self, texts: List[str]) -> List[List[Token]]:
+        bos = self.hf_tokenizer.bos_token_id
+        results = []
+        with self._lock, self.torch.inference_mode():
+            for start in range(0, len(texts), self.batch_size):
+                sequences = [
+                    ([bos] if bos is not None else [])
+                    + self.hf_tokenizer.encode(t, add_special_tokens=False)
+                    for t in texts[start : start + self.batch_size]
+                ]
+                input_ids, attention_mask = self._pad(sequences)
+                logits = self.model(
+                    input_ids=input_ids, attention_mask=attention_mask
+                ).logits
+                logprobs = self.torch.log_softmax(logits[:, :-1].float(), dim=-1)
+                probs = (
+                    logprobs.gather(-1, input_ids[:, 1:].unsqueeze(-1))
+                    .squeeze(-1)
+                    .exp()
+                    .tolist()
+                )
+                # the first token has no context to be predicted from
+                for s, row_probs in zip(sequences, probs):
+                    results.append(
+                        [
+                            self._to_token(token_id, prob)
+                            for token_id, prob in zip(s[1:], row_probs)
+                        ]
+                    )
+        return results
+
+    def _generate(self, prompt: str) -> str:
+        with self._lock, self.torch.inference_mode():
+            input_ids = self.torch.tensor([self._encode(prompt)], device=self.device)
+            do_sample = self.temperature > 0
+            sampling = (
+                {
+                    "temperature": self.temperature,
+                    "top_p": self.top_p,
+                    "top_k": self.top_k,
+                }
+                if do_sample
+                else {}
+            )
+            output = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=self.torch.ones_like(input_ids),
+                max_new_tokens=self.max_tokens,
+                do_sample=do_sample,
+                repetition_penalty=self.repetition_penalty,
+                pad_token_id=self.pad_token_id,
+                **sampling,
+            )
+            new_tokens = output[0, input_ids.shape[1] :]
+            self.token_usage.append(
+                {
+                    "prompt_tokens": input_ids.shape[1],
+                    "completion_tokens": len(new_tokens),
+                    "total_tokens": input_ids.shape[1] + len(new_tokens),
+                }
+            )
+            return self.hf_tokenizer.decode(new_tokens, skip_special_tokens=True)
+
+    async def generate_answer(
+        self, text: str, history: Optional[List[str]] = None, **extra: Any
+    ) -> str:
+        content = await asyncio.to_thread(
+            self._generate,
+            self._build_prompt(text, history, extra.get("system_prompt")),
+        )
+        return self.filter_think_tags(content)
+
+    async def generate_topk_per_token(
+        self, text: str, history: Optional[List[str]] = None, **extra: Any
+    ) -> List[Token]:
+        return (await self.generate_topk_per_token_batch([text], history, **extra))[0]
+
+    async def generate_topk_per_token_batch(
+        self, texts: List[str], history: Optional[List[str]] = None, **extra: Any
+    ) -> List[List[Token]]:
+        prompts = [
+            self._build_prompt(text, history, extra.get("system_prompt"))
+            for text in texts
+        ]
+        return await asyncio.to_thread(self._topk_per_token_batch, prompts)
+
+    async def generate_inputs_prob(
+        self, text: str, history: Optional[List[str]] = None, **extra: Any
+    ) -> List[Token]:
+        return (await self.generate_inputs_prob_batch([text]))[0]
+
+    async def generate_inputs_prob_batch(self, texts: List[str]) -> List[List[Token]]:
+        """Generate probabilities for each token of each input text."""
+        return await asyncio.to_thread(self._inputs_prob_batch, texts)
@@ -1,88 +1,170 @@
-import time
-from datetime import datetime, timedelta
 import asyncio
+import time
+from contextlib import asynccontextmanager
 
 from graphgen.utils import logger
 
 
-class RPM:
-
-    def __init__(self, rpm: int = 1000):
-        self.rpm = rpm
-        self.record = {'rpm_slot': self.get_minute_slot(), 'counter': 0}
-
-    def get_minute_slot(self):
-        current_time = time.time()
-        dt_object = datetime.fromtimestamp(current_time)
-        total_minutes_since_midnight = dt_object.hour * 60 + dt_object.minute
-        return total_minutes_since_midnight
-
-    async def wait(self, silent=False):
-        current = time.time()
-        dt_object = datetime.fromtimestamp(current)
-        minute_slot = self.get_minute_slot()
-
-        if self.record['rpm_slot'] == minute_slot:
-            # check RPM exceed
-            if self.record['counter'] >= self.rpm:
-                # wait until next minute
-                next_minute = dt_object.replace(
-                    second=0, microsecond=0) + timedelta(minutes=1)
-                _next = next_minute.timestamp()
-                sleep_time = abs(_next - current)
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `capacity` tokens per minute.
+    Safe to share between coroutines and between clients on the same event loop:
+    waiters are served in FIFO order, so there is no burst at the top of a minute.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = None
+        self._loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    async def acquire(self, amount: float, silent: bool = False):
+        # a single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        async with self._get_lock():
+            self._refill()
+            while self.tokens < amount:
+                sleep_time = (amount - self.tokens) / self.rate
                 if not silent:
-                    logger.info('RPM sleep %s', sleep_time)
+                    logger.info("%s sleep %.2fs", type(self).__name__, sleep_time)
                 await asyncio.sleep(sleep_time)
+                self._refill()
+            self.tokens -= amount
 
-                self.record = {
-                    'rpm_slot': self.get_minute_slot(),
-                    'counter': 0
-                }
-        else:
-            self.record = {'rpm_slot': self.get_minute_slot(), 'counter': 0}
-        self.record['counter'] += 1
+    def refund(self, amount: float):
+        """
+        Give back (positive) or additionally charge (negative) tokens,
+        e.g. once the real usage of a request is known.
+        A negative balance is paid off before the next request is admitted.
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
 
-        if not silent:
-            logger.debug(self.record)
 
+class RPM(TokenBucket):
+    def __init__(self, rpm: int = 1000):
+        super().__init__(rpm)
+        self.rpm = rpm
 
-class TPM:
+    async def wait(self, silent=False):
+        await self.acquire(1, silent=silent)
 
+
+class TPM(TokenBucket):
     def __init__(self, tpm: int = 20000):
+        super().__init__(tpm)
         self.tpm = tpm
-        self.record = {'tpm_slot': self.get_minute_slot(), 'counter': 0}
-
-    def get_minute_slot(self):
-        current_time = time.time()
-        dt_object = datetime.fromtimestamp(current_time)
-        total_minutes_since_midnight = dt_object.hour * 60 + dt_object.minute
-        return total_minutes_since_midnight
 
     async def wait(self, token_count, silent=False):
-        current = time.time()
-        dt_object = datetime.fromtimestamp(current)
-        minute_slot = self.get_minute_slot()
-
-        # get next slot, skip
-        if self.record['tpm_slot'] != minute_slot:
-            self.record = {'tpm_slot': minute_slot, 'counter': token_count}
+        await self.acquire(token_count, silent=silent)
+
+    def correct(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the charge of a request with the usage reported by the API."""
+        self.refund(estimated_tokens - actual_tokens)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on the number of in-flight LLM requests.
+
+    After every window of `limit` successful requests the limit grows by one
+    if the window's p50 latency stays within `latency_tolerance` of the best p50
+    seen so far, and shrinks by one otherwise. A rate limit error or timeout
+    multiplies the limit by `backoff`; failures of requests that were already
+    in flight at the last back-off do not shrink it again.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        backoff: float = 0.5,
+        latency_tolerance: float = 0.2,
+    ):
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+
+        self.in_flight = 0
+        self._latencies = []
+        self._baseline_p50 = None
+        self._last_backoff_at = 0.0
+        self._cond = None
+        self._loop = None
+
+    def _get_cond(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._cond is None or self._loop is not loop:
+            self._cond = asyncio.Condition()
+            self._loop = loop
+        return self._cond
+
+    async def acquire(self):
+        cond = self._get_cond()
+        async with cond:
+            await cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self):
+        cond = self._get_cond()
+        async with cond:
+            self.in_flight -= 1
+            cond.notify_all()
+
+    def on_success(self, latency: float):
+        self._latencies.append(latency)
+        if len(self._latencies) < self.limit:
             return
+        latencies = sorted(self._latencies)
+        p50 = latencies[len(latencies) // 2]
+        self._latencies = []
+        if self._baseline_p50 is None or p50 < self._baseline_p50:
+            self._baseline_p50 = p50
+        if p50 <= self._baseline_p50 * (1 + self.latency_tolerance):
+            self.limit = min(self.max_limit, self.limit + 1)
+        else:
+            self.limit = max(self.min_limit, self.limit - 1)
 
-        # check RPM exceed
-        self.record['counter'] += token_count
-        if self.record['counter'] > self.tpm:
-            # wait until next minute
-            next_minute = dt_object.replace(
-                second=0, microsecond=0) + timedelta(minutes=1)
-            _next = next_minute.timestamp()
-            sleep_time = abs(_next - current)
-            logger.info('TPM sleep %s', sleep_time)
-            await asyncio.sleep(sleep_time)
-
-            self.record = {
-                'tpm_slot': self.get_minute_slot(),
-                'counter': token_count
-            }
-
-        if not silent:
-            logger.debug(self.record)
+    def on_overload(self, started_at: float):
+        # requests started before the last back-off saw the old limit, ignore them
+        if started_at < self._last_backoff_at:
+            return
+        new_limit = max(self.min_limit, int(self.limit * self.backoff))
+        logger.info("Concurrency limit backs off from %d to %d", self.limit, new_limit)
+        self.limit = new_limit
+        self._latencies = []
+        self._last_backoff_at = time.monotonic()
+
+    @asynccontextmanager
+    async def track(self, overload_errors: tuple = ()):
+        """Hold a slot for one request and feed its outcome back into the limit."""
+        await self.acquire()
+        started_at = time.monotonic()
+        try:
+            yield
+        except overload_errors:
+            self.on_overload(started_at)
+            raise
+        else:
+            self.on_success(time.monotonic() - started_at)
+        finally:
+            await self.release()
@@ -1,3 +1,4 @@
+import json
 import math
 from typing import Any, Dict, List, Optional
 
@@ -12,7 +13,9 @@ from tenacity import (
 
 from graphgen.bases.base_llm_client import BaseLLMClient
 from graphgen.bases.datatypes import Token
-from graphgen.models.llm.limitter import RPM, TPM
+from graphgen.models.llm.limitter import RPM, TPM, AdaptiveConcurrencyLimiter
+from graphgen.models.llm.response_cache import ResponseCache, dump_tokens, load_tokens
+from graphgen.utils import compute_args_hash
 
 
 def get_top_response_tokens(response: openai.ChatCompletion) -> List[Token]:
@@ -28,6 +31,20 @@ def get_top_response_tokens(response: openai.ChatCompletion) -> List[Token]:
     return tokens
 
 
+def get_top_completion_tokens(choice: openai.types.CompletionChoice) -> List[Token]:
+    logprobs = choice.logprobs
+    tokens = []
+    for text, logprob, top_logprobs in zip(
+        logprobs.tokens, logprobs.token_logprobs, logprobs.top_logprobs
+    ):
+        candidate_tokens = [
+            Token(t, math.exp(lp))
+            for t, lp in sorted(top_logprobs.items(), key=lambda x: -x[1])
+        ]
+        tokens.append(Token(text, math.exp(logprob), top_candidates=candidate_tokens))
+    return tokens
+
+
 class OpenAIClient(BaseLLMClient):
     def __init__(
         self,
@@ -39,6 +56,11 @@ class OpenAIClient(BaseLLMClient):
         seed: Optional[int] = None,
         topk_per_token: int = 5,  # number of topk tokens to generate for each token
         request_limit: bool = False,
+        cache: Optional[ResponseCache] = None,
+        rpm: Optional[RPM] = None,
+        tpm: Optional[TPM] = None,
+        concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        batch_completions: bool = False,
         **kwargs: Any,
     ):
         super().__init__(**kwargs)
@@ -51,8 +73,16 @@ class OpenAIClient(BaseLLMClient):
 
         self.token_usage: list = []
         self.request_limit = request_limit
-        self.rpm = RPM(rpm=1000)
-        self.tpm = TPM(tpm=50000)
+        # limiters can be passed in to share one provider quota between clients
+        self.rpm = rpm or RPM(rpm=1000)
+        self.tpm = tpm or TPM(tpm=50000)
+        # opt-in persistent response cache, may be shared between clients
+        self.cache = cache
+        # adaptive limit on in-flight requests, operators defer to it when set
+        self.concurrency_limiter = concurrency_limiter
+        # score prompt batches in one request through the completions endpoint,
+        # supported by OpenAI-compatible local servers such as vLLM
+        self.batch_completions = batch_completions
 
         self.__post_init__()
 
@@ -62,9 +92,15 @@ class OpenAIClient(BaseLLMClient):
             api_key=self.api_key or "dummy", base_url=self.base_url
         )
 
-    def _pre_generate(self, text: str, history: List[str]) -> Dict:
+    def _pre_generate(
+        self,
+        text: str,
+        history: List[str],
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+    ) -> Dict:
         kwargs = {
-            "temperature": self.temperature,
+            "temperature": self.temperature if temperature is None else temperature,
             "top_p": self.top_p,
             "max_tokens": self.max_tokens,
         }
@@ -73,18 +109,84 @@ class OpenAIClient(BaseLLMClient):
         if self.json_mode:
             kwargs["response_format"] = {"type": "json_object"}
 
+        # system prompt first and history next, so that requests of one
+        # conversation share a prefix that the server can cache
         messages = []
-        if self.system_prompt:
-            messages.append({"role": "system", "content": self.system_prompt})
-        messages.append({"role": "user", "content": text})
-
+        system_prompt = system_prompt or self.system_prompt
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
         if history:
             assert len(history) % 2 == 0, "History should have even number of elements."
-            messages = history + messages
+            messages.extend(history)
+        messages.append({"role": "user", "content": text})
 
         kwargs["messages"] = messages
         return kwargs
 
+    def _estimate_tokens(self, kwargs: Dict) -> int:
+        prompt_tokens = 0
+        for message in kwargs["messages"]:
+            prompt_tokens += self.tokenizer.count_tokens(message["content"])
+        return prompt_tokens + kwargs["max_tokens"]
+
+    async def _wait_for_quota(self, estimated_tokens: int):
+        if self.request_limit:
+            await self.rpm.wait(silent=True)
+            await self.tpm.wait(estimated_tokens, silent=True)
+
+    def _record_usage(self, completion, estimated_tokens: int):
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.token_usage.append(
+            {
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "total_tokens": usage.total_tokens,
+                # prompt tokens served from the server's prefix cache
+                "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+            }
+        )
+        if self.request_limit:
+            self.tpm.correct(estimated_tokens, usage.total_tokens)
+
+    async def _create_completion(self, kwargs: Dict, endpoint=None):
+        endpoint = endpoint or self.client.chat.completions
+        if self.concurrency_limiter is None:
+            return await endpoint.create(  # pylint: disable=E1125
+                model=self.model_name, **kwargs
+            )
+        async with self.concurrency_limiter.track(
+            overload_errors=(RateLimitError, APITimeoutError)
+        ):
+            return await endpoint.create(  # pylint: disable=E1125
+                model=self.model_name, **kwargs
+            )
+
+    def _cache_key(
+        self, method: str, kwargs: Dict, nonce: Optional[Any] = None
+    ) -> Optional[str]:
+        """
+        Key of the request in the response cache, None if it is not cached.
+        A sampled request (temperature > 0) is only cached with a nonce, e.g. the
+        sample index, otherwise every sample would return the first response.
+        """
+        # serializing the messages is not free, skip it when nothing is cached
+        if self.cache is None:
+            return None
+        if kwargs.get("temperature", 0) > 0 and nonce is None:
+            return None
+        args = [
+            self.model_name,
+            self.base_url,
+            method,
+            json.dumps(kwargs, sort_keys=True),
+        ]
+        if nonce is not None:
+            args.append(str(nonce))
+        return compute_args_hash(*args)
+
     @retry(
         stop=stop_after_attempt(5),
         wait=wait_exponential(multiplier=1, min=4, max=10),
@@ -98,7 +200,7 @@ class OpenAIClient(BaseLLMClient):
         history: Optional[List[str]] = None,
         **extra: Any,
     ) -> List[Token]:
-        kwargs = self._pre_generate(text, history)
+        kwargs = self._pre_generate(text, history, extra.get("system_prompt"))
         if self.topk_per_token > 0:
             kwargs["logprobs"] = True
             kwargs["top_logprobs"] = self.topk_per_token
@@ -106,14 +208,86 @@ class OpenAIClient(BaseLLMClient):
         # Limit max_tokens to 1 to avoid long completions
         kwargs["max_tokens"] = 1
 
-        completion = await self.client.chat.completions.create(  # pylint: disable=E1125
-            model=self.model_name, **kwargs
-        )
+        cache_key = self._cache_key("generate_topk_per_token", kwargs)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return load_tokens(cached)
+
+        estimated_tokens = self._estimate_tokens(kwargs)
+        await self._wait_for_quota(estimated_tokens)
+
+        completion = await self._create_completion(kwargs)
+        self._record_usage(completion, estimated_tokens)
 
         tokens = get_top_response_tokens(completion)
 
+        if cache_key is not None:
+            self.cache.set(cache_key, dump_tokens(tokens))
         return tokens
 
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(
+            (RateLimitError, APIConnectionError, APITimeoutError)
+        ),
+    )
+    async def generate_topk_per_token_batch(
+        self,
+        texts: List[str],
+        history: Optional[List[str]] = None,
+        **extra: Any,
+    ) -> List[List[Token]]:
+        if not self.batch_completions or history:
+            return await super().generate_topk_per_token_batch(texts, history, **extra)
+
+        # the completions endpoint takes raw prompts, no chat template is applied
+        prompts = [
+            f"{self.system_prompt}\n\n{text}" if self.system_prompt else text
+            for text in texts
+        ]
+        kwargs = {
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "max_tokens": 1,
+            "logprobs": self.topk_per_token,
+        }
+        if self.seed:
+            kwargs["seed"] = self.seed
+
+        results: List[Optional[List[Token]]] = [None] * len(prompts)
+        cache_keys = [
+            self._cache_key(
+                "generate_topk_per_token_batch", {**kwargs, "prompt": prompt}
+            )
+            for prompt in prompts
+        ]
+        for i, cache_key in enumerate(cache_keys):
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    results[i] = load_tokens(cached)
+        missing = [i for i, tokens in enumerate(results) if tokens is None]
+        if not missing:
+            return results
+
+        kwargs["prompt"] = [prompts[i] for i in missing]
+        estimated_tokens = sum(
+            self.tokenizer.count_tokens_batch(kwargs["prompt"])
+        ) + len(kwargs["prompt"])
+        await self._wait_for_quota(estimated_tokens)
+
+        completion = await self._create_completion(kwargs, self.client.completions)
+        self._record_usage(completion, estimated_tokens)
+
+        for choice in completion.choices:
+            i = missing[choice.index]
+            results[i] = get_top_completion_tokens(choice)
+            if cache_keys[i] is not None:
+                self.cache.set(cache_keys[i], dump_tokens(results[i]))
+        return results
+
     @retry(
         stop=stop_after_attempt(5),
         wait=wait_exponential(multiplier=1, min=4, max=10),
@@ -127,29 +301,25 @@ class OpenAIClient(BaseLLMClient):
         history: Optional[List[str]] = None,
         **extra: Any,
     ) -> str:
-        kwargs = self._pre_generate(text, history)
+        kwargs = self._pre_generate(
+            text, history, extra.get("system_prompt"), extra.get("temperature")
+        )
 
-        prompt_tokens = 0
-        for message in kwargs["messages"]:
-            prompt_tokens += len(self.tokenizer.encode(message["content"]))
-        estimated_tokens = prompt_tokens + kwargs["max_tokens"]
+        cache_key = self._cache_key("generate_answer", kwargs, extra.get("cache_nonce"))
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return self.filter_think_tags(cached)
 
-        if self.request_limit:
-            await self.rpm.wait(silent=True)
-            await self.tpm.wait(estimated_tokens, silent=True)
+        estimated_tokens = self._estimate_tokens(kwargs)
+        await self._wait_for_quota(estimated_tokens)
 
-        completion = await self.client.chat.completions.create(  # pylint: disable=E1125
-            model=self.model_name, **kwargs
-        )
-        if hasattr(completion, "usage"):
-            self.token_usage.append(
-                {
-                    "prompt_tokens": completion.usage.prompt_tokens,
-                    "completion_tokens": completion.usage.completion_tokens,
-                    "total_tokens": completion.usage.total_tokens,
-                }
-            )
-        return self.filter_think_tags(completion.choices[0].message.content)
+        completion = await self._create_completion(kwargs)
+        self._record_usage(completion, estimated_tokens)
+        content = completion.choices[0].message.content
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
+        return self.filter_think_tags(content)
 
     async def generate_inputs_prob(
         self, text: str, history: Optional[List[str]] = None, **extra: Any
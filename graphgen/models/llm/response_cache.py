@@ -0,0 +1,125 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Any, List, Optional
+
+from graphgen.bases.datatypes import Token
+from graphgen.utils import logger
+
+
+def dump_tokens(tokens: List[Token]) -> list:
+    return [
+        {
+            "text": t.text,
+            "prob": t.prob,
+            "top_candidates": dump_tokens(t.top_candidates),
+        }
+        for t in tokens
+    ]
+
+
+def load_tokens(data: list) -> List[Token]:
+    return [
+        Token(
+            d["text"],
+            d["prob"],
+            top_candidates=load_tokens(d.get("top_candidates", [])),
+        )
+        for d in data
+    ]
+
+
+class ResponseCache:
+    """
+    On-disk cache of LLM responses keyed by request hash, with LRU eviction.
+    The same cache file can be shared by several clients since the model name
+    is part of the key.
+    """
+
+    def __init__(
+        self,
+        working_dir: str,
+        namespace: str = "llm_cache",
+        max_entries: int = 100000,
+        commit_interval: int = 100,
+    ):
+        os.makedirs(working_dir, exist_ok=True)
+        self.file_name = os.path.join(working_dir, f"{namespace}.db")
+        self.max_entries = max_entries
+        # access time updates on hits are committed in batches
+        self.commit_interval = commit_interval
+
+        self.hits = 0
+        self.misses = 0
+        self._uncommitted = 0
+
+        self._conn = sqlite3.connect(self.file_name, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        logger.info("Load LLM cache %s with %d responses", self.file_name, self._size)
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._conn.execute(
+            "SELECT value FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute(
+            "UPDATE cache SET last_access = ? WHERE key = ?", (time.time(), key)
+        )
+        self._maybe_commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        exists = self._conn.execute(
+            "SELECT 1 FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, last_access) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), time.time()),
+        )
+        if exists is None:
+            self._size += 1
+        if self._size > self.max_entries:
+            self._evict(self._size - self.max_entries)
+        # responses are expensive to reproduce, persist them right away
+        self.flush()
+
+    def _evict(self, count: int):
+        self._conn.execute(
+            "DELETE FROM cache WHERE key IN "
+            "(SELECT key FROM cache ORDER BY last_access LIMIT ?)",
+            (count,),
+        )
+        self._size -= count
+
+    def _maybe_commit(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_interval:
+            self.flush()
+
+    def flush(self):
+        self._conn.commit()
+        self._uncommitted = 0
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": self._size,
+        }
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator
 
 import pandas as pd
 
@@ -6,9 +6,16 @@ from graphgen.bases.base_reader import BaseReader
 
 
 class CsvReader(BaseReader):
-    def read(self, file_path: str) -> List[Dict[str, Any]]:
+    def __init__(self, text_column: str = "content", chunk_size: int = 10000):
+        super().__init__(text_column)
+        # rows parsed per pandas chunk
+        self.chunk_size = chunk_size
 
-        df = pd.read_csv(file_path)
-        if self.text_column not in df.columns:
-            raise ValueError(f"Missing '{self.text_column}' column in CSV file.")
-        return df.to_dict(orient="records")
+    def iter_read(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        with self.open_file(file_path) as f:
+            for df in pd.read_csv(f, chunksize=self.chunk_size):
+                if self.text_column not in df.columns:
+                    raise ValueError(
+                        f"Missing '{self.text_column}' column in CSV file."
+                    )
+                yield from df.to_dict(orient="records")
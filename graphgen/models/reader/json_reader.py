@@ -1,18 +1,44 @@
 import json
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator
 
 from graphgen.bases.base_reader import BaseReader
+from graphgen.utils import logger
+
+try:
+    import ijson
+
+    _IJSON_AVAILABLE = True
+except ImportError:
+    _IJSON_AVAILABLE = False
 
 
 class JsonReader(BaseReader):
-    def read(self, file_path: str) -> List[Dict[str, Any]]:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                for doc in data:
-                    if self.text_column not in doc:
-                        raise ValueError(
-                            f"Missing '{self.text_column}' in document: {doc}"
-                        )
-                return data
-            raise ValueError("JSON file must contain a list of documents.")
+    """
+    Reads a JSON list of documents. With ijson installed the list is parsed
+    incrementally, otherwise the whole file is loaded at once.
+    """
+
+    def _check_doc(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        if self.text_column not in doc:
+            raise ValueError(f"Missing '{self.text_column}' in document: {doc}")
+        return doc
+
+    def iter_read(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        # ijson parses bytes, text handles are deprecated there
+        with self.open_file(file_path, "rb" if _IJSON_AVAILABLE else "r") as f:
+            if not _IJSON_AVAILABLE:
+                logger.warning(
+                    "ijson is not installed, loading %s into memory at once", file_path
+                )
+                data = json.load(f)
+                if not isinstance(data, list):
+                    raise ValueError("JSON file must contain a list of documents.")
+                yield from (self._check_doc(doc) for doc in data)
+                return
+
+            events = ijson.parse(f, use_float=True)
+            _, event, _ = next(events, (None, None, None))
+            if event != "start_array":
+                raise ValueError("JSON file must contain a list of documents.")
+            for doc in ijson.items(events, "item"):
+                yield self._check_doc(doc)
@@ -1,23 +1,19 @@
 import json
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator
 
 from graphgen.bases.base_reader import BaseReader
 from graphgen.utils import logger
 
 
 class JsonlReader(BaseReader):
-    def read(self, file_path: str) -> List[Dict[str, Any]]:
-        docs = []
-        with open(file_path, "r", encoding="utf-8") as f:
+    def iter_read(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        with self.open_file(file_path) as f:
             for line in f:
                 try:
                     doc = json.loads(line)
-                    if self.text_column in doc:
-                        docs.append(doc)
-                    else:
-                        raise ValueError(
-                            f"Missing '{self.text_column}' in document: {doc}"
-                        )
                 except json.JSONDecodeError as e:
                     logger.error("Error decoding JSON line: %s. Error: %s", line, e)
-        return docs
+                    continue
+                if self.text_column not in doc:
+                    raise ValueError(f"Missing '{self.text_column}' in document: {doc}")
+                yield doc
@@ -1,14 +1,12 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator
 
 from graphgen.bases.base_reader import BaseReader
 
 
 class TxtReader(BaseReader):
-    def read(self, file_path: str) -> List[Dict[str, Any]]:
-        docs = []
-        with open(file_path, "r", encoding="utf-8") as f:
+    def iter_read(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        with self.open_file(file_path) as f:
             for line in f:
                 line = line.strip()
                 if line:
-                    docs.append({self.text_column: line})
-        return docs
+                    yield {self.text_column: line}
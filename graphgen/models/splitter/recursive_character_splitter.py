@@ -1,13 +1,24 @@
 import re
-from typing import Any, List, Optional
+from operator import sub
+from typing import Any, Dict, List, Optional, Tuple
 
 from graphgen.bases.base_splitter import BaseSplitter
 
+# constructs that look left of the search start, where searching a span of
+# the text with pos differs from searching a slice of it
+_LEFT_CONTEXT = re.compile(r"\^|\\[AbB]|\(\?<[=!]")
+_MULTI_NEWLINES = re.compile(r"\n{2,}")
+
 
 class RecursiveCharacterSplitter(BaseSplitter):
     """Splitting text by recursively look at characters.
 
     Recursively tries to split by different characters to find one that works.
+
+    split_text walks (start, end) spans of the text with separator patterns
+    compiled once per splitter, and only slices out the final chunks.
+    _split_text is the equivalent substring based version, which is still used
+    for separator patterns with capturing groups.
     """
 
     def __init__(
@@ -21,6 +32,142 @@ class RecursiveCharacterSplitter(BaseSplitter):
         super().__init__(keep_separator=keep_separator, **kwargs)
         self._separators = separators or ["\n\n", "\n", " ", ""]
         self._is_separator_regex = is_separator_regex
+        # separator -> (compiled pattern, whether to search slices of the text)
+        self._patterns: Dict[str, Tuple[re.Pattern, bool]] = {}
+
+    def _pattern(self, separator: str) -> Tuple[re.Pattern, bool]:
+        if separator not in self._patterns:
+            regex = separator if self._is_separator_regex else re.escape(separator)
+            self._patterns[separator] = (
+                re.compile(regex),
+                self._is_separator_regex and bool(_LEFT_CONTEXT.search(regex)),
+            )
+        return self._patterns[separator]
+
+    def _separator_at_end(self) -> bool:
+        return self.keep_separator == "end"
+
+    def _has_separator(self, text: str, start: int, end: int, separator: str) -> bool:
+        pattern, sliced = self._pattern(separator)
+        if sliced:
+            return pattern.search(text[start:end]) is not None
+        return pattern.search(text, start, end) is not None
+
+    def _split_span(
+        self, text: str, start: int, end: int, separator: str
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Start and end offsets of the splits of text[start:end], found in one
+        scan of the separator, see _split_text_with_regex.
+        """
+        if not separator:
+            return list(range(start, end)), list(range(start + 1, end + 1))
+        pattern, sliced = self._pattern(separator)
+        if sliced:
+            offset = start
+            matches = pattern.finditer(text[start:end])
+        else:
+            offset = 0
+            matches = pattern.finditer(text, start, end)
+
+        if not self.keep_separator:
+            spans = [m.span() for m in matches]
+            starts = [start] + [offset + e for _, e in spans]
+            ends = [offset + s for s, _ in spans] + [end]
+        else:
+            if self._separator_at_end():
+                cuts = [offset + m.end() for m in matches]
+            else:
+                cuts = [offset + m.start() for m in matches]
+            starts = [start] + cuts
+            ends = cuts + [end]
+        # drop empty splits, e.g. before a separator at the start
+        if 0 in map(sub, ends, starts):
+            kept = [(s, e) for s, e in zip(starts, ends) if s != e]
+            starts = [s for s, _ in kept]
+            ends = [e for _, e in kept]
+        return starts, ends
+
+    def _merge_spans(
+        self,
+        text: str,
+        starts: List[int],
+        ends: List[int],
+        separator: str,
+        lengths: List[int],
+    ) -> List[str]:
+        """_merge_splits of the spans, slicing each chunk out of text at once."""
+        if not self.keep_separator:
+            return self._merge_splits(
+                [text[s:e] for s, e in zip(starts, ends)], separator, lengths
+            )
+        # with kept separators the splits tile the text, a chunk is one slice
+        chunks = []
+        for lo, hi in self._pack(lengths, self.length_function(separator)):
+            chunk = self._finish_chunk(
+                text[starts[lo] : ends[hi - 1]] if hi > lo else ""
+            )
+            if chunk is not None:
+                chunks.append(chunk)
+        return chunks
+
+    def _split_spans(
+        self,
+        text: str,
+        start: int,
+        end: int,
+        separators: List[str],
+        final_chunks: List[str],
+    ):
+        """Offset based _split_text of text[start:end], appends to final_chunks."""
+        # Get appropriate separator to use
+        separator = separators[-1]
+        new_separators = []
+        for i, _s in enumerate(separators):
+            if _s == "":
+                separator = _s
+                break
+            if self._has_separator(text, start, end, _s):
+                separator = _s
+                new_separators = separators[i + 1 :]
+                break
+
+        starts, ends = self._split_span(text, start, end, separator)
+        if self.length_function is len:
+            lengths = list(map(sub, ends, starts))
+        else:
+            lengths = [self.length_function(text[s:e]) for s, e in zip(starts, ends)]
+
+        # Now go merging things, recursively splitting longer texts.
+        _separator = "" if self.keep_separator else separator
+        # the good splits are the run first..i-1 before an oversize split i
+        first = 0
+        for i, _len in enumerate(lengths):
+            if _len < self.chunk_size:
+                continue
+            if first < i:
+                final_chunks.extend(
+                    self._merge_spans(
+                        text,
+                        starts[first:i],
+                        ends[first:i],
+                        _separator,
+                        lengths[first:i],
+                    )
+                )
+            if not new_separators:
+                final_chunks.append(text[starts[i] : ends[i]])
+            else:
+                self._split_spans(
+                    text, starts[i], ends[i], new_separators, final_chunks
+                )
+            first = i + 1
+        if first < len(lengths):
+            final_chunks.extend(
+                self._merge_spans(
+                    text, starts[first:], ends[first:], _separator, lengths[first:]
+                )
+            )
 
     def _split_text(self, text: str, separators: List[str]) -> List[str]:
         """Split incoming text and return chunks."""
@@ -43,27 +190,40 @@ class RecursiveCharacterSplitter(BaseSplitter):
 
         # Now go merging things, recursively splitting longer texts.
         _good_splits = []
+        _good_lengths = []
         _separator = "" if self.keep_separator else separator
         for s in splits:
-            if self.length_function(s) < self.chunk_size:
+            _len = self.length_function(s)
+            if _len < self.chunk_size:
                 _good_splits.append(s)
+                _good_lengths.append(_len)
             else:
                 if _good_splits:
-                    merged_text = self._merge_splits(_good_splits, _separator)
+                    merged_text = self._merge_splits(
+                        _good_splits, _separator, _good_lengths
+                    )
                     final_chunks.extend(merged_text)
                     _good_splits = []
+                    _good_lengths = []
                 if not new_separators:
                     final_chunks.append(s)
                 else:
                     other_info = self._split_text(s, new_separators)
                     final_chunks.extend(other_info)
         if _good_splits:
-            merged_text = self._merge_splits(_good_splits, _separator)
+            merged_text = self._merge_splits(_good_splits, _separator, _good_lengths)
             final_chunks.extend(merged_text)
         return final_chunks
 
+    def _postprocess(self, chunks: List[str]) -> List[str]:
+        return chunks
+
     def split_text(self, text: str) -> List[str]:
-        return self._split_text(text, self._separators)
+        if any(self._pattern(s)[0].groups for s in self._separators):
+            return self._postprocess(self._split_text(text, self._separators))
+        final_chunks = []
+        self._split_spans(text, 0, len(text), self._separators, final_chunks)
+        return self._postprocess(final_chunks)
 
 
 class ChineseRecursiveTextSplitter(RecursiveCharacterSplitter):
@@ -85,6 +245,16 @@ class ChineseRecursiveTextSplitter(RecursiveCharacterSplitter):
         ]
         self._is_separator_regex = is_separator_regex
 
+    def _separator_at_end(self) -> bool:
+        return True
+
+    def _postprocess(self, chunks: List[str]) -> List[str]:
+        return [
+            _MULTI_NEWLINES.sub("\n", chunk.strip())
+            for chunk in chunks
+            if chunk.strip() != ""
+        ]
+
     def _split_text_with_regex_from_end(
         self, text: str, separator: str, keep_separator: bool
     ) -> List[str]:
@@ -125,25 +295,27 @@ class ChineseRecursiveTextSplitter(RecursiveCharacterSplitter):
 
         # Now go merging things, recursively splitting longer texts.
         _good_splits = []
+        _good_lengths = []
         _separator = "" if self.keep_separator else separator
         for s in splits:
-            if self.length_function(s) < self.chunk_size:
+            _len = self.length_function(s)
+            if _len < self.chunk_size:
                 _good_splits.append(s)
+                _good_lengths.append(_len)
             else:
                 if _good_splits:
-                    merged_text = self._merge_splits(_good_splits, _separator)
+                    merged_text = self._merge_splits(
+                        _good_splits, _separator, _good_lengths
+                    )
                     final_chunks.extend(merged_text)
                     _good_splits = []
+                    _good_lengths = []
                 if not new_separators:
                     final_chunks.append(s)
                 else:
                     other_info = self._split_text(s, new_separators)
                     final_chunks.extend(other_info)
         if _good_splits:
-            merged_text = self._merge_splits(_good_splits, _separator)
+            merged_text = self._merge_splits(_good_splits, _separator, _good_lengths)
             final_chunks.extend(merged_text)
-        return [
-            re.sub(r"\n{2,}", "\n", chunk.strip())
-            for chunk in final_chunks
-            if chunk.strip() != ""
-        ]
+        return self._postprocess(final_chunks)
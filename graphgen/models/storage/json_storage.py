@@ -1,8 +1,15 @@
+import json
 import os
 from dataclasses import dataclass
+from itertools import islice
+from typing import Iterator
 
 from graphgen.bases.base_storage import BaseKVStorage, BaseListStorage
-from graphgen.utils import load_json, logger, write_json
+from graphgen.utils import compute_content_hash, load_json, logger, write_json
+
+
+def _hash_item(item) -> str:
+    return compute_content_hash(json.dumps(item, sort_keys=True, ensure_ascii=False))
 
 
 @dataclass
@@ -47,6 +54,9 @@ class JsonKVStorage(BaseKVStorage):
         self._data.update(left_data)
         return left_data
 
+    async def update(self, data: dict):
+        self._data.update(data)
+
     async def drop(self):
         self._data = {}
 
@@ -58,6 +68,7 @@ class JsonListStorage(BaseListStorage):
     def __post_init__(self):
         self._file_name = os.path.join(self.working_dir, f"{self.namespace}.json")
         self._data = load_json(self._file_name) or []
+        self._hashes = {_hash_item(d) for d in self._data}
         logger.info("Load List %s with %d data", self.namespace, len(self._data))
 
     @property
@@ -77,11 +88,120 @@ class JsonListStorage(BaseListStorage):
 
     async def append(self, data):
         self._data.append(data)
+        self._hashes.add(_hash_item(data))
 
     async def upsert(self, data: list):
-        left_data = [d for d in data if d not in self._data]
+        left_data = []
+        for d in data:
+            item_hash = _hash_item(d)
+            if item_hash not in self._hashes:
+                self._hashes.add(item_hash)
+                left_data.append(d)
         self._data.extend(left_data)
         return left_data
 
     async def drop(self):
         self._data = []
+        self._hashes = set()
+
+
+@dataclass
+class JsonlListStorage(BaseListStorage):
+    """
+    List storage that appends records to a JSONL file as they arrive.
+    Only content hashes are kept in memory to deduplicate upserts.
+    """
+
+    # number of buffered records that triggers a flush to disk
+    flush_interval: int = 100
+
+    def __post_init__(self):
+        self._file_name = os.path.join(self.working_dir, f"{self.namespace}.jsonl")
+        self._buffer: list = []
+        self._hashes: set[str] = set()
+        self._count = 0
+        self._repair_tail()
+        for item in self._iter_file():
+            self._hashes.add(_hash_item(item))
+            self._count += 1
+        logger.info("Load List %s with %d data", self.namespace, self._count)
+
+    def _repair_tail(self):
+        """Drop a partially written last line, e.g. after a crash mid-flush."""
+        if not os.path.exists(self._file_name):
+            return
+        with open(self._file_name, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            content = f.read()
+            f.truncate(content.rfind(b"\n") + 1)
+        logger.warning("Dropped incomplete last record of %s", self._file_name)
+
+    def _iter_file(self) -> Iterator:
+        if not os.path.exists(self._file_name):
+            return
+        with open(self._file_name, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        os.makedirs(self.working_dir, exist_ok=True)
+        with open(self._file_name, "a", encoding="utf-8") as f:
+            for item in self._buffer:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._buffer = []
+
+    @property
+    def data(self):
+        self._flush()
+        return list(self._iter_file())
+
+    async def all_items(self) -> list:
+        return self.data
+
+    async def index_done_callback(self):
+        self._flush()
+
+    async def get_by_index(self, index: int):
+        if index < 0 or index >= self._count:
+            return None
+        self._flush()
+        return next(islice(self._iter_file(), index, None), None)
+
+    async def append(self, data):
+        self._buffer.append(data)
+        self._hashes.add(_hash_item(data))
+        self._count += 1
+        if len(self._buffer) >= self.flush_interval:
+            self._flush()
+
+    async def upsert(self, data: list):
+        left_data = []
+        for d in data:
+            item_hash = _hash_item(d)
+            if item_hash not in self._hashes:
+                self._hashes.add(item_hash)
+                left_data.append(d)
+        self._buffer.extend(left_data)
+        self._count += len(left_data)
+        if len(self._buffer) >= self.flush_interval:
+            self._flush()
+        return left_data
+
+    async def drop(self):
+        self._buffer = []
+        self._hashes = set()
+        self._count = 0
+        if os.path.exists(self._file_name):
+            os.remove(self._file_name)
@@ -3,19 +3,71 @@ import os
 from dataclasses import dataclass
 from typing import Any, Optional, Union, cast
 
+import msgpack
 import networkx as nx
 
 from graphgen.bases.base_storage import BaseGraphStorage
 from graphgen.utils import logger
 
+_SNAPSHOT_VERSION = 1
+
+_SUFFIXES = {
+    "graphml": "graphml",
+    "msgpack": "msgpack",
+}
+
+
+def _to_columns(items: list[dict]) -> dict[str, list]:
+    """
+    Turn a list of attribute dicts into columns, missing values are stored as None.
+    """
+    columns: dict[str, list] = {}
+    for i, attrs in enumerate(items):
+        for key, value in attrs.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [None] * len(items)
+            column[i] = value
+    return columns
+
+
+def _from_columns(columns: dict[str, list], size: int) -> list[dict]:
+    rows: list[dict] = [{} for _ in range(size)]
+    for key, column in columns.items():
+        for row, value in zip(rows, column):
+            if value is not None:
+                row[key] = value
+    return rows
+
+
+def _delta(attrs: dict, data: dict) -> dict:
+    """
+    Attributes of data that differ from attrs. If data is attrs itself, e.g.
+    mutated in place by the caller, the changes are unknown and all are returned.
+    Callers holding the live attrs must update before they mutate, otherwise
+    the change looks like a no-op and is not logged.
+    """
+    if data is attrs:
+        return dict(data)
+    return {k: v for k, v in data.items() if k not in attrs or attrs[k] != v}
+
 
 @dataclass
 class NetworkXStorage(BaseGraphStorage):
+    # snapshot format on disk, support: msgpack, graphml
+    storage_format: str = "msgpack"
+    # log mutations to an append-only file instead of rewriting the whole graph
+    enable_wal: bool = True
+    # number of logged mutations after which the log is compacted into a snapshot
+    compaction_threshold: int = 100000
+
     @staticmethod
     def load_nx_graph(file_name) -> Optional[nx.Graph]:
-        if os.path.exists(file_name):
+        if not os.path.exists(file_name):
+            return None
+        if file_name.endswith(".graphml"):
             return nx.read_graphml(file_name)
-        return None
+        return NetworkXStorage.load_snapshot(file_name)
 
     @staticmethod
     def write_nx_graph(graph: nx.Graph, file_name):
@@ -24,7 +76,71 @@ class NetworkXStorage(BaseGraphStorage):
             graph.number_of_nodes(),
             graph.number_of_edges(),
         )
-        nx.write_graphml(graph, file_name)
+        if file_name.endswith(".graphml"):
+            nx.write_graphml(graph, file_name)
+        else:
+            NetworkXStorage.write_snapshot(graph, file_name)
+
+    @staticmethod
+    def load_snapshot(file_name) -> nx.Graph:
+        """
+        Load a graph from a columnar msgpack snapshot written by `write_snapshot`.
+        """
+        with open(file_name, "rb") as f:
+            snapshot = msgpack.unpackb(f.read(), raw=False, strict_map_key=False)
+        if snapshot.get("version") != _SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Unsupported graph snapshot version {snapshot.get('version')} "
+                f"in {file_name}"
+            )
+
+        graph = nx.DiGraph() if snapshot["directed"] else nx.Graph()
+        nodes = snapshot["nodes"]
+        node_ids = nodes["ids"]
+        graph.add_nodes_from(
+            zip(node_ids, _from_columns(nodes["attrs"], len(node_ids)))
+        )
+        edges = snapshot["edges"]
+        graph.add_edges_from(
+            zip(
+                edges["src"],
+                edges["tgt"],
+                _from_columns(edges["attrs"], len(edges["src"])),
+            )
+        )
+        return graph
+
+    @staticmethod
+    def write_snapshot(graph: nx.Graph, file_name):
+        """
+        Write the graph as columnar node and edge tables packed with msgpack.
+        The file is replaced atomically so a crash never leaves a truncated snapshot.
+        """
+        node_ids, node_attrs = [], []
+        for node_id, attrs in graph.nodes(data=True):
+            node_ids.append(node_id)
+            node_attrs.append(attrs)
+        src_ids, tgt_ids, edge_attrs = [], [], []
+        for src, tgt, attrs in graph.edges(data=True):
+            src_ids.append(src)
+            tgt_ids.append(tgt)
+            edge_attrs.append(attrs)
+
+        snapshot = {
+            "version": _SNAPSHOT_VERSION,
+            "directed": graph.is_directed(),
+            "nodes": {"ids": node_ids, "attrs": _to_columns(node_attrs)},
+            "edges": {
+                "src": src_ids,
+                "tgt": tgt_ids,
+                "attrs": _to_columns(edge_attrs),
+            },
+        }
+        os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+        tmp_file = f"{file_name}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(msgpack.packb(snapshot, use_bin_type=True))
+        os.replace(tmp_file, file_name)
 
     @staticmethod
     def stable_largest_connected_component(graph: nx.Graph) -> nx.Graph:
@@ -77,21 +193,146 @@ class NetworkXStorage(BaseGraphStorage):
         """
         如果图文件存在，则加载图文件，否则创建一个新图
         """
+        if self.storage_format not in _SUFFIXES:
+            raise ValueError(
+                f"Unsupported graph storage format: {self.storage_format}. "
+                f"Supported formats are: {list(_SUFFIXES.keys())}"
+            )
         self._graphml_xml_file = os.path.join(
             self.working_dir, f"{self.namespace}.graphml"
         )
-        preloaded_graph = NetworkXStorage.load_nx_graph(self._graphml_xml_file)
+        self._graph_file = os.path.join(
+            self.working_dir, f"{self.namespace}.{_SUFFIXES[self.storage_format]}"
+        )
+
+        load_file = self._graph_file
+        if not os.path.exists(load_file) and os.path.exists(self._graphml_xml_file):
+            # migrate caches written before the binary snapshot format existed
+            load_file = self._graphml_xml_file
+        preloaded_graph = NetworkXStorage.load_nx_graph(load_file)
         if preloaded_graph is not None:
             logger.info(
                 "Loaded graph from %s with %d nodes, %d edges",
-                self._graphml_xml_file,
+                load_file,
                 preloaded_graph.number_of_nodes(),
                 preloaded_graph.number_of_edges(),
             )
         self._graph = preloaded_graph or nx.Graph()
 
+        self._wal_file = os.path.join(self.working_dir, f"{self.namespace}.wal")
+        self._wal_buffer = bytearray()
+        self._wal_records = 0
+        self._pending_records = 0
+        # the snapshot is stale until it has been written in the configured format
+        self._snapshot_graph_id = (
+            id(self._graph) if load_file == self._graph_file else None
+        )
+        if self.enable_wal:
+            self._replay_wal()
+
+    def _replay_wal(self):
+        """
+        Re-apply the mutations logged since the last snapshot.
+        An incomplete record at the tail (e.g. after a crash) is dropped.
+        """
+        if not os.path.exists(self._wal_file):
+            return
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        with open(self._wal_file, "rb") as f:
+            unpacker.feed(f.read())
+        valid_offset = 0
+        try:
+            for record in unpacker:
+                self._apply_record(record)
+                self._wal_records += 1
+                valid_offset = unpacker.tell()
+        except (ValueError, msgpack.UnpackException) as e:
+            logger.warning("Corrupted record in %s: %s", self._wal_file, e)
+        if valid_offset < os.path.getsize(self._wal_file):
+            logger.warning(
+                "Dropping incomplete tail of %s after %d records",
+                self._wal_file,
+                self._wal_records,
+            )
+            with open(self._wal_file, "r+b") as f:
+                f.truncate(valid_offset)
+        logger.info(
+            "Replayed %d graph mutations from %s", self._wal_records, self._wal_file
+        )
+
+    def _apply_record(self, record: list):
+        op, *args = record
+        if op == "upsert_node":
+            self._graph.add_node(args[0], **args[1])
+        elif op == "update_node":
+            if self._graph.has_node(args[0]):
+                self._graph.nodes[args[0]].update(args[1])
+        elif op == "upsert_edge":
+            self._graph.add_edge(args[0], args[1], **args[2])
+        elif op == "update_edge":
+            if self._graph.has_edge(args[0], args[1]):
+                self._graph.edges[(args[0], args[1])].update(args[2])
+        elif op == "delete_node":
+            if self._graph.has_node(args[0]):
+                self._graph.remove_node(args[0])
+        elif op == "clear":
+            self._graph.clear()
+        else:
+            raise ValueError(f"Unknown graph mutation: {op}")
+
+    def _log(self, op: str, *args):
+        if not self.enable_wal:
+            return
+        # pack eagerly, callers may keep mutating the attribute dicts they passed in
+        self._wal_buffer += msgpack.packb([op, *args], use_bin_type=True)
+        self._pending_records += 1
+
+    def _compact(self):
+        NetworkXStorage.write_nx_graph(self._graph, self._graph_file)
+        self._snapshot_graph_id = id(self._graph)
+        self._wal_buffer = bytearray()
+        self._wal_records = 0
+        self._pending_records = 0
+        if os.path.exists(self._wal_file):
+            os.remove(self._wal_file)
+
     async def index_done_callback(self):
-        NetworkXStorage.write_nx_graph(self._graph, self._graphml_xml_file)
+        if not self.enable_wal:
+            NetworkXStorage.write_nx_graph(self._graph, self._graph_file)
+            return
+
+        # the graph object may have been swapped out, e.g. by loading an external graph
+        if (
+            self._snapshot_graph_id != id(self._graph)
+            or self._wal_records + self._pending_records >= self.compaction_threshold
+        ):
+            self._compact()
+            return
+
+        if not self._wal_buffer:
+            return
+        with open(self._wal_file, "ab") as f:
+            f.write(self._wal_buffer)
+            f.flush()
+            os.fsync(f.fileno())
+        logger.info(
+            "Appended %d graph mutations to %s", self._pending_records, self._wal_file
+        )
+        self._wal_records += self._pending_records
+        self._wal_buffer = bytearray()
+        self._pending_records = 0
+
+    async def export_graphml(self, file_name: Optional[str] = None) -> str:
+        """
+        Export the graph as GraphML, e.g. for visualization tools.
+
+        :param file_name: target file, defaults to <working_dir>/<namespace>.graphml
+        :return: path of the written file
+        """
+        file_name = file_name or self._graphml_xml_file
+        nx.write_graphml(self._graph, file_name)
+        logger.info("Graph %s exported to %s", self.namespace, file_name)
+        return file_name
 
     async def has_node(self, node_id: str) -> bool:
         return self._graph.has_node(node_id)
@@ -130,24 +371,46 @@ class NetworkXStorage(BaseGraphStorage):
         return self._graph
 
     async def upsert_node(self, node_id: str, node_data: dict[str, str]):
+        # only the changed attributes are logged, add_node merges them on replay
+        if self._graph.has_node(node_id):
+            delta = _delta(self._graph.nodes[node_id], node_data)
+        else:
+            delta = node_data
         self._graph.add_node(node_id, **node_data)
+        if delta or delta is node_data:
+            self._log("upsert_node", node_id, delta)
 
     async def update_node(self, node_id: str, node_data: dict[str, str]):
         if self._graph.has_node(node_id):
+            delta = _delta(self._graph.nodes[node_id], node_data)
             self._graph.nodes[node_id].update(node_data)
+            if delta:
+                self._log("update_node", node_id, delta)
         else:
             logger.warning("Node %s not found in the graph for update.", node_id)
 
     async def upsert_edge(
         self, source_node_id: str, target_node_id: str, edge_data: dict[str, str]
     ):
+        if self._graph.has_edge(source_node_id, target_node_id):
+            delta = _delta(
+                self._graph.edges[(source_node_id, target_node_id)], edge_data
+            )
+        else:
+            delta = edge_data
         self._graph.add_edge(source_node_id, target_node_id, **edge_data)
+        if delta or delta is edge_data:
+            self._log("upsert_edge", source_node_id, target_node_id, delta)
 
     async def update_edge(
         self, source_node_id: str, target_node_id: str, edge_data: dict[str, str]
     ):
         if self._graph.has_edge(source_node_id, target_node_id):
-            self._graph.edges[(source_node_id, target_node_id)].update(edge_data)
+            attrs = self._graph.edges[(source_node_id, target_node_id)]
+            delta = _delta(attrs, edge_data)
+            attrs.update(edge_data)
+            if delta:
+                self._log("update_edge", source_node_id, target_node_id, delta)
         else:
             logger.warning(
                 "Edge %s -> %s not found in the graph for update.",
@@ -163,6 +426,7 @@ class NetworkXStorage(BaseGraphStorage):
         """
         if self._graph.has_node(node_id):
             self._graph.remove_node(node_id)
+            self._log("delete_node", node_id)
             logger.info("Node %s deleted from the graph.", node_id)
         else:
             logger.warning("Node %s not found in the graph for deletion.", node_id)
@@ -172,4 +436,5 @@ class NetworkXStorage(BaseGraphStorage):
         Clear the graph by removing all nodes and edges.
         """
         self._graph.clear()
+        self._log("clear")
         logger.info("Graph %s cleared.", self.namespace)
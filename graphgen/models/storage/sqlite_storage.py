@@ -0,0 +1,120 @@
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from graphgen.bases.base_storage import BaseKVStorage
+from graphgen.utils import load_json, logger
+
+
+def _batched(items: list, size: int) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+@dataclass
+class SQLiteKVStorage(BaseKVStorage):
+    """
+    KV storage backed by a SQLite database in WAL mode.
+    Values are stored as JSON, so it can replace JsonKVStorage for any namespace
+    without loading the whole namespace into memory.
+    """
+
+    # number of keys bound per query, kept below SQLite's host parameter limit
+    batch_size: int = 500
+
+    def __post_init__(self):
+        os.makedirs(self.working_dir, exist_ok=True)
+        self._file_name = os.path.join(self.working_dir, f"{self.namespace}.db")
+        is_new = not os.path.exists(self._file_name)
+        self._conn = sqlite3.connect(self._file_name, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+        count = self._import_json() if is_new else self._count()
+        logger.info("Load KV %s with %d data", self.namespace, count)
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+
+    def _import_json(self) -> int:
+        """Import the JSON file written by JsonKVStorage for the same namespace."""
+        json_file = os.path.join(self.working_dir, f"{self.namespace}.json")
+        data = load_json(json_file)
+        if not data:
+            return 0
+        self._insert(data.items())
+        self._conn.commit()
+        logger.info("Imported %d records from %s", len(data), json_file)
+        return len(data)
+
+    def _insert(self, items: Iterable[tuple], replace: bool = False):
+        self._conn.executemany(
+            f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO kv (key, value) "
+            "VALUES (?, ?)",
+            ((k, json.dumps(v, ensure_ascii=False)) for k, v in items),
+        )
+
+    def _fetch(self, ids: list[str]) -> dict:
+        found = {}
+        for batch in _batched(ids, self.batch_size):
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, value FROM kv WHERE key IN ({placeholders})", batch
+            )
+            for key, value in rows:
+                found[key] = json.loads(value)
+        return found
+
+    async def all_keys(self) -> list[str]:
+        return [row[0] for row in self._conn.execute("SELECT key FROM kv")]
+
+    async def index_done_callback(self):
+        self._conn.commit()
+
+    async def get_by_id(self, id):
+        row = self._conn.execute("SELECT value FROM kv WHERE key = ?", (id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def get_by_ids(self, ids, fields=None) -> list:
+        found = self._fetch(list(ids))
+        if fields is None:
+            return [found.get(id, None) for id in ids]
+        return [
+            (
+                {k: v for k, v in found[id].items() if k in fields}
+                if found.get(id, None)
+                else None
+            )
+            for id in ids
+        ]
+
+    async def filter_keys(self, data: list[str]) -> set[str]:
+        existing = set()
+        keys = list(data)
+        for batch in _batched(keys, self.batch_size):
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key FROM kv WHERE key IN ({placeholders})", batch
+            )
+            existing.update(row[0] for row in rows)
+        return {s for s in keys if s not in existing}
+
+    async def upsert(self, data: dict):
+        new_keys = await self.filter_keys(list(data.keys()))
+        left_data = {k: v for k, v in data.items() if k in new_keys}
+        self._insert(left_data.items())
+        return left_data
+
+    async def update(self, data: dict):
+        self._insert(data.items(), replace=True)
+
+    async def drop(self):
+        self._conn.execute("DELETE FROM kv")
+        self._conn.commit()
@@ -1,7 +1,10 @@
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from typing import List
 
 from graphgen.bases import BaseTokenizer
+from graphgen.utils import compute_content_hash
 
 from .tiktoken_tokenizer import TiktokenTokenizer
 
@@ -37,12 +40,28 @@ class Tokenizer(BaseTokenizer):
     """
 
     model_name: str = "cl100k_base"
+    # LRU of token counts by content hash, max_cached_counts <= 0 disables it
+    max_cached_counts: int = 100000
     _impl: BaseTokenizer = field(init=False, repr=False)
 
     def __post_init__(self):
         if not self.model_name:
             raise ValueError("TOKENIZER_MODEL must be specified in the ENV variables.")
         self._impl = get_tokenizer_impl(self.model_name)
+        self._count_cache: OrderedDict = OrderedDict()
+        # counts are also taken in executor threads
+        self._count_lock = threading.Lock()
+
+    def __getstate__(self):
+        # pickled by name, e.g. for worker processes, and rebuilt on unpickling
+        return {
+            "model_name": self.model_name,
+            "max_cached_counts": self.max_cached_counts,
+        }
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.__post_init__()
 
     def encode(self, text: str) -> List[int]:
         return self._impl.encode(text)
@@ -50,5 +69,38 @@ class Tokenizer(BaseTokenizer):
     def decode(self, token_ids: List[int]) -> str:
         return self._impl.decode(token_ids)
 
+    def _cached_count(self, key: str):
+        with self._count_lock:
+            count = self._count_cache.get(key)
+            if count is not None:
+                self._count_cache.move_to_end(key)
+            return count
+
+    def _cache_counts(self, items):
+        with self._count_lock:
+            self._count_cache.update(items)
+            while len(self._count_cache) > self.max_cached_counts:
+                self._count_cache.popitem(last=False)
+
     def count_tokens(self, text: str) -> int:
-        return self._impl.count_tokens(text)
+        if self.max_cached_counts <= 0:
+            return self._impl.count_tokens(text)
+        key = compute_content_hash(text)
+        count = self._cached_count(key)
+        if count is None:
+            count = self._impl.count_tokens(text)
+            self._cache_counts([(key, count)])
+        return count
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        if self.max_cached_counts <= 0:
+            return self._impl.count_tokens_batch(texts)
+        keys = [compute_content_hash(text) for text in texts]
+        counts = {key: self._cached_count(key) for key in keys}
+        missing = {key: text for key, text in zip(keys, texts) if counts[key] is None}
+        if missing:
+            counts.update(
+                zip(missing, self._impl.count_tokens_batch(list(missing.values())))
+            )
+            self._cache_counts((key, counts[key]) for key in missing)
+        return [counts[key] for key in keys]
@@ -16,3 +16,22 @@ class HFTokenizer(BaseTokenizer):
 
     def decode(self, token_ids: List[int]) -> str:
         return self.enc.decode(token_ids, skip_special_tokens=True)
+
+    def count_tokens(self, text: str) -> int:
+        if not self.enc.is_fast:
+            return len(self.encode(text))
+        # the rust encoding is counted without converting its ids to a list
+        return len(self.enc.backend_tokenizer.encode(text, add_special_tokens=False))
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        if not self.enc.is_fast:
+            return [len(self.encode(text)) for text in texts]
+        # fast tokenizers encode a batch in parallel
+        return [
+            len(encoding)
+            for encoding in self.enc.backend_tokenizer.encode_batch(
+                texts, add_special_tokens=False
+            )
+        ]
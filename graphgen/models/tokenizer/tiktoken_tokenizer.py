@@ -16,3 +16,11 @@ class TiktokenTokenizer(BaseTokenizer):
 
     def decode(self, token_ids: List[int]) -> str:
         return self.enc.decode(token_ids)
+
+    # special tokens are counted as plain text, so that counting never raises
+    def count_tokens(self, text: str) -> int:
+        return len(self.enc.encode_ordinary(text))
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        # tiktoken encodes the batch in threads without holding the GIL
+        return [len(ids) for ids in self.enc.encode_ordinary_batch(texts)]
@@ -4,7 +4,7 @@ from graphgen.operators.search.search_all import search_all
 
 from .judge import judge_statement
 from .quiz import quiz
-from .read import read_files
+from .read import iter_read_files, read_files
 from .split import chunk_documents
 from .traverse_graph import (
     traverse_graph_for_aggregated,
@@ -1,12 +1,179 @@
+import asyncio
 from collections import defaultdict
-from typing import List
+from typing import Dict, List, Tuple
 
 import gradio as gr
+from tqdm.asyncio import tqdm as tqdm_async
 
-from graphgen.bases.base_storage import BaseGraphStorage
+from graphgen.bases.base_storage import BaseGraphStorage, BaseKVStorage
 from graphgen.bases.datatypes import Chunk
 from graphgen.models import LightRAGKGBuilder, OpenAIClient
-from graphgen.utils import run_concurrent
+from graphgen.utils import logger, resolve_max_concurrent, run_concurrent
+
+
+def _log_prompt_cache_usage(token_usage: List[dict]):
+    prompt_tokens = sum(u["prompt_tokens"] for u in token_usage)
+    cached_tokens = sum(u.get("cached_tokens", 0) for u in token_usage)
+    if prompt_tokens:
+        logger.info(
+            "Prompt cache hit %d/%d (%.1f%%) prompt tokens in %d extraction requests",
+            cached_tokens,
+            prompt_tokens,
+            100 * cached_tokens / prompt_tokens,
+            len(token_usage),
+        )
+
+
+class ExtractionLog:
+    """
+    Per-chunk extraction status in a KV storage, so that an interrupted insert
+    resumes where it stopped: "pending" chunks are extracted, "extracted" chunks
+    reuse their persisted records and only "merged" chunks are done.
+    """
+
+    def __init__(self, storage: BaseKVStorage = None, flush_interval: int = 100):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self._unflushed = 0
+
+    async def load(self, chunk_ids: List[str]) -> Dict[str, tuple]:
+        """Return the persisted (nodes, edges) of the chunks already extracted."""
+        if self.storage is None:
+            return {}
+        records = await self.storage.get_by_ids(chunk_ids)
+        return {
+            chunk_id: (
+                record["nodes"],
+                {(src, tgt): v for src, tgt, v in record["edges"]},
+            )
+            for chunk_id, record in zip(chunk_ids, records)
+            if record is not None and record.get("status") == "extracted"
+        }
+
+    async def extracted(self, chunk_id: str, nodes: dict, edges: dict):
+        if self.storage is None:
+            return
+        await self.storage.update(
+            {
+                chunk_id: {
+                    "status": "extracted",
+                    "nodes": nodes,
+                    "edges": [[src, tgt, v] for (src, tgt), v in edges.items()],
+                }
+            }
+        )
+        self._unflushed += 1
+        if self._unflushed >= self.flush_interval:
+            await self.flush()
+
+    async def merged(self, chunk_ids: List[str]):
+        """Mark chunks as merged, must be called after the graph is persisted."""
+        if self.storage is None:
+            return
+        await self.storage.update(
+            {chunk_id: {"status": "merged"} for chunk_id in chunk_ids}
+        )
+        await self.flush()
+
+    async def flush(self):
+        self._unflushed = 0
+        await self.storage.index_done_callback()
+
+
+async def merge_kg(
+    kg_builder: LightRAGKGBuilder,
+    kg_instance: BaseGraphStorage,
+    nodes: Dict[str, List[dict]],
+    edges: Dict[Tuple[str, str], List[dict]],
+    max_concurrent: int = 100,
+):
+    """
+    Merge nodes and edges into the graph concurrently.
+    The builder serializes merges of the same key and bounds the summary LLM calls
+    on its own. An edge only waits for the merges of its own endpoints, so that it
+    never writes a placeholder over an entity of this batch. Node merges are
+    scheduled before edge merges and the slots are handed out in order, so the
+    edges holding a slot never wait on a node that cannot get one.
+    """
+    node_merged = {entity_name: asyncio.Event() for entity_name in nodes}
+
+    async def _merge_node(kv):
+        try:
+            await kg_builder.merge_nodes(kv, kg_instance=kg_instance)
+        finally:
+            node_merged[kv[0]].set()
+
+    async def _merge_edge(kv):
+        for node_id in kv[0]:
+            if node_id in node_merged:
+                await node_merged[node_id].wait()
+        await kg_builder.merge_edges(kv, kg_instance=kg_instance)
+
+    items = [(_merge_node, kv) for kv in nodes.items()] + [
+        (_merge_edge, kv) for kv in edges.items()
+    ]
+    await run_concurrent(
+        lambda item: item[0](item[1]),
+        items,
+        desc="Inserting entities and relationships into storage",
+        max_concurrent=max_concurrent,
+    )
+
+
+def _collect(results, nodes: dict, edges: dict):
+    for _, n, e in results:
+        for k, v in n.items():
+            nodes[k].extend(v)
+        for k, v in e.items():
+            edges[tuple(sorted(k))].extend(v)
+
+
+async def _extract_and_merge_streaming(
+    extract_fn,
+    kg_builder: LightRAGKGBuilder,
+    kg_instance: BaseGraphStorage,
+    extraction_log: ExtractionLog,
+    chunks: List[Chunk],
+    merge_batch_size: int,
+    max_concurrent: int,
+    progress_bar: gr.Progress = None,
+):
+    """
+    Merge extraction results every merge_batch_size chunks while the remaining
+    chunks are still being extracted, and checkpoint the graph after each merge.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def _extract(chunk: Chunk):
+        async with semaphore:
+            return await extract_fn(chunk)
+
+    async def _merge_buffer():
+        await merge_kg(kg_builder, kg_instance, nodes, edges)
+        await kg_instance.index_done_callback()
+        await extraction_log.merged(chunk_ids)
+
+    desc = "[2/4]Extracting entities and relationships from chunks"
+    tasks = [asyncio.create_task(_extract(chunk)) for chunk in chunks]
+    nodes, edges, chunk_ids = defaultdict(list), defaultdict(list), []
+    for idx, task in enumerate(
+        tqdm_async(asyncio.as_completed(tasks), total=len(tasks), desc=desc)
+    ):
+        try:
+            result = await task
+        except Exception as e:  # pylint: disable=broad-except
+            logger.exception("Task failed: %s", e)
+            result = None
+        if result is not None:
+            _collect([result], nodes, edges)
+            chunk_ids.append(result[0])
+        if len(chunk_ids) >= merge_batch_size:
+            await _merge_buffer()
+            nodes, edges, chunk_ids = defaultdict(list), defaultdict(list), []
+        if progress_bar:
+            progress_bar((idx + 1) / len(tasks), desc=desc)
+    if chunk_ids:
+        await _merge_buffer()
 
 
 async def build_kg(
@@ -14,43 +181,73 @@ async def build_kg(
     kg_instance: BaseGraphStorage,
     chunks: List[Chunk],
     progress_bar: gr.Progress = None,
+    max_loop: int = 3,
+    glean_mode: str = "llm",
+    merge_batch_size: int = 0,
+    extraction_storage: BaseKVStorage = None,
 ):
     """
     :param llm_client: Synthesizer LLM model to extract entities and relationships
     :param kg_instance
     :param chunks
     :param progress_bar: Gradio progress bar to show the progress of the extraction
+    :param max_loop: max gleaning loops per chunk
+    :param glean_mode: how to decide whether to glean again, "llm", "logprob" or "heuristic"
+    :param merge_batch_size: merge and checkpoint every this many extracted chunks,
+        0 merges once after all chunks are extracted
+    :param extraction_storage: per-chunk extraction status, enables resuming
     :return:
     """
 
-    kg_builder = LightRAGKGBuilder(llm_client=llm_client, max_loop=3)
+    kg_builder = LightRAGKGBuilder(
+        llm_client=llm_client,
+        max_loop=max_loop,
+        glean_mode=glean_mode,
+        max_summary_concurrent=resolve_max_concurrent(llm_client),
+    )
+    extraction_log = ExtractionLog(extraction_storage)
+    extracted = await extraction_log.load([chunk.id for chunk in chunks])
+    if extracted:
+        logger.info("Reuse the extraction results of %d chunks", len(extracted))
+
+    async def _extract(chunk: Chunk):
+        if chunk.id in extracted:
+            return chunk.id, *extracted.pop(chunk.id)
+        nodes, edges = await kg_builder.extract(chunk)
+        await extraction_log.extracted(chunk.id, nodes, edges)
+        return chunk.id, nodes, edges
+
+    usage_start = len(llm_client.token_usage)
+    if merge_batch_size > 0:
+        await _extract_and_merge_streaming(
+            _extract,
+            kg_builder,
+            kg_instance,
+            extraction_log,
+            chunks,
+            merge_batch_size,
+            max_concurrent=resolve_max_concurrent(llm_client),
+            progress_bar=progress_bar,
+        )
+        _log_prompt_cache_usage(llm_client.token_usage[usage_start:])
+        return kg_instance
 
     results = await run_concurrent(
-        kg_builder.extract,
+        _extract,
         chunks,
         desc="[2/4]Extracting entities and relationships from chunks",
         unit="chunk",
         progress_bar=progress_bar,
+        max_concurrent=resolve_max_concurrent(llm_client),
     )
+    _log_prompt_cache_usage(llm_client.token_usage[usage_start:])
 
     nodes = defaultdict(list)
     edges = defaultdict(list)
-    for n, e in results:
-        for k, v in n.items():
-            nodes[k].extend(v)
-        for k, v in e.items():
-            edges[tuple(sorted(k))].extend(v)
-
-    await run_concurrent(
-        lambda kv: kg_builder.merge_nodes(kv, kg_instance=kg_instance),
-        list(nodes.items()),
-        desc="Inserting entities into storage",
-    )
+    _collect(results, nodes, edges)
 
-    await run_concurrent(
-        lambda kv: kg_builder.merge_edges(kv, kg_instance=kg_instance),
-        list(edges.items()),
-        desc="Inserting relationships into storage",
-    )
+    await merge_kg(kg_builder, kg_instance, nodes, edges)
+    await kg_instance.index_done_callback()
+    await extraction_log.merged([chunk_id for chunk_id, _, _ in results])
 
     return kg_instance
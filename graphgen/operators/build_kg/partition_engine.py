@@ -0,0 +1,338 @@
+import heapq
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+def _edge_order(
+    nodes: list,
+    edges: list,
+    src: np.ndarray,
+    tgt: np.ndarray,
+    edge_sampling: str,
+    loss_strategy: str,
+) -> np.ndarray:
+    """order[rank] is the index in edges of the edge with this rank."""
+    if loss_strategy not in ("both", "only_edge"):
+        raise ValueError(f"Invalid loss strategy: {loss_strategy}")
+    if edge_sampling == "random":
+        return np.array(random.sample(range(len(edges)), len(edges)), np.int64)
+    if edge_sampling not in ("min_loss", "max_loss"):
+        raise ValueError(f"Invalid edge sampling: {edge_sampling}")
+
+    key = np.array([edge[2]["loss"] for edge in edges], dtype=np.float64)
+    if loss_strategy == "both":
+        node_loss = np.array(
+            [node_data["loss"] for _, node_data in nodes], dtype=np.float64
+        )
+        key = node_loss[src] + node_loss[tgt] + key
+    # stable, ties keep the order of edges like sorted() does
+    if edge_sampling == "max_loss":
+        key = -key
+    return np.argsort(key, kind="stable")
+
+
+def _connected_components(
+    src: np.ndarray, tgt: np.ndarray, num_nodes: int
+) -> np.ndarray:
+    """Label every node with the smallest node index of its connected component."""
+    labels = np.arange(num_nodes)
+    while True:
+        # hook the root of each edge end onto the smaller root, then flatten
+        src_root, tgt_root = labels[src], labels[tgt]
+        lowest = np.minimum(src_root, tgt_root)
+        np.minimum.at(labels, src_root, lowest)
+        np.minimum.at(labels, tgt_root, lowest)
+        while True:
+            parents = labels[labels]
+            if np.array_equal(parents, labels):
+                break
+            labels = parents
+        if np.array_equal(labels[src], labels[tgt]):
+            return labels
+
+
+class PartitionEngine:
+    """
+    Edge-centric expansion over a CSR adjacency of the graph.
+
+    Edges are relabelled by their rank in the edge sampling order, so the best
+    candidates of a BFS level are simply the smallest ranks and are picked with
+    a heap instead of sorting edge dicts. Visited edges are tracked in a bitmap,
+    the edge attributes are never modified. The expansion itself walks plain
+    int lists, which beats NumPy calls on levels of a few edges.
+    """
+
+    def __init__(
+        self,
+        src: np.ndarray,
+        tgt: np.ndarray,
+        num_nodes: int,
+        traverse_strategy: Dict,
+        node_length: Optional[np.ndarray] = None,
+        edge_length: Optional[np.ndarray] = None,
+    ):
+        """
+        :param src: source node index of every edge, in rank order
+        :param tgt: target node index of every edge, in rank order
+        :param num_nodes: number of nodes
+        :param traverse_strategy: expand_method, max_depth, bidirectional,
+            max_extra_edges and max_tokens of the ece partition
+        :param node_length: token length of every node, needed by max_tokens
+        :param edge_length: token length of every edge in rank order, needed by max_tokens
+        """
+        self.expand_method = traverse_strategy["expand_method"]
+        self.max_depth = traverse_strategy["max_depth"]
+        self.bidirectional = traverse_strategy["bidirectional"]
+        self.max_extra_edges = traverse_strategy.get("max_extra_edges")
+        self.max_tokens = traverse_strategy.get("max_tokens")
+
+        # CSR adjacency, the edges of every node in rank order
+        ends = np.concatenate([src, tgt])
+        ranks = np.tile(np.arange(len(src), dtype=np.int64), 2)
+        adj = ranks[np.lexsort((ranks, ends))]
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=num_nodes), out=indptr[1:])
+
+        self.src, self.tgt = src.tolist(), tgt.tolist()
+        self.adj, self.indptr = adj.tolist(), indptr.tolist()
+        if self.expand_method == "max_tokens":
+            self.node_length = node_length.tolist()
+            self.edge_length = edge_length.tolist()
+        self.visited = bytearray(len(src))
+
+    def _candidates(self, frontier: set) -> List[int]:
+        """Unvisited edges of the frontier nodes, an edge between two of them twice."""
+        adj, indptr, visited = self.adj, self.indptr, self.visited
+        return [
+            rank
+            for node in frontier
+            for rank in adj[indptr[node] : indptr[node + 1]]
+            if not visited[rank]
+        ]
+
+    def _next_frontier(self, candidates: List[int], frontier: set) -> set:
+        return {self.src[rank] for rank in candidates}.union(
+            self.tgt[rank] for rank in candidates
+        ) - frontier
+
+    def _expand_by_max_width(self, frontier: set) -> List[int]:
+        selected = []
+        max_depth, max_extra_edges = self.max_depth, self.max_extra_edges
+        while max_depth > 0 and max_extra_edges > 0:
+            max_depth -= 1
+            candidates = self._candidates(frontier)
+            if not candidates:
+                break
+            if len(candidates) >= max_extra_edges:
+                candidates = heapq.nsmallest(max_extra_edges, candidates)
+                for rank in candidates:
+                    self.visited[rank] = True
+                selected.extend(candidates)
+                break
+            max_extra_edges -= len(candidates)
+            candidates.sort()
+            for rank in candidates:
+                self.visited[rank] = True
+            selected.extend(candidates)
+            frontier = self._next_frontier(candidates, frontier)
+        return selected
+
+    def _expand_by_max_tokens(self, seed: int, frontier: set) -> List[int]:
+        src, tgt = self.src, self.tgt
+        edge_length, node_length = self.edge_length, self.node_length
+        max_tokens = self.max_tokens - (
+            edge_length[seed] + node_length[src[seed]] + node_length[tgt[seed]]
+        )
+        batch_nodes = {src[seed], tgt[seed]}
+
+        selected = []
+        max_depth = self.max_depth
+        while max_depth > 0 and max_tokens > 0:
+            max_depth -= 1
+            candidates = self._candidates(frontier)
+            if not candidates:
+                break
+            candidates.sort()
+            for rank in candidates:
+                max_tokens -= edge_length[rank]
+                if src[rank] not in batch_nodes:
+                    max_tokens -= node_length[src[rank]]
+                if tgt[rank] not in batch_nodes:
+                    max_tokens -= node_length[tgt[rank]]
+                if max_tokens < 0:
+                    return selected
+                selected.append(rank)
+                self.visited[rank] = True
+                batch_nodes.add(src[rank])
+                batch_nodes.add(tgt[rank])
+            frontier = self._next_frontier(candidates, frontier)
+        return selected
+
+    def expand(self, seed: int) -> List[int]:
+        """Mark the edge of rank seed visited and return the ranks of its batch."""
+        self.visited[seed] = True
+        if self.bidirectional:
+            frontier = {self.src[seed], self.tgt[seed]}
+        else:
+            frontier = {self.tgt[seed]}
+
+        if self.expand_method == "max_width":
+            return [seed] + self._expand_by_max_width(frontier)
+        return [seed] + self._expand_by_max_tokens(seed, frontier)
+
+    def iter_batches(self, progress=None) -> Iterator[List[int]]:
+        """
+        Split the edges into batches, every unvisited edge in rank order seeds one.
+        :param progress: optional wrapper of the seed iterator, e.g. tqdm
+        :return: batches as edge ranks, the seed edge first
+        """
+        seeds = range(len(self.src))
+        for seed in progress(seeds, len(seeds)) if progress else seeds:
+            if self.visited[seed]:
+                continue
+            yield list(dict.fromkeys(self.expand(seed)))
+
+    def partition(self, progress=None) -> List[List[int]]:
+        return list(self.iter_batches(progress))
+
+
+def _partition_group(
+    ranks: np.ndarray,
+    src: np.ndarray,
+    tgt: np.ndarray,
+    num_nodes: int,
+    traverse_strategy: Dict,
+    node_length: Optional[np.ndarray],
+    edge_length: Optional[np.ndarray],
+) -> List[List[int]]:
+    engine = PartitionEngine(
+        src, tgt, num_nodes, traverse_strategy, node_length, edge_length
+    )
+    return [ranks[batch].tolist() for batch in engine.partition()]
+
+
+def _partition_in_processes(  # pylint: disable=too-many-arguments
+    src: np.ndarray,
+    tgt: np.ndarray,
+    num_nodes: int,
+    traverse_strategy: Dict,
+    node_length: Optional[np.ndarray],
+    edge_length: Optional[np.ndarray],
+    num_workers: int,
+    progress=None,
+) -> List[List[int]]:
+    """
+    Batches never cross connected components, so groups of whole components
+    are partitioned in separate processes. Each group keeps the global rank
+    order of its edges, hence sorting the batches by the rank of their seed
+    edge gives exactly the batches of a single process run.
+    """
+    component = _connected_components(src, tgt, num_nodes)[src]
+    by_component = np.argsort(component, kind="stable")
+    starts = np.flatnonzero(np.diff(component[by_component])) + 1
+    # a few groups per worker keep the pool busy when component sizes differ
+    group_edges = -(-len(src) // (num_workers * 4))
+    group_ids = np.concatenate([[0], starts]) // group_edges
+    cuts = starts[np.flatnonzero(np.diff(group_ids))]
+
+    tasks = []
+    for ranks in np.split(by_component, cuts):
+        ranks = np.sort(ranks)
+        group_nodes, local = np.unique(
+            np.concatenate([src[ranks], tgt[ranks]]), return_inverse=True
+        )
+        tasks.append(
+            (
+                ranks,
+                local[: len(ranks)],
+                local[len(ranks) :],
+                len(group_nodes),
+                traverse_strategy,
+                None if node_length is None else node_length[group_nodes],
+                None if edge_length is None else edge_length[ranks],
+            )
+        )
+
+    batches = []
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(_partition_group, *task) for task in tasks]
+        done = as_completed(futures)
+        for future in progress(done, len(futures)) if progress else done:
+            batches.extend(future.result())
+    batches.sort(key=lambda batch: batch[0])
+    return batches
+
+
+def iter_partition_edges(
+    nodes: list,
+    edges: list,
+    traverse_strategy: Dict,
+    num_workers: int = 0,
+    progress=None,
+) -> Iterator[List[int]]:
+    """
+    Split the edges into ece batches, yielded as soon as they are expanded.
+    With num_workers > 1 the batches are yielded once all processes are done.
+
+    :param nodes: [(node_id, node_data)]
+    :param edges: [(src_id, tgt_id, edge_data)]
+    :param traverse_strategy: method_params of the ece partition
+    :param num_workers: partition connected components in this many processes,
+        0 or 1 runs in the current process
+    :param progress: optional wrapper of an iterator and its length, e.g. tqdm
+    :return: batches as indices into edges, the seed edge first
+    """
+    node_index = {node_id: i for i, (node_id, _) in enumerate(nodes)}
+    src = np.fromiter((node_index[e[0]] for e in edges), np.int64, len(edges))
+    tgt = np.fromiter((node_index[e[1]] for e in edges), np.int64, len(edges))
+    order = _edge_order(
+        nodes,
+        edges,
+        src,
+        tgt,
+        traverse_strategy["edge_sampling"],
+        traverse_strategy["loss_strategy"],
+    )
+    src, tgt = src[order], tgt[order]
+
+    node_length = edge_length = None
+    if traverse_strategy["expand_method"] == "max_tokens":
+        node_length = np.array(
+            [node_data["length"] for _, node_data in nodes], dtype=np.int64
+        )
+        edge_length = np.array([edges[i][2]["length"] for i in order], dtype=np.int64)
+
+    order = order.tolist()
+    if num_workers > 1 and len(edges) > 0:
+        batches = _partition_in_processes(
+            src,
+            tgt,
+            len(nodes),
+            traverse_strategy,
+            node_length,
+            edge_length,
+            num_workers,
+            progress,
+        )
+    else:
+        engine = PartitionEngine(
+            src, tgt, len(nodes), traverse_strategy, node_length, edge_length
+        )
+        batches = engine.iter_batches(progress)
+    for batch in batches:
+        yield [order[rank] for rank in batch]
+
+
+def partition_edges(
+    nodes: list,
+    edges: list,
+    traverse_strategy: Dict,
+    num_workers: int = 0,
+    progress=None,
+) -> List[List[int]]:
+    return list(
+        iter_partition_edges(nodes, edges, traverse_strategy, num_workers, progress)
+    )
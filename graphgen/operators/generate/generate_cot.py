@@ -6,7 +6,11 @@ from tqdm.asyncio import tqdm as tqdm_async
 from graphgen.models import CommunityDetector, NetworkXStorage, OpenAIClient
 from graphgen.models.community import PrecomputedCommunityDetector
 from graphgen.templates import COT_GENERATION_PROMPT, COT_TEMPLATE_DESIGN_PROMPT
-from graphgen.utils import compute_content_hash, detect_main_language
+from graphgen.utils import (
+    compute_content_hash,
+    detect_main_language,
+    resolve_max_concurrent,
+)
 
 
 async def generate_cot(
@@ -52,7 +56,9 @@ async def generate_cot(
     if not communities:
         return {}
 
-    semaphore = asyncio.Semaphore(value=20)
+    semaphore = asyncio.Semaphore(
+        value=resolve_max_concurrent(synthesizer_llm_client, 20)
+    )
 
     async def _generate_from_single_community(
         c_id: int, nodes: List[str]
@@ -1,19 +1,25 @@
 import asyncio
 import math
+from typing import List, Optional
 
 from tqdm.asyncio import tqdm as tqdm_async
 
-from graphgen.models import JsonKVStorage, NetworkXStorage, OpenAIClient
+from graphgen.bases.base_llm_client import BaseLLMClient
+from graphgen.bases.datatypes import Token
+from graphgen.models import JsonKVStorage, NetworkXStorage
 from graphgen.templates import STATEMENT_JUDGEMENT_PROMPT
-from graphgen.utils import logger, yes_no_loss_entropy
+from graphgen.utils import logger, resolve_max_concurrent, yes_no_loss_entropy
+
+DEFAULT_LOSS = -math.log(0.1)
 
 
 async def judge_statement(  # pylint: disable=too-many-statements
-    trainee_llm_client: OpenAIClient,
+    trainee_llm_client: BaseLLMClient,
     graph_storage: NetworkXStorage,
     rephrase_storage: JsonKVStorage,
     re_judge: bool = False,
     max_concurrent: int = 20,
+    batch_size: int = 16,
 ) -> NetworkXStorage:
     """
     Get all edges and nodes and judge them
@@ -23,127 +29,112 @@ async def judge_statement(  # pylint: disable=too-many-statements
     :param rephrase_storage: rephrase storage instance
     :param re_judge: re-judge the relations
     :param max_concurrent: max concurrent
+    :param batch_size: number of statements scored per trainee request
     :return:
     """
 
-    semaphore = asyncio.Semaphore(max_concurrent)
+    semaphore = asyncio.Semaphore(
+        resolve_max_concurrent(trainee_llm_client, max_concurrent)
+    )
 
-    async def _judge_single_relation(
-        edge: tuple,
-    ):
+    async def _judge_batch(statements: List[str]) -> List[Optional[List[Token]]]:
         async with semaphore:
-            source_id = edge[0]
-            target_id = edge[1]
-            edge_data = edge[2]
-
-            if (not re_judge) and "loss" in edge_data and edge_data["loss"] is not None:
-                logger.info(
-                    "Edge %s -> %s already judged, loss: %s, skip",
-                    source_id,
-                    target_id,
-                    edge_data["loss"],
-                )
-                return source_id, target_id, edge_data
-
-            description = edge_data["description"]
-
             try:
-                descriptions = await rephrase_storage.get_by_id(description)
-                assert descriptions is not None
-
-                judgements = []
-                gts = [gt for _, gt in descriptions]
-                for description, gt in descriptions:
-                    judgement = await trainee_llm_client.generate_topk_per_token(
-                        STATEMENT_JUDGEMENT_PROMPT["TEMPLATE"].format(
-                            statement=description
-                        )
-                    )
-                    judgements.append(judgement[0].top_candidates)
-
-                loss = yes_no_loss_entropy(judgements, gts)
-
-                logger.info(
-                    "Edge %s -> %s description: %s loss: %s",
-                    source_id,
-                    target_id,
-                    description,
-                    loss,
+                judgements = await trainee_llm_client.generate_topk_per_token_batch(
+                    [
+                        STATEMENT_JUDGEMENT_PROMPT["TEMPLATE"].format(statement=s)
+                        for s in statements
+                    ]
                 )
-
-                edge_data["loss"] = loss
+                return [judgement[0].top_candidates for judgement in judgements]
             except Exception as e:  # pylint: disable=broad-except
-                logger.error(
-                    "Error in judging relation %s -> %s: %s", source_id, target_id, e
-                )
-                logger.info("Use default loss 0.1")
-                edge_data["loss"] = -math.log(0.1)
-
-            await graph_storage.update_edge(source_id, target_id, edge_data)
-            return source_id, target_id, edge_data
-
-    edges = await graph_storage.get_all_edges()
-
-    results = []
-    for result in tqdm_async(
-        asyncio.as_completed([_judge_single_relation(edge) for edge in edges]),
-        total=len(edges),
-        desc="Judging relations",
-    ):
-        results.append(await result)
-
-    async def _judge_single_entity(
-        node: tuple,
-    ):
-        async with semaphore:
-            node_id = node[0]
-            node_data = node[1]
-
-            if (not re_judge) and "loss" in node_data and node_data["loss"] is not None:
-                logger.info(
-                    "Node %s already judged, loss: %s, skip", node_id, node_data["loss"]
-                )
-                return node_id, node_data
-
-            description = node_data["description"]
-
+                logger.error("Error in judging %d statements: %s", len(statements), e)
+                return [None] * len(statements)
+
+    async def _judge_descriptions(descriptions: List[str], desc: str) -> List[float]:
+        """Judge all rephrasings of the descriptions and return a loss per description."""
+        rephrased = await rephrase_storage.get_by_ids(descriptions)
+
+        statements, owners, gts = [], [], [[] for _ in descriptions]
+        for i, rephrasings in enumerate(rephrased):
+            for statement, gt in rephrasings or []:
+                statements.append(statement)
+                owners.append(i)
+                gts[i].append(gt)
+
+        batches = [
+            statements[start : start + batch_size]
+            for start in range(0, len(statements), batch_size)
+        ]
+        batch_results = await tqdm_async.gather(
+            *[_judge_batch(batch) for batch in batches], desc=desc
+        )
+
+        judgements = [[] for _ in descriptions]
+        for owner, judgement in zip(
+            owners, (j for batch in batch_results for j in batch)
+        ):
+            judgements[owner].append(judgement)
+
+        losses = []
+        for i, description in enumerate(descriptions):
             try:
-                descriptions = await rephrase_storage.get_by_id(description)
-                assert descriptions is not None
-
-                judgements = []
-                gts = [gt for _, gt in descriptions]
-                for description, gt in descriptions:
-                    judgement = await trainee_llm_client.generate_topk_per_token(
-                        STATEMENT_JUDGEMENT_PROMPT["TEMPLATE"].format(
-                            statement=description
-                        )
-                    )
-                    judgements.append(judgement[0].top_candidates)
-
-                loss = yes_no_loss_entropy(judgements, gts)
-
-                logger.info(
-                    "Node %s description: %s loss: %s", node_id, description, loss
-                )
-
-                node_data["loss"] = loss
+                assert rephrased[i] is not None, f"No rephrasing for {description}"
+                assert all(j is not None for j in judgements[i])
+                losses.append(yes_no_loss_entropy(judgements[i], gts[i]))
             except Exception as e:  # pylint: disable=broad-except
-                logger.error("Error in judging entity %s: %s", node_id, e)
+                logger.error("Error in judging description %s: %s", description, e)
                 logger.info("Use default loss 0.1")
-                node_data["loss"] = -math.log(0.1)
+                losses.append(DEFAULT_LOSS)
+        return losses
 
-            await graph_storage.update_node(node_id, node_data)
-            return node_id, node_data
+    edges = await graph_storage.get_all_edges()
+    to_judge = []
+    for source_id, target_id, edge_data in edges:
+        if (not re_judge) and "loss" in edge_data and edge_data["loss"] is not None:
+            logger.info(
+                "Edge %s -> %s already judged, loss: %s, skip",
+                source_id,
+                target_id,
+                edge_data["loss"],
+            )
+            continue
+        to_judge.append((source_id, target_id, edge_data))
+
+    losses = await _judge_descriptions(
+        [edge_data["description"] for _, _, edge_data in to_judge],
+        desc="Judging relations",
+    )
+    for (source_id, target_id, edge_data), loss in zip(to_judge, losses):
+        logger.info(
+            "Edge %s -> %s description: %s loss: %s",
+            source_id,
+            target_id,
+            edge_data["description"],
+            loss,
+        )
+        await graph_storage.update_edge(source_id, target_id, {"loss": loss})
+        edge_data["loss"] = loss
 
     nodes = await graph_storage.get_all_nodes()
-
-    results = []
-    for result in tqdm_async(
-        asyncio.as_completed([_judge_single_entity(node) for node in nodes]),
-        total=len(nodes),
+    to_judge = []
+    for node_id, node_data in nodes:
+        if (not re_judge) and "loss" in node_data and node_data["loss"] is not None:
+            logger.info(
+                "Node %s already judged, loss: %s, skip", node_id, node_data["loss"]
+            )
+            continue
+        to_judge.append((node_id, node_data))
+
+    losses = await _judge_descriptions(
+        [node_data["description"] for _, node_data in to_judge],
         desc="Judging entities",
-    ):
-        results.append(await result)
+    )
+    for (node_id, node_data), loss in zip(to_judge, losses):
+        logger.info(
+            "Node %s description: %s loss: %s", node_id, node_data["description"], loss
+        )
+        await graph_storage.update_node(node_id, {"loss": loss})
+        node_data["loss"] = loss
 
     return graph_storage
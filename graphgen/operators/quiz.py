@@ -5,7 +5,35 @@ from tqdm.asyncio import tqdm as tqdm_async
 
 from graphgen.models import JsonKVStorage, NetworkXStorage, OpenAIClient
 from graphgen.templates import DESCRIPTION_REPHRASING_PROMPT
-from graphgen.utils import detect_main_language, logger
+from graphgen.utils import (
+    detect_main_language_batch,
+    get_language,
+    logger,
+    resolve_max_concurrent,
+)
+
+
+async def _memoize_languages(graph_storage: NetworkXStorage, edges: list, nodes: list):
+    """
+    Set the language attribute of the edges and nodes that have none,
+    e.g. of graphs built before it was recorded, so later steps can reuse it.
+    """
+    new_edges = [edge for edge in edges if "language" not in edge[2]]
+    new_nodes = [node for node in nodes if "language" not in node[1]]
+    if not new_edges and not new_nodes:
+        return
+
+    languages = detect_main_language_batch(
+        [edge[2]["description"] for edge in new_edges]
+        + [node[1]["description"] for node in new_nodes]
+    )
+    for edge, language in zip(new_edges, languages):
+        await graph_storage.update_edge(edge[0], edge[1], {"language": language})
+        edge[2]["language"] = language
+    for node, language in zip(new_nodes, languages[len(new_edges) :]):
+        await graph_storage.update_node(node[0], {"language": language})
+        node[1]["language"] = language
+    await graph_storage.index_done_callback()
 
 
 async def quiz(
@@ -26,9 +54,11 @@ async def quiz(
     :return:
     """
 
-    semaphore = asyncio.Semaphore(max_concurrent)
+    semaphore = asyncio.Semaphore(
+        resolve_max_concurrent(synth_llm_client, max_concurrent)
+    )
 
-    async def _process_single_quiz(des: str, prompt: str, gt: str):
+    async def _process_single_quiz(des: str, prompt: str, gt: str, sample: int):
         async with semaphore:
             try:
                 # 如果在rephrase_storage中已经存在，直接取出
@@ -36,8 +66,9 @@ async def quiz(
                 if descriptions:
                     return None
 
+                # the sample index keeps the cached samples of a prompt apart
                 new_description = await synth_llm_client.generate_answer(
-                    prompt, temperature=1
+                    prompt, temperature=1, cache_nonce=sample
                 )
                 return {des: [(new_description, gt)]}
 
@@ -47,6 +78,7 @@ async def quiz(
 
     edges = await graph_storage.get_all_edges()
     nodes = await graph_storage.get_all_nodes()
+    await _memoize_languages(graph_storage, edges, nodes)
 
     results = defaultdict(list)
     tasks = []
@@ -54,7 +86,7 @@ async def quiz(
         edge_data = edge[2]
 
         description = edge_data["description"]
-        language = "English" if detect_main_language(description) == "en" else "Chinese"
+        language = "English" if get_language(edge_data) == "en" else "Chinese"
 
         results[description] = [(description, "yes")]
 
@@ -67,6 +99,7 @@ async def quiz(
                             input_sentence=description
                         ),
                         "yes",
+                        i,
                     )
                 )
             tasks.append(
@@ -76,13 +109,14 @@ async def quiz(
                         input_sentence=description
                     ),
                     "no",
+                    i,
                 )
             )
 
     for node in nodes:
         node_data = node[1]
         description = node_data["description"]
-        language = "English" if detect_main_language(description) == "en" else "Chinese"
+        language = "English" if get_language(node_data) == "en" else "Chinese"
 
         results[description] = [(description, "yes")]
 
@@ -95,6 +129,7 @@ async def quiz(
                             input_sentence=description
                         ),
                         "yes",
+                        i,
                     )
                 )
             tasks.append(
@@ -104,6 +139,7 @@ async def quiz(
                         input_sentence=description
                     ),
                     "no",
+                    i,
                 )
             )
 
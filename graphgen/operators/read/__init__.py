@@ -1 +1 @@
-from .read_files import read_files
+from .read_files import iter_read_files, read_files
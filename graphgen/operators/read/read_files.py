@@ -1,4 +1,9 @@
+import glob
+import os
+from typing import Any, Dict, Iterator, List
+
 from graphgen.models import CsvReader, JsonlReader, JsonReader, TxtReader
+from graphgen.utils import logger
 
 _MAPPING = {
     "jsonl": JsonlReader,
@@ -7,13 +12,59 @@ _MAPPING = {
     "csv": CsvReader,
 }
 
+# compressed files are read through BaseReader.open_file
+_COMPRESSIONS = (".gz", ".zst")
+
+
+def _get_format(file_path: str) -> str:
+    for compression in _COMPRESSIONS:
+        if file_path.endswith(compression):
+            file_path = file_path[: -len(compression)]
+    return file_path.split(".")[-1]
 
-def read_files(file_path: str):
-    suffix = file_path.split(".")[-1]
-    if suffix in _MAPPING:
-        reader = _MAPPING[suffix]()
+
+def _resolve_paths(input_path: str) -> List[str]:
+    """
+    Expand a directory or a glob pattern into the files of supported formats,
+    a plain file path is returned as is.
+    """
+    if os.path.isdir(input_path):
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(input_path)
+            for name in names
+        ]
+    elif any(c in input_path for c in "*?["):
+        paths = glob.glob(input_path, recursive=True)
     else:
-        raise ValueError(
-            f"Unsupported file format: {suffix}. Supported formats are: {list(_MAPPING.keys())}"
-        )
-    return reader.read(file_path)
+        return [input_path]
+
+    supported = []
+    for path in sorted(paths):
+        if _get_format(path) in _MAPPING:
+            supported.append(path)
+        elif os.path.isfile(path):
+            logger.warning("Skip %s of unsupported format", path)
+    if not supported:
+        logger.warning("No files of supported formats match %s", input_path)
+    return supported
+
+
+def iter_read_files(input_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the documents of a file, a directory or a glob pattern,
+    one file after another in sorted order.
+    """
+    paths = _resolve_paths(input_path)
+    for path in paths:
+        suffix = _get_format(path)
+        if suffix not in _MAPPING:
+            raise ValueError(
+                f"Unsupported file format: {suffix}. Supported formats are: {list(_MAPPING.keys())}"
+            )
+    for path in paths:
+        yield from _MAPPING[_get_format(path)]().iter_read(path)
+
+
+def read_files(input_path: str) -> List[Dict[str, Any]]:
+    return list(iter_read_files(input_path))
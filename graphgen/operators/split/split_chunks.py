@@ -1,6 +1,9 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from functools import lru_cache
-from typing import Union
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
 
+from tqdm import tqdm
 from tqdm.asyncio import tqdm as tqdm_async
 
 from graphgen.models import (
@@ -17,6 +20,11 @@ _MAPPING = {
 
 SplitterT = Union[RecursiveCharacterSplitter, ChineseRecursiveTextSplitter]
 
+_LENGTH_UNITS = ["char", "token"]
+
+# upper bound of the docs sent to a worker process at once
+_MAX_WORKER_BATCH = 64
+
 
 @lru_cache(maxsize=None)
 def _get_splitter(language: str, frozen_kwargs: frozenset) -> SplitterT:
@@ -25,50 +33,163 @@ def _get_splitter(language: str, frozen_kwargs: frozenset) -> SplitterT:
     return cls(**kwargs)
 
 
-def split_chunks(text: str, language: str = "en", **kwargs) -> list:
+def split_chunks(
+    text: str,
+    language: str = "en",
+    length_function: Optional[Callable[[str], int]] = None,
+    **kwargs,
+) -> list:
     if language not in _MAPPING:
         raise ValueError(
             f"Unsupported language: {language}. "
             f"Supported languages are: {list(_MAPPING.keys())}"
         )
-    splitter = _get_splitter(language, frozenset(kwargs.items()))
+    if length_function is None:
+        splitter = _get_splitter(language, frozenset(kwargs.items()))
+    else:
+        splitter = _MAPPING[language](length_function=length_function, **kwargs)
     return splitter.split_text(text)
 
 
+def _build_splitters(
+    chunk_size: int,
+    chunk_overlap: int,
+    tokenizer_instance: Optional[Tokenizer],
+    length_unit: str,
+) -> Dict[str, SplitterT]:
+    """One splitter per language, built once and reused for every doc."""
+    length_function = tokenizer_instance.count_tokens if length_unit == "token" else len
+    return {
+        language: cls(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=length_function,
+        )
+        for language, cls in _MAPPING.items()
+    }
+
+
+def _chunk_document(
+    doc_key: str,
+    content: str,
+    splitters: Dict[str, SplitterT],
+    tokenizer_instance: Optional[Tokenizer],
+) -> dict:
+    doc_language = detect_main_language(content)
+    text_chunks = splitters[doc_language].split_text(content)
+
+    lengths = (
+        tokenizer_instance.count_tokens_batch(text_chunks)
+        if tokenizer_instance
+        else [len(txt) for txt in text_chunks]
+    )
+    return {
+        compute_content_hash(txt, prefix="chunk-"): {
+            "content": txt,
+            "full_doc_id": doc_key,
+            "length": length,
+            "language": doc_language,
+        }
+        for txt, length in zip(text_chunks, lengths)
+    }
+
+
+# splitters and tokenizer of a worker process, set once by _init_worker
+_worker_args: dict = {}
+
+
+def _init_worker(
+    chunk_size: int,
+    chunk_overlap: int,
+    tokenizer_instance: Optional[Tokenizer],
+    length_unit: str,
+):
+    _worker_args.update(
+        splitters=_build_splitters(
+            chunk_size, chunk_overlap, tokenizer_instance, length_unit
+        ),
+        tokenizer_instance=tokenizer_instance,
+    )
+
+
+def _chunk_batch(docs: List[Tuple[str, str]]) -> List[dict]:
+    return [
+        _chunk_document(doc_key, content, **_worker_args) for doc_key, content in docs
+    ]
+
+
+async def _chunk_in_processes(
+    docs: List[Tuple[str, str]],
+    num_workers: int,
+    init_args: tuple,
+    progress_bar=None,
+) -> AsyncIterator[dict]:
+    """
+    Chunk batches of docs in worker processes and yield the chunks of every
+    doc in the order of docs, as soon as its batch is done.
+    """
+    # a few batches per worker keep the pool busy when doc sizes differ
+    batch_size = min(_MAX_WORKER_BATCH, -(-len(docs) // (num_workers * 4)))
+    batches = [docs[i : i + batch_size] for i in range(0, len(docs), batch_size)]
+    with ProcessPoolExecutor(
+        max_workers=num_workers, initializer=_init_worker, initargs=init_args
+    ) as executor:
+        futures = [executor.submit(_chunk_batch, batch) for batch in batches]
+        with tqdm(total=len(docs), desc="[1/4]Chunking documents", unit="doc") as pbar:
+            for batch, future in zip(batches, futures):
+                for chunks in await asyncio.wrap_future(future):
+                    yield chunks
+                pbar.update(len(batch))
+                if progress_bar is not None:
+                    progress_bar(pbar.n / len(docs), f"Chunking {batch[-1][0]}")
+
+
 async def chunk_documents(
     new_docs: dict,
     chunk_size: int = 1024,
     chunk_overlap: int = 100,
     tokenizer_instance: Tokenizer = None,
     progress_bar=None,
+    length_unit: str = "char",
+    num_workers: int = 0,
 ) -> dict:
+    """
+    :param length_unit: unit of chunk_size and chunk_overlap, "char" or "token".
+        With "token" the chunks are packed by token counts of tokenizer_instance.
+    :param num_workers: chunk the docs in this many processes, each with its own
+        splitters and tokenizer, 0 or 1 chunks in the current process
+    """
+    if length_unit not in _LENGTH_UNITS:
+        raise ValueError(
+            f"Unsupported length unit: {length_unit}. "
+            f"Supported length units are: {_LENGTH_UNITS}"
+        )
+    if length_unit == "token" and tokenizer_instance is None:
+        raise ValueError("Token length unit requires a tokenizer")
+
     inserting_chunks = {}
+    if num_workers > 1 and len(new_docs) > 1:
+        async for chunks in _chunk_in_processes(
+            [(doc_key, doc["content"]) for doc_key, doc in new_docs.items()],
+            num_workers,
+            (chunk_size, chunk_overlap, tokenizer_instance, length_unit),
+            progress_bar,
+        ):
+            inserting_chunks.update(chunks)
+        return inserting_chunks
+
+    splitters = _build_splitters(
+        chunk_size, chunk_overlap, tokenizer_instance, length_unit
+    )
     cur_index = 1
     doc_number = len(new_docs)
     async for doc_key, doc in tqdm_async(
         new_docs.items(), desc="[1/4]Chunking documents", unit="doc"
     ):
-        doc_language = detect_main_language(doc["content"])
-        text_chunks = split_chunks(
-            doc["content"],
-            language=doc_language,
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
+        inserting_chunks.update(
+            _chunk_document(doc_key, doc["content"], splitters, tokenizer_instance)
         )
 
-        chunks = {
-            compute_content_hash(txt, prefix="chunk-"): {
-                "content": txt,
-                "full_doc_id": doc_key,
-                "length": len(tokenizer_instance.encode(txt))
-                if tokenizer_instance
-                else len(txt),
-                "language": doc_language,
-            }
-            for txt in text_chunks
-        }
-        inserting_chunks.update(chunks)
-
         if progress_bar is not None:
             progress_bar(cur_index / doc_number, f"Chunking {doc_key}")
             cur_index += 1
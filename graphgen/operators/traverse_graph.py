@@ -1,68 +1,54 @@
 import asyncio
-from typing import Dict
+from typing import Awaitable, Callable, Dict
 
 import gradio as gr
-from tqdm.asyncio import tqdm as tqdm_async
 
 from graphgen.models import JsonKVStorage, NetworkXStorage, OpenAIClient, Tokenizer
-from graphgen.operators.build_kg.split_kg import get_batches_with_strategy
+from graphgen.operators.build_kg.split_kg import iter_batches_with_strategy
 from graphgen.templates import (
     ANSWER_REPHRASING_PROMPT,
     MULTI_HOP_GENERATION_PROMPT,
     QUESTION_GENERATION_PROMPT,
 )
-from graphgen.utils import compute_content_hash, detect_main_language, logger
+from graphgen.utils import (
+    compute_content_hash,
+    detect_main_language,
+    get_language,
+    logger,
+    resolve_max_concurrent,
+    run_concurrent_stream,
+)
 
 
 async def _pre_tokenize(
     graph_storage: NetworkXStorage, tokenizer: Tokenizer, edges: list, nodes: list
 ) -> tuple:
+    """
+    Set the token length of the nodes and edges that have none, counted in one
+    batch off the event loop. The graph is only written back if anything changed.
+    """
+    new_edges = [edge for edge in edges if "length" not in edge[2]]
+    new_nodes = [node for node in nodes if "length" not in node[1]]
+    if not new_edges and not new_nodes:
+        return edges, nodes
+
+    lengths = await asyncio.get_running_loop().run_in_executor(
+        None,
+        tokenizer.count_tokens_batch,
+        [edge[2]["description"] for edge in new_edges]
+        + [node[1]["description"] for node in new_nodes],
+    )
+    logger.info("Pre-tokenized %d edges and %d nodes", len(new_edges), len(new_nodes))
 
-    sem = asyncio.Semaphore(20)
-
-    async def handle_edge(edge: tuple) -> tuple:
-        async with sem:
-            if "length" not in edge[2]:
-                edge[2]["length"] = len(
-                    await asyncio.get_event_loop().run_in_executor(
-                        None, tokenizer.encode, edge[2]["description"]
-                    )
-                )
-            return edge
-
-    async def handle_node(node: dict) -> dict:
-        async with sem:
-            if "length" not in node[1]:
-                node[1]["length"] = len(
-                    await asyncio.get_event_loop().run_in_executor(
-                        None, tokenizer.encode, node[1]["description"]
-                    )
-                )
-            return node
-
-    new_edges = []
-    new_nodes = []
-
-    for result in tqdm_async(
-        asyncio.as_completed([handle_edge(edge) for edge in edges]),
-        total=len(edges),
-        desc="Pre-tokenizing edges",
-    ):
-        new_edge = await result
-        await graph_storage.update_edge(new_edge[0], new_edge[1], new_edge[2])
-        new_edges.append(new_edge)
-
-    for result in tqdm_async(
-        asyncio.as_completed([handle_node(node) for node in nodes]),
-        total=len(nodes),
-        desc="Pre-tokenizing nodes",
-    ):
-        new_node = await result
-        await graph_storage.update_node(new_node[0], new_node[1])
-        new_nodes.append(new_node)
+    for edge, length in zip(new_edges, lengths):
+        await graph_storage.update_edge(edge[0], edge[1], {"length": length})
+        edge[2]["length"] = length
+    for node, length in zip(new_nodes, lengths[len(new_edges) :]):
+        await graph_storage.update_node(node[0], {"length": length})
+        node[1]["length"] = length
 
     await graph_storage.index_done_callback()
-    return new_edges, new_nodes
+    return edges, nodes
 
 
 async def _construct_rephrasing_prompt(
@@ -155,6 +141,47 @@ def _post_process_synthetic_data(data):
     return qas
 
 
+async def _emit(
+    result: dict, results: dict, on_result: Callable[[dict], Awaitable[None]]
+):
+    if on_result is None:
+        results.update(result)
+    elif result:
+        await on_result(result)
+
+
+async def _generate_from_batches(  # pylint: disable=too-many-arguments
+    process_batch,
+    edges: list,
+    nodes: list,
+    graph_storage: NetworkXStorage,
+    traverse_strategy: Dict,
+    results: dict,
+    progress_bar: gr.Progress = None,
+    max_concurrent: int = 20,
+    on_result: Callable[[dict], Awaitable[None]] = None,
+):
+    """
+    Generate QAs from the batches while the graph is still being partitioned.
+    The progress is the share of edges whose batch is done.
+    The QAs of each batch go to on_result if given, otherwise into results.
+    """
+    num_done_edges = 0
+    async for batch, result in run_concurrent_stream(
+        process_batch,
+        iter_batches_with_strategy(nodes, edges, graph_storage, traverse_strategy),
+        desc="[4/4]Generating QAs",
+        unit="batch",
+        max_concurrent=max_concurrent,
+    ):
+        await _emit(result, results, on_result)
+        num_done_edges += len(batch[1])
+        if progress_bar is not None and edges:
+            progress_bar(num_done_edges / len(edges), desc="[4/4]Generating QAs")
+    if progress_bar is not None:
+        progress_bar(1, desc="[4/4]Generating QAs")
+
+
 async def traverse_graph_for_aggregated(
     llm_client: OpenAIClient,
     tokenizer: Tokenizer,
@@ -163,6 +190,7 @@ async def traverse_graph_for_aggregated(
     text_chunks_storage: JsonKVStorage,
     progress_bar: gr.Progress = None,
     max_concurrent: int = 20,
+    on_result: Callable[[dict], Awaitable[None]] = None,
 ) -> dict:
     """
     Traverse the graph
@@ -174,10 +202,14 @@ async def traverse_graph_for_aggregated(
     :param text_chunks_storage
     :param progress_bar
     :param max_concurrent
+    :param on_result: called with the QAs as they are generated, instead of
+        returning them
     :return: question and answer
     """
 
-    semaphore = asyncio.Semaphore(max_concurrent)
+    semaphore = asyncio.Semaphore(
+        resolve_max_concurrent(llm_client, max_concurrent)
+    )
 
     async def _process_nodes_and_edges(
         _process_nodes: list,
@@ -330,28 +362,17 @@ async def traverse_graph_for_aggregated(
 
     edges, nodes = await _pre_tokenize(graph_storage, tokenizer, edges, nodes)
 
-    processing_batches = await get_batches_with_strategy(
-        nodes, edges, graph_storage, traverse_strategy
+    await _generate_from_batches(
+        _process_single_batch,
+        edges,
+        nodes,
+        graph_storage,
+        traverse_strategy,
+        results,
+        progress_bar,
+        resolve_max_concurrent(llm_client, max_concurrent),
+        on_result,
     )
-
-    for result in tqdm_async(
-        asyncio.as_completed(
-            [_process_single_batch(batch) for batch in processing_batches]
-        ),
-        total=len(processing_batches),
-        desc="[4/4]Generating QAs",
-    ):
-        try:
-            if progress_bar is not None:
-                progress_bar(
-                    len(results) / len(processing_batches), desc="[4/4]Generating QAs"
-                )
-            results.update(await result)
-            if progress_bar is not None and len(results) == len(processing_batches):
-                progress_bar(1, desc="[4/4]Generating QAs")
-        except Exception as e:  # pylint: disable=broad-except
-            logger.error("Error occurred while generating QA: %s", e)
-
     return results
 
 
@@ -364,6 +385,7 @@ async def traverse_graph_for_atomic(
     text_chunks_storage: JsonKVStorage,
     progress_bar: gr.Progress = None,
     max_concurrent: int = 20,
+    on_result: Callable[[dict], Awaitable[None]] = None,
 ) -> dict:
     """
     Traverse the graph atomicly
@@ -375,10 +397,14 @@ async def traverse_graph_for_atomic(
     :param text_chunks_storage
     :param progress_bar
     :param max_concurrent
+    :param on_result: called with the QAs as they are generated, instead of
+        returning them
     :return: question and answer
     """
 
-    semaphore = asyncio.Semaphore(max_concurrent)
+    semaphore = asyncio.Semaphore(
+        resolve_max_concurrent(llm_client, max_concurrent)
+    )
 
     def _parse_qa(qa: str) -> tuple:
         if "Question:" in qa and "Answer:" in qa:
@@ -398,11 +424,10 @@ async def traverse_graph_for_atomic(
         else:
             des = node_or_edge[2]["description"]
             loss = node_or_edge[2]["loss"] if "loss" in node_or_edge[2] else -1.0
+        language = "Chinese" if get_language(node_or_edge[-1]) == "zh" else "English"
 
         async with semaphore:
             try:
-                language = "Chinese" if detect_main_language(des) == "zh" else "English"
-
                 # 保存生成问答的prompt
                 qa_generation_prompt = QUESTION_GENERATION_PROMPT[language]["SINGLE_QA_TEMPLATE"].format(
                     doc=des
@@ -462,19 +487,20 @@ async def traverse_graph_for_atomic(
         else:
             tasks.append((edge[0], edge[1], edge[2]))
 
-    for result in tqdm_async(
-        asyncio.as_completed([_generate_question(task) for task in tasks]),
-        total=len(tasks),
+    num_done = 0
+    async for _, result in run_concurrent_stream(
+        _generate_question,
+        tasks,
         desc="[4/4]Generating QAs",
+        total=len(tasks),
+        max_concurrent=resolve_max_concurrent(llm_client, max_concurrent),
     ):
-        try:
-            if progress_bar is not None:
-                progress_bar(len(results) / len(tasks), desc="[4/4]Generating QAs")
-            results.update(await result)
-            if progress_bar is not None and len(results) == len(tasks):
-                progress_bar(1, desc="[4/4]Generating QAs")
-        except Exception as e:  # pylint: disable=broad-except
-            logger.error("Error occurred while generating QA: %s", e)
+        await _emit(result, results, on_result)
+        num_done += 1
+        if progress_bar is not None:
+            progress_bar(num_done / len(tasks), desc="[4/4]Generating QAs")
+    if progress_bar is not None:
+        progress_bar(1, desc="[4/4]Generating QAs")
     return results
 
 
@@ -486,6 +512,7 @@ async def traverse_graph_for_multi_hop(
     text_chunks_storage: JsonKVStorage,
     progress_bar: gr.Progress = None,
     max_concurrent: int = 20,
+    on_result: Callable[[dict], Awaitable[None]] = None,
 ) -> dict:
     """
     Traverse the graph for multi-hop
@@ -497,9 +524,13 @@ async def traverse_graph_for_multi_hop(
     :param text_chunks_storage
     :param progress_bar
     :param max_concurrent
+    :param on_result: called with the QAs as they are generated, instead of
+        returning them
     :return: question and answer
     """
-    semaphore = asyncio.Semaphore(max_concurrent)
+    semaphore = asyncio.Semaphore(
+        resolve_max_concurrent(llm_client, max_concurrent)
+    )
 
     results = {}
     edges = list(await graph_storage.get_all_edges())
@@ -507,16 +538,12 @@ async def traverse_graph_for_multi_hop(
 
     edges, nodes = await _pre_tokenize(graph_storage, tokenizer, edges, nodes)
 
-    processing_batches = await get_batches_with_strategy(
-        nodes, edges, graph_storage, traverse_strategy
-    )
-
     async def _process_single_batch(_process_batch: tuple) -> dict:
         async with semaphore:
             try:
                 language = (
                     "Chinese"
-                    if detect_main_language(_process_batch[0][0]["description"]) == "zh"
+                    if get_language(_process_batch[0][0]) == "zh"
                     else "English"
                 )
 
@@ -592,21 +619,15 @@ async def traverse_graph_for_multi_hop(
                 logger.error("Error occurred while processing batch: %s", e)
                 return {}
 
-    async for result in tqdm_async(
-        asyncio.as_completed(
-            [_process_single_batch(batch) for batch in processing_batches]
-        ),
-        total=len(processing_batches),
-        desc="[4/4]Generating QAs",
-    ):
-        try:
-            if progress_bar is not None:
-                progress_bar(
-                    len(results) / len(processing_batches), desc="[4/4]Generating QAs"
-                )
-            results.update(await result)
-            if progress_bar is not None and len(results) == len(processing_batches):
-                progress_bar(1, desc="[4/4]Generating QAs")
-        except Exception as e:  # pylint: disable=broad-except
-            logger.error("Error occurred while generating QA: %s", e)
+    await _generate_from_batches(
+        _process_single_batch,
+        edges,
+        nodes,
+        graph_storage,
+        traverse_strategy,
+        results,
+        progress_bar,
+        resolve_max_concurrent(llm_client, max_concurrent),
+        on_result,
+    )
     return results
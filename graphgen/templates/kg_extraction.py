@@ -1,6 +1,6 @@
 # pylint: disable=C0301
 
-TEMPLATE_EN: str = """You are an NLP expert, skilled at analyzing text to extract named entities and their relationships.
+SYSTEM_EN: str = """You are an NLP expert, skilled at analyzing text to extract named entities and their relationships.
 
 -Goal-
 Given a text document that is potentially relevant to this activity and a list of entity types, identify all entities of those types from the text and all relationships among the identified entities.
@@ -70,7 +70,9 @@ Output:
 ("relationship"{tuple_delimiter}"Agrobacterium tumefaciens"{tuple_delimiter}"NB epidermal cells"{tuple_delimiter}"Agrobacterium tumefaciens was used to transfer genetic material into NB epidermal cells through a transient assay."){record_delimiter}
 ("relationship"{tuple_delimiter}"OsDT11"{tuple_delimiter}"NB epidermal cells"{tuple_delimiter}"OsDT11's subcellular localization was studied in NB epidermal cells, showing cell wall targeting."){record_delimiter}
 ("content_keywords"{tuple_delimiter}"protein localization, gene expression, cellular biology, molecular techniques"){completion_delimiter}
+"""
 
+USER_EN: str = """
 ################
 -Real Data-
 ################
@@ -80,8 +82,10 @@ Text: {input_text}
 Output:
 """
 
+TEMPLATE_EN: str = SYSTEM_EN + USER_EN
+
 
-TEMPLATE_ZH: str = """你是一个NLP专家，擅长分析文本提取命名实体和关系。
+SYSTEM_ZH: str = """你是一个NLP专家，擅长分析文本提取命名实体和关系。
 
 -目标-
 给定一个实体类型列表和可能与列表相关的文本，从文本中识别所有这些类型的实体，以及这些实体之间所有的关系。
@@ -168,7 +172,9 @@ TEMPLATE_ZH: str = """你是一个NLP专家，擅长分析文本提取命名实
 ("relationship"{tuple_delimiter}"铅山县"{tuple_delimiter}"优质稻推广"{tuple_delimiter}"铅山县实施了优质稻推广计划，黄华占是该计划的一部分。"){record_delimiter}
 ("relationship"{tuple_delimiter}"杂交水稻技术"{tuple_delimiter}"北涨看长粒香、南涨看黄华占"{tuple_delimiter}"杂交水稻技术的发展使得黄华占等优质稻品种在市场中受到关注。"){record_delimiter}
 ("content_keywords"{tuple_delimiter}"黄华占, 水稻种植, 高产栽培技术, 优质稻推广, 地区适应性, 市场趋势, 技术影响"){completion_delimiter}
+"""
 
+USER_ZH: str = """
 -真实数据-
 实体类型：{entity_types}
 文本：{input_text}
@@ -176,6 +182,8 @@ TEMPLATE_ZH: str = """你是一个NLP专家，擅长分析文本提取命名实
 输出：
 """
 
+TEMPLATE_ZH: str = SYSTEM_ZH + USER_ZH
+
 CONTINUE_EN: str = """MANY entities and relationships were missed in the last extraction.  \
 Add them below using the same format:
 """
@@ -191,11 +199,15 @@ IF_LOOP_ZH: str = """看起来可能仍然遗漏了一些实体和关系。如
 KG_EXTRACTION_PROMPT: dict = {
     "English": {
         "TEMPLATE": TEMPLATE_EN,
+        "SYSTEM": SYSTEM_EN,
+        "USER": USER_EN,
         "CONTINUE": CONTINUE_EN,
         "IF_LOOP": IF_LOOP_EN,
     },
     "Chinese": {
         "TEMPLATE": TEMPLATE_ZH,
+        "SYSTEM": SYSTEM_ZH,
+        "USER": USER_ZH,
         "CONTINUE": CONTINUE_ZH,
         "IF_LOOP": IF_LOOP_ZH,
     },
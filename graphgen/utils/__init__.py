@@ -1,5 +1,10 @@
 from .calculate_confidence import yes_no_loss_entropy
-from .detect_lang import detect_if_chinese, detect_main_language
+from .detect_lang import (
+    detect_if_chinese,
+    detect_main_language,
+    detect_main_language_batch,
+    get_language,
+)
 from .format import (
     format_generation_results,
     handle_single_entity_extraction,
@@ -11,7 +16,12 @@ from .format import (
 )
 from .hash import compute_args_hash, compute_content_hash
 from .help_nltk import NLTKHelper
+from .key_lock import KeyLock
 from .log import logger, parse_log, set_logger
 from .loop import create_event_loop
-from .run_concurrent import run_concurrent
+from .run_concurrent import (
+    resolve_max_concurrent,
+    run_concurrent,
+    run_concurrent_stream,
+)
 from .wrap import async_to_sync_method
@@ -1,22 +1,30 @@
-def detect_main_language(text):
+import re
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+_CHINESE_CHARS = re.compile('[一-鿿]')
+_ENGLISH_CHARS = re.compile('[A-Za-z]')
+
+# 只统计文本开头的这些字符，长文本的语言由开头决定
+MAX_DETECT_CHARS = 10000
+
+
+def detect_main_language(text, max_chars: Optional[int] = MAX_DETECT_CHARS):
     """
     识别文本的主要语言
 
     :param text:
+    :param max_chars: 只统计前 max_chars 个字符，None 统计全文
     :return:
     """
     assert isinstance(text, str)
-    def is_chinese_char(char):
-        return '\u4e00' <= char <= '\u9fff'
-
-    def is_english_char(char):
-        return char.isascii() and char.isalpha()
+    if max_chars is not None:
+        text = text[:max_chars]
 
-    # 去除空格和标点符号
-    text = ''.join(char for char in text if char.strip())
-
-    chinese_count = sum(1 for char in text if is_chinese_char(char))
-    english_count = sum(1 for char in text if is_english_char(char))
+    # 空格和标点符号既不是中文也不是英文字符，不参与统计
+    chinese_count = len(_CHINESE_CHARS.findall(text))
+    english_count = len(_ENGLISH_CHARS.findall(text))
 
     total = chinese_count + english_count
     if total == 0:
@@ -28,6 +36,50 @@ def detect_main_language(text):
         return 'zh'
     return 'en'
 
+
+def detect_main_language_batch(
+    texts: Iterable[str], max_chars: Optional[int] = MAX_DETECT_CHARS
+) -> List[str]:
+    """
+    批量识别文本的主要语言，所有文本拼接后一次性统计字符
+
+    :param texts:
+    :param max_chars: 只统计每个文本的前 max_chars 个字符
+    :return:
+    """
+    texts = [text[:max_chars] if max_chars is not None else text for text in texts]
+    if not texts:
+        return []
+
+    # 每个字符对应一个 utf-32 码位
+    codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32)
+    is_chinese = (codes >= 0x4E00) & (codes <= 0x9FFF)
+    lower = codes | 0x20
+    is_english = (lower >= ord('a')) & (lower <= ord('z'))
+
+    lengths = np.array([len(text) for text in texts])
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    chinese_cumsum = np.concatenate(([0], np.cumsum(is_chinese)))
+    english_cumsum = np.concatenate(([0], np.cumsum(is_english)))
+    chinese_counts = chinese_cumsum[ends] - chinese_cumsum[starts]
+    english_counts = english_cumsum[ends] - english_cumsum[starts]
+
+    # 与 detect_main_language 相同: 中文占比不低于一半为 zh，没有中英文字符为 en
+    is_zh = (chinese_counts > 0) & (chinese_counts >= english_counts)
+    return ['zh' if zh else 'en' for zh in is_zh]
+
+
+def get_language(data: dict) -> str:
+    """
+    节点或边的主要语言，优先使用图中记录的 language 属性
+
+    :param data: 节点或边的属性
+    :return:
+    """
+    return data.get('language') or detect_main_language(data['description'])
+
+
 def detect_if_chinese(text):
     """
     判断文本是否包含有中文
@@ -37,4 +89,4 @@ def detect_if_chinese(text):
     """
 
     assert isinstance(text, str)
-    return any('\u4e00' <= char <= '\u9fff' for char in text)
+    return _CHINESE_CHARS.search(text) is not None
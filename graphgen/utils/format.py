@@ -4,8 +4,6 @@ import os
 import re
 from typing import Any
 
-from .log import logger
-
 
 def pack_history_conversations(*args: str):
     roles = ["user", "assistant"]
@@ -98,7 +96,6 @@ def format_generation_results(
     results: dict[str, Any], output_data_format: str
 ) -> list[dict[str, Any]]:
     if output_data_format == "Alpaca":
-        logger.info("Output data format: Alpaca")
         formatted_results = []
         for item in list(results.values()):
             formatted_item = {
@@ -118,7 +115,6 @@ def format_generation_results(
             formatted_results.append(formatted_item)
         results = formatted_results
     elif output_data_format == "Sharegpt":
-        logger.info("Output data format: Sharegpt")
         formatted_results = []
         for item in list(results.values()):
             formatted_item = {
@@ -139,7 +135,6 @@ def format_generation_results(
             formatted_results.append(formatted_item)
         results = formatted_results
     elif output_data_format == "ChatML":
-        logger.info("Output data format: ChatML")
         formatted_results = []
         for item in list(results.values()):
             formatted_item = {
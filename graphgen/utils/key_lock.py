@@ -0,0 +1,22 @@
+import asyncio
+from typing import Hashable
+
+
+class KeyLock:
+    """
+    Striped asyncio locks: keys are hashed onto a fixed pool of locks,
+    so that coroutines working on the same key are serialized without
+    keeping one lock per key alive.
+    """
+
+    def __init__(self, num_stripes: int = 1024):
+        self.num_stripes = num_stripes
+        self._locks = None
+        self._loop = None
+
+    def __call__(self, key: Hashable) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._locks is None or self._loop is not loop:
+            self._locks = [asyncio.Lock() for _ in range(self.num_stripes)]
+            self._loop = loop
+        return self._locks[hash(key) % self.num_stripes]
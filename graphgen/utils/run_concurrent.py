@@ -1,5 +1,16 @@
 import asyncio
-from typing import Awaitable, Callable, List, Optional, TypeVar
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 import gradio as gr
 from tqdm.asyncio import tqdm as tqdm_async
@@ -10,6 +21,17 @@ T = TypeVar("T")
 R = TypeVar("R")
 
 
+def resolve_max_concurrent(llm_client, max_concurrent: int = 20) -> int:
+    """
+    If the llm client carries an adaptive concurrency limiter, let it decide
+    how many requests are in flight and only cap the number of pending tasks.
+    """
+    limiter = getattr(llm_client, "concurrency_limiter", None)
+    if limiter is None:
+        return max_concurrent
+    return max(max_concurrent, limiter.max_limit)
+
+
 async def run_concurrent(
     coro_fn: Callable[[T], Awaitable[R]],
     items: List[T],
@@ -43,3 +65,66 @@ async def run_concurrent(
     if progress_bar:
         progress_bar(1.0, desc=desc)
     return ok_results
+
+
+async def run_concurrent_stream(
+    coro_fn: Callable[[T], Awaitable[R]],
+    items: Union[Iterable[T], AsyncIterable[T]],
+    *,
+    desc: str = "processing",
+    unit: str = "item",
+    total: Optional[int] = None,
+    max_concurrent: int = 20,
+) -> AsyncIterator[Tuple[T, R]]:
+    """
+    Run coro_fn over items pulled from an async iterator by max_concurrent
+    workers and yield (item, result) pairs as they complete.
+    Items are handed over through a bounded queue, so the producer runs only
+    slightly ahead of the workers and memory does not grow with the number
+    of items. Failed items are logged and skipped.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=2 * max_concurrent)
+    outputs: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def _produce():
+        error = None
+        try:
+            if isinstance(items, AsyncIterable):
+                async for item in items:
+                    await queue.put(item)
+            else:
+                for item in items:
+                    await queue.put(item)
+        except Exception as e:  # pylint: disable=broad-except
+            error = e
+        for _ in range(max_concurrent):
+            await queue.put(finished)
+        if error is not None:
+            raise error
+
+    async def _work():
+        while (item := await queue.get()) is not finished:
+            try:
+                await outputs.put((item, await coro_fn(item)))
+            except Exception as e:  # pylint: disable=broad-except
+                logger.exception("Task failed: %s", e)
+        await outputs.put(finished)
+
+    producer = asyncio.create_task(_produce())
+    workers = [asyncio.create_task(_work()) for _ in range(max_concurrent)]
+    try:
+        with tqdm_async(total=total, desc=desc, unit=unit) as pbar:
+            running = len(workers)
+            while running:
+                output = await outputs.get()
+                if output is finished:
+                    running -= 1
+                    continue
+                pbar.update()
+                yield output
+        # surface errors of the producer, e.g. an invalid partition strategy
+        await producer
+    finally:
+        for task in [producer, *workers]:
+            task.cancel()
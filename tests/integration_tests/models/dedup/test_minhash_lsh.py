@@ -0,0 +1,41 @@
+import asyncio
+
+from graphgen.models.dedup.minhash_lsh import MinHashLSH
+
+TEXT = (
+    "GraphGen builds a knowledge graph from the documents and synthesizes "
+    "question answer pairs along the edges of the graph that the trainee "
+    "model does not know well yet."
+)
+
+
+def test_finds_near_duplicate(tmp_path):
+    index = MinHashLSH(str(tmp_path), threshold=0.7)
+    near_duplicate = TEXT.replace("well yet", "well enough yet")
+    other = "An entirely different sentence about cooking pasta at home."
+
+    duplicates = index.filter_near_duplicates(
+        {"chunk-a": TEXT, "chunk-b": near_duplicate, "chunk-c": other}
+    )
+    assert duplicates == {"chunk-b": "chunk-a"}
+
+
+def test_does_not_match_itself(tmp_path):
+    index = MinHashLSH(str(tmp_path))
+    assert index.filter_near_duplicates({"chunk-a": TEXT}) == {}
+    asyncio.run(index.index_done_callback())
+
+    reopened = MinHashLSH(str(tmp_path))
+    assert reopened.query(reopened.signature(TEXT), "chunk-a") is None
+    assert reopened.query(reopened.signature(TEXT)) == "chunk-a"
+    assert reopened.filter_near_duplicates({"chunk-a": TEXT}) == {}
+
+
+def test_drop(tmp_path):
+    index = MinHashLSH(str(tmp_path))
+    index.filter_near_duplicates({"chunk-a": TEXT})
+    asyncio.run(index.index_done_callback())
+
+    asyncio.run(index.drop())
+    assert not (tmp_path / "minhash.npz").exists()
+    assert index.filter_near_duplicates({"chunk-b": TEXT}) == {}
@@ -0,0 +1,147 @@
+import asyncio
+from typing import List
+
+from graphgen.bases.datatypes import Chunk, Token
+from graphgen.models import LightRAGKGBuilder
+from graphgen.templates import KG_EXTRACTION_PROMPT
+
+PROMPT = KG_EXTRACTION_PROMPT["English"]
+FORMAT = KG_EXTRACTION_PROMPT["FORMAT"]
+
+
+def _records(*names: str, complete: bool = True) -> str:
+    result = FORMAT["record_delimiter"].join(
+        f'("entity"{FORMAT["tuple_delimiter"]}{name}'
+        f'{FORMAT["tuple_delimiter"]}concept{FORMAT["tuple_delimiter"]}about {name})'
+        for name in names
+    )
+    return result + FORMAT["completion_delimiter"] if complete else result
+
+
+class WordTokenizer:
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return len(text.split())
+
+
+class StubLLMClient:
+    """Answers extraction, CONTINUE and IF_LOOP prompts from scripted replies."""
+
+    def __init__(
+        self,
+        extraction: str,
+        gleans: List[str] = None,
+        if_loop: List[str] = None,
+        yes_probs: List[float] = None,
+    ):
+        self.tokenizer = WordTokenizer()
+        self.extraction = extraction
+        self.gleans = list(gleans or [])
+        self.if_loop = list(if_loop or [])
+        self.yes_probs = list(yes_probs or [])
+        self.calls = []
+
+    async def generate_answer(self, text, history=None, system_prompt=None):
+        if text == PROMPT["IF_LOOP"]:
+            self.calls.append("if_loop")
+            return self.if_loop.pop(0)
+        if text == PROMPT["CONTINUE"]:
+            self.calls.append("continue")
+            return self.gleans.pop(0)
+        self.calls.append("extract")
+        return self.extraction
+
+    async def generate_topk_per_token(self, text, history=None, system_prompt=None):
+        assert text == PROMPT["IF_LOOP"]
+        self.calls.append("if_loop_logprob")
+        yes = self.yes_probs.pop(0)
+        return [
+            Token(
+                "YES",
+                yes,
+                top_candidates=[Token("YES", yes), Token(" no", 1 - yes)],
+            )
+        ]
+
+
+def _extract(builder: LightRAGKGBuilder, content: str = "a short chunk"):
+    return asyncio.run(builder.extract(Chunk(id="chunk-1", content=content)))
+
+
+def test_llm_mode_asks_whether_to_continue():
+    client = StubLLMClient(
+        _records("A"), gleans=[_records("B")], if_loop=['"YES"', "no"]
+    )
+    nodes, _ = _extract(LightRAGKGBuilder(llm_client=client, glean_mode="llm"))
+
+    assert client.calls == ["extract", "if_loop", "continue", "if_loop"]
+    assert set(nodes) == {"A", "B"}
+
+
+def test_logprob_mode_compares_yes_and_no():
+    client = StubLLMClient(_records("A"), gleans=[_records("B")], yes_probs=[0.7, 0.2])
+    nodes, _ = _extract(LightRAGKGBuilder(llm_client=client, glean_mode="logprob"))
+
+    assert client.calls == [
+        "extract",
+        "if_loop_logprob",
+        "continue",
+        "if_loop_logprob",
+    ]
+    assert set(nodes) == {"A", "B"}
+
+
+def test_heuristic_mode_gleans_unfinished_lists():
+    content = " ".join(["word"] * 100)
+    # cut off before the completion delimiter, glean once,
+    # then stop as the glean found nothing new
+    client = StubLLMClient(
+        _records("A", complete=False), gleans=[_records("A"), _records("B")]
+    )
+    _extract(LightRAGKGBuilder(llm_client=client, glean_mode="heuristic"), content)
+    assert client.calls == ["extract", "continue"]
+
+    # a finished list dense enough for the chunk is not gleaned
+    client = StubLLMClient(_records("A", "B"))
+    _extract(LightRAGKGBuilder(llm_client=client, glean_mode="heuristic"), content)
+    assert client.calls == ["extract"]
+
+    # a finished but sparse list is
+    client = StubLLMClient(_records("A"), gleans=[_records("B")])
+    _extract(
+        LightRAGKGBuilder(llm_client=client, glean_mode="heuristic", max_loop=1),
+        content,
+    )
+    assert client.calls == ["extract", "continue"]
+
+
+def test_low_yield_loops_are_skipped():
+    builder = LightRAGKGBuilder(
+        glean_mode="heuristic",
+        max_loop=1,
+        min_glean_yield=1.0,
+        glean_budget_warmup=2,
+    )
+    gleans = []
+    for _ in range(3):
+        # every glean repeats the first record, it yields nothing new
+        builder.llm_client = StubLLMClient(
+            _records("A", complete=False), gleans=[_records("A")]
+        )
+        _extract(builder)
+        gleans.append(builder.llm_client.calls.count("continue"))
+
+    assert gleans == [1, 1, 0]
+    assert builder._glean_yield[0] == [2, 0]  # pylint: disable=protected-access
+
+
+def test_llm_mode_ignores_the_yield_budget():
+    builder = LightRAGKGBuilder(
+        glean_mode="llm", max_loop=1, min_glean_yield=1.0, glean_budget_warmup=1
+    )
+    for _ in range(2):
+        builder.llm_client = StubLLMClient(
+            _records("A"), gleans=[_records("A")], if_loop=["yes"]
+        )
+        _extract(builder)
+        assert builder.llm_client.calls == ["extract", "if_loop", "continue"]
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+from graphgen.models.llm.limitter import AdaptiveConcurrencyLimiter
+
+
+class Overloaded(Exception):
+    pass
+
+
+def test_backs_off_on_overload():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=16, min_limit=3)
+
+    async def _failing_request():
+        async with limiter.track(overload_errors=(Overloaded,)):
+            raise Overloaded()
+
+    with pytest.raises(Overloaded):
+        asyncio.run(_failing_request())
+    assert limiter.limit == 8
+    assert limiter.in_flight == 0
+
+    for _ in range(3):
+        limiter.on_overload(time.monotonic())
+    assert limiter.limit == 3
+
+
+def test_ignores_stale_failures():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=16)
+    started_at = time.monotonic()
+    limiter.on_overload(time.monotonic())
+    assert limiter.limit == 8
+
+    # started before the back-off, it saw the old limit
+    limiter.on_overload(started_at)
+    assert limiter.limit == 8
+    limiter.on_overload(time.monotonic())
+    assert limiter.limit == 4
+
+
+def test_grows_while_latency_holds():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=3)
+    for _ in range(2):
+        limiter.on_success(0.1)
+    assert limiter.limit == 3
+    for _ in range(3):
+        limiter.on_success(0.1)
+    assert limiter.limit == 3
+    # a window with a much worse p50 shrinks the limit
+    for _ in range(3):
+        limiter.on_success(1.0)
+    assert limiter.limit == 2
+
+
+def test_limits_in_flight_requests():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=2)
+    peak = 0
+
+    async def _request():
+        nonlocal peak
+        async with limiter.track():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def _run():
+        await asyncio.gather(*(_request() for _ in range(6)))
+
+    asyncio.run(_run())
+    assert peak == 2
@@ -0,0 +1,74 @@
+import asyncio
+import string
+
+import pytest
+
+from graphgen.models.llm.hf_client import HuggingFaceClient
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+tokenizers = pytest.importorskip("tokenizers")
+
+
+@pytest.fixture(name="model_dir", scope="module")
+def fixture_model_dir(tmp_path_factory):
+    """A tiny random Llama with a character level tokenizer."""
+    model_dir = tmp_path_factory.mktemp("tiny_llama")
+    special = ["<pad>", "<s>", "</s>", "<unk>"]
+    vocab = {
+        token: i
+        for i, token in enumerate(special + list(string.ascii_letters + " .,:?!"))
+    }
+    tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizers.Tokenizer(
+            tokenizers.models.BPE(vocab, [], unk_token="<unk>")
+        ),
+        bos_token="<s>",
+        eos_token="</s>",
+        pad_token="<pad>",
+        unk_token="<unk>",
+    )
+    tokenizer.save_pretrained(model_dir)
+
+    torch.manual_seed(0)
+    config = transformers.LlamaConfig(
+        vocab_size=len(vocab),
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=256,
+        bos_token_id=1,
+        eos_token_id=2,
+        pad_token_id=0,
+    )
+    transformers.LlamaForCausalLM(config).save_pretrained(model_dir)
+    return str(model_dir)
+
+
+def _probs(tokens):
+    return [[c.prob for c in token[0].top_candidates] for token in tokens]
+
+
+def test_prefix_cache_matches_single_sequences(model_dir):
+    client = HuggingFaceClient(model_name=model_dir, device="cpu", dtype="float32")
+    prefix = "Is the statement true? Answer yes or no. Statement: "
+    texts = [
+        prefix + "the sky is blue.",
+        prefix + "water is dry.",
+        prefix + "cats bark.",
+    ]
+
+    single = [
+        asyncio.run(client.generate_topk_per_token_batch([text]))[0] for text in texts
+    ]
+    batched = asyncio.run(client.generate_topk_per_token_batch(texts))
+    # the second batch reuses the cached prefix of the first one
+    reused = asyncio.run(client.generate_topk_per_token_batch(texts))
+
+    assert client._prefix_ids  # pylint: disable=protected-access
+    for tokens in (batched, reused):
+        assert [t[0].text for t in tokens] == [t[0].text for t in single]
+        for probs, expected in zip(_probs(tokens), _probs(single)):
+            assert probs == pytest.approx(expected, abs=1e-5)
@@ -0,0 +1,18 @@
+import asyncio
+
+import pytest
+
+from graphgen.models.llm.limitter import TPM
+
+
+def test_token_bucket_correction():
+    tpm = TPM(tpm=600)
+    asyncio.run(tpm.wait(500, silent=True))
+    assert tpm.tokens == pytest.approx(100, abs=1)
+
+    # the request used fewer tokens than estimated
+    tpm.correct(estimated_tokens=500, actual_tokens=200)
+    assert tpm.tokens == pytest.approx(400, abs=1)
+    # and more, the extra tokens are charged
+    tpm.correct(estimated_tokens=100, actual_tokens=450)
+    assert tpm.tokens == pytest.approx(50, abs=1)
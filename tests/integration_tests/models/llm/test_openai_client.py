@@ -0,0 +1,133 @@
+import asyncio
+import math
+import types
+from dataclasses import dataclass
+from typing import List
+
+from graphgen.bases import BaseTokenizer
+from graphgen.models.llm.openai_client import OpenAIClient
+from graphgen.models.llm.response_cache import ResponseCache
+
+
+@dataclass
+class CharTokenizer(BaseTokenizer):
+    model_name: str = "char"
+
+    def encode(self, text: str) -> List[int]:
+        return [ord(c) for c in text]
+
+    def decode(self, token_ids: List[int]) -> str:
+        return "".join(chr(i) for i in token_ids)
+
+
+class FakeChatCompletions:
+    """Answers every request with a new text, like sampling would."""
+
+    def __init__(self):
+        self.requests = []
+
+    async def create(self, model, **kwargs):
+        self.requests.append(kwargs)
+        message = types.SimpleNamespace(content=f"answer {len(self.requests)}")
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=message, logprobs=None)],
+            usage=None,
+        )
+
+
+class FakeCompletions:
+    """Scores raw prompts, returning the choices in reverse order."""
+
+    def __init__(self):
+        self.requests = []
+
+    async def create(self, model, **kwargs):
+        self.requests.append(kwargs)
+        choices = [
+            types.SimpleNamespace(
+                index=i,
+                logprobs=types.SimpleNamespace(
+                    tokens=[prompt[-1]],
+                    token_logprobs=[math.log(0.5)],
+                    top_logprobs=[{prompt[-1]: math.log(0.5), "x": math.log(0.25)}],
+                ),
+            )
+            for i, prompt in enumerate(kwargs["prompt"])
+        ]
+        return types.SimpleNamespace(choices=choices[::-1], usage=None)
+
+
+def _client(tmp_path, **kwargs) -> OpenAIClient:
+    client = OpenAIClient(
+        model_name="model",
+        api_key="key",
+        base_url="http://localhost",
+        tokenizer=CharTokenizer(),
+        cache=ResponseCache(str(tmp_path)),
+        **kwargs,
+    )
+    client.client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=FakeChatCompletions()),
+        completions=FakeCompletions(),
+    )
+    return client
+
+
+def test_sampling_params_change_the_cache_key(tmp_path):
+    # pylint: disable=protected-access
+    client = _client(tmp_path)
+    kwargs = client._pre_generate("text", None)
+    key = client._cache_key("generate_answer", kwargs)
+    for changed in ({"top_p": 0.5}, {"max_tokens": 10}, {"seed": 1}):
+        other = client._cache_key("generate_answer", {**kwargs, **changed})
+        assert other not in (None, key)
+
+    sampled = {**kwargs, "temperature": 1}
+    assert client._cache_key("generate_answer", sampled) is None
+    assert client._cache_key("generate_answer", sampled, 0) != client._cache_key(
+        "generate_answer", sampled, 1
+    )
+
+
+def test_greedy_answers_are_cached(tmp_path):
+    client = _client(tmp_path)
+    first = asyncio.run(client.generate_answer("text"))
+    assert asyncio.run(client.generate_answer("text")) == first
+    assert len(client.client.chat.completions.requests) == 1
+
+
+def test_samples_are_not_collapsed_by_the_cache(tmp_path):
+    client = _client(tmp_path)
+
+    async def _sample(**extra):
+        return await client.generate_answer("text", temperature=1, **extra)
+
+    # without a nonce sampled answers bypass the cache
+    assert asyncio.run(_sample()) != asyncio.run(_sample())
+    assert client.client.chat.completions.requests[0]["temperature"] == 1
+
+    # with the sample index every sample is cached on its own
+    samples = [asyncio.run(_sample(cache_nonce=i)) for i in range(2)]
+    assert samples[0] != samples[1]
+    assert [asyncio.run(_sample(cache_nonce=i)) for i in range(2)] == samples
+    assert len(client.client.chat.completions.requests) == 4
+
+
+def test_batch_completions_request(tmp_path):
+    client = _client(tmp_path, batch_completions=True, system_prompt="sys")
+    requests = client.client.completions.requests
+
+    tokens = asyncio.run(client.generate_topk_per_token_batch(["a", "b"]))
+
+    assert len(requests) == 1
+    assert requests[0]["prompt"] == ["sys\n\na", "sys\n\nb"]
+    assert requests[0]["max_tokens"] == 1
+    assert requests[0]["logprobs"] == client.topk_per_token
+    # choices are matched to the prompts by their index
+    assert [t[0].text for t in tokens] == ["a", "b"]
+    assert [c.text for c in tokens[0][0].top_candidates] == ["a", "x"]
+
+    # cached prompts are left out of the next request
+    tokens = asyncio.run(client.generate_topk_per_token_batch(["b", "c"]))
+    assert requests[1]["prompt"] == ["sys\n\nc"]
+    assert [t[0].text for t in tokens] == ["b", "c"]
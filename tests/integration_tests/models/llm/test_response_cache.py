@@ -0,0 +1,40 @@
+import time
+
+from graphgen.models.llm.response_cache import ResponseCache
+
+
+def test_hit_and_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get("key") is None
+    cache.set("key", {"content": "answer", "tokens": [1, 2]})
+    assert cache.get("key") == {"content": "answer", "tokens": [1, 2]}
+    assert cache.stats == {"hits": 1, "misses": 1, "hit_rate": 0.5, "size": 1}
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_entries=2)
+    cache.set("a", "A")
+    time.sleep(0.01)
+    cache.set("b", "B")
+    time.sleep(0.01)
+    # reading a makes b the least recently used entry
+    assert cache.get("a") == "A"
+    time.sleep(0.01)
+    cache.set("c", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.stats["size"] == 2
+
+
+def test_persists_across_reopen(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.set("key", "answer")
+    cache.set("key", "new answer")
+    cache.get("key")
+    cache.flush()
+
+    reopened = ResponseCache(str(tmp_path))
+    assert reopened.get("key") == "new answer"
+    assert reopened.stats["size"] == 1
@@ -0,0 +1,28 @@
+import gzip
+import json
+import warnings
+
+import pytest
+
+from graphgen.models.reader.json_reader import JsonReader
+
+DOCS = [{"content": "first document"}, {"content": "第二个文档", "score": 0.5}]
+
+
+@pytest.mark.parametrize("file_name", ["docs.json", "docs.json.gz"])
+def test_json_reader(tmp_path, file_name):
+    path = tmp_path / file_name
+    opener = gzip.open if file_name.endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        json.dump(DOCS, f, ensure_ascii=False)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert JsonReader().read(str(path)) == DOCS
+
+
+def test_json_reader_rejects_non_list(tmp_path):
+    path = tmp_path / "doc.json"
+    path.write_text(json.dumps(DOCS[0]), encoding="utf-8")
+    with pytest.raises(ValueError):
+        JsonReader().read(str(path))
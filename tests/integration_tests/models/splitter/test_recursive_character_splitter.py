@@ -1,3 +1,5 @@
+import random
+
 from graphgen.models.splitter.recursive_character_splitter import (
     ChineseRecursiveTextSplitter,
     RecursiveCharacterSplitter,
@@ -47,3 +49,49 @@ def test_split_chinese_with_punctuation():
     for chk in chunks:
         assert len(chk) <= 60
         assert "\n\n\n" not in chk
+
+
+def test_split_with_custom_length_function():
+    text = " ".join(f"word{i}" for i in range(200))
+    calls = []
+
+    def count_words(s: str) -> int:
+        calls.append(s)
+        return len(s.split())
+
+    splitter = RecursiveCharacterSplitter(
+        chunk_size=30,
+        chunk_overlap=5,
+        length_function=count_words,
+    )
+    chunks = splitter.split_text(text)
+
+    assert len(chunks) > 1
+    for chk in chunks:
+        assert count_words(chk) <= 30
+    # every split is measured once, not again when it leaves the overlap window
+    assert len(calls) <= len(text.split(" ")) + len(chunks) + 2
+
+
+def test_span_engine_matches_substring_splitting():
+    # pylint: disable=protected-access
+    random.seed(0)
+    alphabet = list("ab .。！？；;,，\n") + ["\n\n"]
+    texts = [
+        "".join(random.choice(alphabet) for _ in range(random.randint(0, 300)))
+        for _ in range(50)
+    ]
+
+    for cls in (RecursiveCharacterSplitter, ChineseRecursiveTextSplitter):
+        for keep_separator in (True, False, "end"):
+            for chunk_size, chunk_overlap in ((8, 0), (30, 5), (64, 20)):
+                splitter = cls(
+                    chunk_size=chunk_size,
+                    chunk_overlap=chunk_overlap,
+                    keep_separator=keep_separator,
+                )
+                for text in texts:
+                    expected = splitter._postprocess(
+                        splitter._split_text(text, splitter._separators)
+                    )
+                    assert splitter.split_text(text) == expected
@@ -0,0 +1,204 @@
+import asyncio
+import os
+
+import msgpack
+import networkx as nx
+
+from graphgen.models.storage.networkx_storage import NetworkXStorage
+
+
+def _storage(working_dir, **kwargs) -> NetworkXStorage:
+    return NetworkXStorage(str(working_dir), namespace="graph", **kwargs)
+
+
+def _wal_records(working_dir) -> list:
+    with open(os.path.join(working_dir, "graph.wal"), "rb") as f:
+        return list(msgpack.Unpacker(f, raw=False, strict_map_key=False))
+
+
+def _build(working_dir, **kwargs) -> NetworkXStorage:
+    """A - B, logged and flushed to the WAL."""
+    storage = _storage(working_dir, **kwargs)
+
+    async def _run():
+        await storage.upsert_node("A", {"description": "node a", "weight": 1})
+        await storage.upsert_node("B", {"description": "node b"})
+        await storage.upsert_edge("A", "B", {"description": "a to b"})
+        await storage.index_done_callback()
+
+    asyncio.run(_run())
+    return storage
+
+
+def test_replay_after_crash(tmp_path):
+    storage = _build(tmp_path)
+
+    async def _unflushed():
+        await storage.upsert_node("C", {"description": "lost"})
+
+    # mutations after the last index_done_callback die with the process
+    asyncio.run(_unflushed())
+    assert not os.path.exists(tmp_path / "graph.msgpack")
+
+    reopened = _storage(tmp_path)
+    graph = asyncio.run(reopened.get_graph())
+    assert sorted(graph.nodes) == ["A", "B"]
+    assert graph.nodes["A"] == {"description": "node a", "weight": 1}
+    assert graph.edges["A", "B"] == {"description": "a to b"}
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    _build(tmp_path)
+    wal_file = tmp_path / "graph.wal"
+    size = os.path.getsize(wal_file)
+    record = msgpack.packb(["upsert_node", "C", {"description": "torn"}])
+    with open(wal_file, "ab") as f:
+        f.write(record[:-3])
+
+    reopened = _storage(tmp_path)
+    assert sorted(asyncio.run(reopened.get_graph()).nodes) == ["A", "B"]
+    assert os.path.getsize(wal_file) == size
+
+    # appending after the truncation keeps the log readable
+    async def _append():
+        await reopened.upsert_node("D", {"description": "node d"})
+        await reopened.index_done_callback()
+
+    asyncio.run(_append())
+    assert sorted(asyncio.run(_storage(tmp_path).get_graph()).nodes) == [
+        "A",
+        "B",
+        "D",
+    ]
+
+
+def test_compaction_at_threshold(tmp_path):
+    storage = _build(tmp_path, compaction_threshold=4)
+    assert os.path.exists(tmp_path / "graph.wal")
+    assert not os.path.exists(tmp_path / "graph.msgpack")
+
+    async def _update():
+        await storage.update_node("B", {"weight": 2})
+        await storage.index_done_callback()
+
+    asyncio.run(_update())
+    assert not os.path.exists(tmp_path / "graph.wal")
+    graph = NetworkXStorage.load_snapshot(str(tmp_path / "graph.msgpack"))
+    assert graph.nodes["B"] == {"description": "node b", "weight": 2}
+
+
+def test_swapped_graph_is_compacted(tmp_path):
+    storage = _build(tmp_path)
+    external = nx.Graph()
+    external.add_edge("X", "Y", description="x to y")
+    # e.g. an external graph loaded into the storage
+    storage._graph = external  # pylint: disable=protected-access
+
+    asyncio.run(storage.index_done_callback())
+    assert not os.path.exists(tmp_path / "graph.wal")
+    graph = asyncio.run(_storage(tmp_path).get_graph())
+    assert list(graph.edges(data=True)) == [("X", "Y", {"description": "x to y"})]
+
+
+def test_updates_log_only_changed_attributes(tmp_path):
+    storage = _build(tmp_path)
+
+    async def _update():
+        await storage.update_node("A", {"description": "node a", "loss": 0.5})
+        await storage.upsert_node("A", {"description": "node a", "weight": 1})
+        await storage.update_edge("A", "B", {"description": "a to b", "length": 3})
+        # a dict mutated in place cannot be diffed, it is logged whole
+        edge_data = await storage.get_edge("A", "B")
+        edge_data["loss"] = 0.1
+        await storage.update_edge("A", "B", edge_data)
+        await storage.index_done_callback()
+
+    asyncio.run(_update())
+    assert _wal_records(tmp_path)[3:] == [
+        ["update_node", "A", {"loss": 0.5}],
+        ["update_edge", "A", "B", {"length": 3}],
+        ["update_edge", "A", "B", {"description": "a to b", "length": 3, "loss": 0.1}],
+    ]
+    graph = asyncio.run(_storage(tmp_path).get_graph())
+    assert graph.nodes["A"] == {"description": "node a", "weight": 1, "loss": 0.5}
+    assert graph.edges["A", "B"] == {"description": "a to b", "length": 3, "loss": 0.1}
+
+
+def test_backfill_of_live_attributes_is_logged(tmp_path):
+    storage = _build(tmp_path)
+
+    async def _backfill():
+        # like the loss, length and language backfills, update before the
+        # attribute dicts returned by get_all_* change
+        for node_id, node_data in await storage.get_all_nodes():
+            await storage.update_node(node_id, {"length": len(node_id)})
+            node_data["length"] = len(node_id)
+        await storage.index_done_callback()
+
+    asyncio.run(_backfill())
+    assert _wal_records(tmp_path)[3:] == [
+        ["update_node", "A", {"length": 1}],
+        ["update_node", "B", {"length": 1}],
+    ]
+    graph = asyncio.run(_storage(tmp_path).get_graph())
+    assert all(data["length"] == 1 for _, data in graph.nodes(data=True))
+
+
+def test_msgpack_snapshot_round_trip(tmp_path):
+    graph = nx.DiGraph()
+    graph.add_node(1, weight=1, score=0.5, flag=True, tags=["a", "b"])
+    graph.add_node("B", weight="heavy", description="第二个节点")
+    graph.add_node("C")
+    graph.add_edge(1, "B", length=3, loss=None)
+    graph.add_edge("B", "C", length=2.5, meta={"source": "chunk-1"})
+    file_name = str(tmp_path / "graph.msgpack")
+
+    NetworkXStorage.write_snapshot(graph, file_name)
+    loaded = NetworkXStorage.load_snapshot(file_name)
+
+    assert loaded.is_directed()
+    assert list(loaded.nodes(data=True)) == [
+        (1, {"weight": 1, "score": 0.5, "flag": True, "tags": ["a", "b"]}),
+        ("B", {"weight": "heavy", "description": "第二个节点"}),
+        ("C", {}),
+    ]
+    # None marks a missing value in the columns, so None attributes are dropped
+    assert list(loaded.edges(data=True)) == [
+        (1, "B", {"length": 3}),
+        ("B", "C", {"length": 2.5, "meta": {"source": "chunk-1"}}),
+    ]
+
+
+def test_migrates_graphml_once(tmp_path):
+    graph = nx.Graph()
+    graph.add_node("A", description="node a", weight=1)
+    graph.add_edge("A", "B", description="a to b")
+    nx.write_graphml(graph, tmp_path / "graph.graphml")
+
+    storage = _storage(tmp_path)
+    assert asyncio.run(storage.get_node("A")) == {"description": "node a", "weight": 1}
+    asyncio.run(storage.index_done_callback())
+    assert os.path.exists(tmp_path / "graph.msgpack")
+
+    # the snapshot is read from now on, the GraphML file is left alone
+    os.remove(tmp_path / "graph.graphml")
+    graph = asyncio.run(_storage(tmp_path).get_graph())
+    assert graph.edges["A", "B"] == {"description": "a to b"}
+
+
+def test_graphml_storage_format(tmp_path):
+    _build(tmp_path, storage_format="graphml", compaction_threshold=1)
+    assert os.path.exists(tmp_path / "graph.graphml")
+    assert not os.path.exists(tmp_path / "graph.msgpack")
+    graph = asyncio.run(_storage(tmp_path, storage_format="graphml").get_graph())
+    assert graph.nodes["A"] == {"description": "node a", "weight": 1}
+
+    storage = _storage(tmp_path, storage_format="graphml", enable_wal=False)
+    asyncio.run(storage.upsert_node("C", {"description": "node c"}))
+    asyncio.run(storage.index_done_callback())
+    assert not os.path.exists(tmp_path / "graph.wal")
+    assert sorted(nx.read_graphml(tmp_path / "graph.graphml").nodes) == [
+        "A",
+        "B",
+        "C",
+    ]
@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+from graphgen.models.storage.json_storage import JsonKVStorage
+from graphgen.models.storage.sqlite_storage import SQLiteKVStorage
+
+
+def test_imports_json_on_first_open(tmp_path):
+    json_storage = JsonKVStorage(str(tmp_path), namespace="text_chunks")
+    asyncio.run(
+        json_storage.upsert(
+            {"chunk-1": {"content": "first"}, "chunk-2": {"content": "第二"}}
+        )
+    )
+    asyncio.run(json_storage.index_done_callback())
+
+    storage = SQLiteKVStorage(str(tmp_path), namespace="text_chunks")
+    assert sorted(asyncio.run(storage.all_keys())) == ["chunk-1", "chunk-2"]
+    assert asyncio.run(storage.get_by_id("chunk-2")) == {"content": "第二"}
+
+    # the JSON file is only imported into a new database
+    (tmp_path / "text_chunks.json").write_text(
+        json.dumps({"chunk-3": {"content": "third"}}), encoding="utf-8"
+    )
+    storage = SQLiteKVStorage(str(tmp_path), namespace="text_chunks")
+    assert sorted(asyncio.run(storage.all_keys())) == ["chunk-1", "chunk-2"]
+
+
+def test_upsert_keeps_and_update_overwrites(tmp_path):
+    storage = SQLiteKVStorage(str(tmp_path), namespace="kv", batch_size=2)
+
+    async def _run():
+        added = await storage.upsert({"a": {"v": 1}, "b": {"v": 2}})
+        assert added == {"a": {"v": 1}, "b": {"v": 2}}
+
+        added = await storage.upsert({"a": {"v": 10}, "c": {"v": 3}})
+        assert added == {"c": {"v": 3}}
+        assert await storage.get_by_id("a") == {"v": 1}
+
+        await storage.update({"a": {"v": 10, "w": 0}, "d": {"v": 4}})
+        assert await storage.get_by_ids(["a", "d", "missing"]) == [
+            {"v": 10, "w": 0},
+            {"v": 4},
+            None,
+        ]
+        assert await storage.get_by_ids(["a", "missing"], fields={"w"}) == [
+            {"w": 0},
+            None,
+        ]
+        assert await storage.filter_keys(["a", "b", "c", "e", "f"]) == {"e", "f"}
+        await storage.index_done_callback()
+
+    asyncio.run(_run())
+    reopened = SQLiteKVStorage(str(tmp_path), namespace="kv")
+    assert asyncio.run(reopened.get_by_id("a")) == {"v": 10, "w": 0}
+
+    asyncio.run(reopened.drop())
+    assert asyncio.run(reopened.all_keys()) == []
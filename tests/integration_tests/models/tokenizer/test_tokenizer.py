@@ -0,0 +1,106 @@
+import pickle
+import string
+
+import pytest
+
+from graphgen.models.tokenizer import Tokenizer
+from graphgen.utils import compute_content_hash
+
+transformers = pytest.importorskip("transformers")
+tokenizers = pytest.importorskip("tokenizers")
+
+
+@pytest.fixture(name="model_dir", scope="module")
+def fixture_model_dir(tmp_path_factory):
+    """A character level tokenizer saved as a HuggingFace model."""
+    model_dir = tmp_path_factory.mktemp("char_tokenizer")
+    vocab = {token: i for i, token in enumerate(["<unk>"] + list(string.ascii_letters))}
+    transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizers.Tokenizer(
+            tokenizers.models.BPE(vocab, [], unk_token="<unk>")
+        ),
+        unk_token="<unk>",
+    ).save_pretrained(model_dir)
+    return str(model_dir)
+
+
+class CountingImpl:
+    """Forwards to a tokenizer and records the texts it counts."""
+
+    def __init__(self, impl):
+        self.impl = impl
+        self.counted = []
+
+    def count_tokens(self, text):
+        self.counted.append(text)
+        return self.impl.count_tokens(text)
+
+    def count_tokens_batch(self, texts):
+        self.counted.extend(texts)
+        return self.impl.count_tokens_batch(texts)
+
+
+def _tokenizer(model_dir, **kwargs):
+    # pylint: disable=protected-access
+    tokenizer = Tokenizer(model_name=model_dir, **kwargs)
+    tokenizer._impl = CountingImpl(tokenizer._impl)
+    return tokenizer
+
+
+def test_counts_are_cached_by_content_hash(model_dir):
+    # pylint: disable=protected-access
+    tokenizer = _tokenizer(model_dir)
+
+    assert tokenizer.count_tokens("abc") == 3
+    assert tokenizer.count_tokens_batch(["abc", "de", "de"]) == [3, 2, 2]
+    assert tokenizer.count_tokens("de") == 2
+
+    # every distinct text is counted once
+    assert tokenizer._impl.counted == ["abc", "de"]
+    assert list(tokenizer._count_cache) == [
+        compute_content_hash("abc"),
+        compute_content_hash("de"),
+    ]
+
+
+def test_evicts_least_recently_used(model_dir):
+    # pylint: disable=protected-access
+    tokenizer = _tokenizer(model_dir, max_cached_counts=2)
+
+    tokenizer.count_tokens_batch(["a", "bb"])
+    tokenizer.count_tokens("a")  # bb is now the least recently used
+    tokenizer.count_tokens("ccc")
+    assert list(tokenizer._count_cache) == [
+        compute_content_hash("a"),
+        compute_content_hash("ccc"),
+    ]
+
+    tokenizer.count_tokens_batch(["a", "bb"])
+    assert tokenizer._impl.counted == ["a", "bb", "ccc", "bb"]
+    assert len(tokenizer._count_cache) == 2
+
+
+def test_cache_can_be_disabled(model_dir):
+    # pylint: disable=protected-access
+    tokenizer = _tokenizer(model_dir, max_cached_counts=0)
+
+    assert tokenizer.count_tokens_batch(["ab", "ab"]) == [2, 2]
+    assert tokenizer.count_tokens("ab") == 2
+    assert tokenizer._impl.counted == ["ab", "ab", "ab"]
+    assert not tokenizer._count_cache
+
+
+def test_pickled_by_name(model_dir):
+    # pylint: disable=protected-access
+    tokenizer = Tokenizer(model_name=model_dir, max_cached_counts=5)
+    tokenizer.count_tokens("abc")
+
+    restored = pickle.loads(pickle.dumps(tokenizer))
+
+    assert restored.model_name == model_dir
+    assert restored.max_cached_counts == 5
+    # the cache and the lock are not pickled, they start afresh
+    assert not restored._count_cache
+    assert restored._count_lock is not tokenizer._count_lock
+    assert restored.count_tokens("abc") == 3
+    assert restored.encode("abc") == tokenizer.encode("abc")
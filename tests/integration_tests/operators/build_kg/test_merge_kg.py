@@ -0,0 +1,85 @@
+import asyncio
+
+from graphgen.operators.build_kg.build_kg import merge_kg
+from graphgen.utils import KeyLock
+
+
+class FakeKGBuilder:
+    """Records the nodes already merged when each edge is merged."""
+
+    def __init__(self, delays: dict):
+        self.delays = delays
+        self.merged_nodes = set()
+        self.edge_saw = {}
+
+    async def merge_nodes(self, kv, kg_instance):
+        await asyncio.sleep(self.delays.get(kv[0], 0))
+        self.merged_nodes.add(kv[0])
+
+    async def merge_edges(self, kv, kg_instance):
+        self.edge_saw[kv[0]] = set(self.merged_nodes)
+
+
+def test_edges_wait_for_their_nodes():
+    builder = FakeKGBuilder({"A": 0.05, "B": 0.01, "C": 0.1})
+    nodes = {"A": [{}], "B": [{}], "C": [{}]}
+    edges = {("A", "B"): [{}], ("X", "Y"): [{}]}
+
+    asyncio.run(merge_kg(builder, None, nodes, edges))
+
+    assert builder.merged_nodes == {"A", "B", "C"}
+    assert {"A", "B"} <= builder.edge_saw[("A", "B")]
+    # C is not an endpoint, the edge does not wait for it
+    assert "C" not in builder.edge_saw[("A", "B")]
+    # endpoints outside the batch do not block the edge
+    assert builder.edge_saw[("X", "Y")] == set()
+
+
+def test_key_lock_serializes_same_key():
+    key_lock = KeyLock(num_stripes=8)
+    events = []
+
+    async def _work(key, name):
+        async with key_lock(key):
+            events.append(("start", name))
+            await asyncio.sleep(0.01)
+            events.append(("end", name))
+
+    async def _run():
+        await asyncio.gather(_work("k", 1), _work("k", 2))
+        assert key_lock("k") is key_lock("k")
+
+    asyncio.run(_run())
+    assert events == [("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+    # a new event loop gets fresh locks
+    asyncio.run(_run())
+
+
+def test_bounded_merges_do_not_deadlock():
+    builder = FakeKGBuilder({"A": 0.01, "B": 0.01, "C": 0.01})
+    nodes = {"A": [{}], "B": [{}], "C": [{}]}
+    edges = {(src, tgt): [{}] for src in "ABC" for tgt in "ABC" if src < tgt}
+    in_flight, peak = 0, 0
+
+    merge_nodes = builder.merge_nodes
+
+    async def _counted_merge_nodes(kv, kg_instance):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await merge_nodes(kv, kg_instance)
+        finally:
+            in_flight -= 1
+
+    builder.merge_nodes = _counted_merge_nodes
+
+    async def _run():
+        await asyncio.wait_for(
+            merge_kg(builder, None, nodes, edges, max_concurrent=2), timeout=5
+        )
+
+    asyncio.run(_run())
+
+    assert peak == 2
+    assert all(builder.edge_saw[edge] >= set(edge) for edge in edges)
@@ -0,0 +1,117 @@
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from graphgen.operators.build_kg.partition_engine import (
+    PartitionEngine,
+    _connected_components,
+    partition_edges,
+)
+
+MAX_WIDTH = {
+    "expand_method": "max_width",
+    "max_depth": 1,
+    "bidirectional": True,
+    "max_extra_edges": 1,
+}
+
+
+def _square(edge_losses):
+    """A - B - C - D - A, the edges in this order."""
+    nodes = [(node_id, {"loss": 1.0, "length": 1}) for node_id in "ABCD"]
+    pairs = [("A", "B"), ("B", "C"), ("C", "D"), ("A", "D")]
+    edges = [
+        (src, tgt, {"loss": loss, "length": 1})
+        for (src, tgt), loss in zip(pairs, edge_losses)
+    ]
+    return nodes, edges
+
+
+@pytest.mark.parametrize("edge_sampling", ["min_loss", "max_loss"])
+@pytest.mark.parametrize("loss_strategy", ["only_edge", "both"])
+def test_tied_losses_keep_edge_order(edge_sampling, loss_strategy):
+    # A - B seeds the first batch and, of its tied neighbours A - D and
+    # B - C, takes B - C which comes first in edges
+    nodes, edges = _square([0.5, 0.5, 0.5, 0.5])
+    strategy = {
+        **MAX_WIDTH,
+        "edge_sampling": edge_sampling,
+        "loss_strategy": loss_strategy,
+    }
+    assert partition_edges(nodes, edges, strategy) == [[0, 1], [2, 3]]
+
+
+def test_losses_order_seeds_and_candidates():
+    nodes, edges = _square([0.4, 0.3, 0.1, 0.2])
+    strategy = {**MAX_WIDTH, "edge_sampling": "min_loss", "loss_strategy": "only_edge"}
+    assert partition_edges(nodes, edges, strategy) == [[2, 3], [1, 0]]
+    strategy["edge_sampling"] = "max_loss"
+    assert partition_edges(nodes, edges, strategy) == [[0, 1], [3, 2]]
+
+
+def test_csr_adjacency():
+    # node 0 - node 1 (rank 0), node 1 - node 2 (rank 1), node 0 - node 2 (rank 2)
+    src, tgt = np.array([0, 1, 0]), np.array([1, 2, 2])
+    engine = PartitionEngine(src, tgt, 4, {**MAX_WIDTH, "max_extra_edges": 5})
+    assert engine.indptr == [0, 2, 4, 6, 6]
+    assert engine.adj == [0, 2, 0, 1, 1, 2]
+
+    assert engine.expand(1) == [1, 0, 2]
+    assert engine.visited == bytearray([1, 1, 1])
+
+
+def test_max_tokens_budget():
+    nodes, edges = _square([0.1, 0.2, 0.3, 0.4])
+    strategy = {
+        "expand_method": "max_tokens",
+        "max_depth": 2,
+        "bidirectional": True,
+        "max_tokens": 5,
+        "edge_sampling": "min_loss",
+        "loss_strategy": "only_edge",
+    }
+    # the seed costs 3 tokens, every further edge with its new node 2
+    assert partition_edges(nodes, edges, strategy) == [[0, 1], [2, 3]]
+
+
+def test_connected_components():
+    # 0 - 1 - 2, 3 - 4, 5 isolated, 6 - 7 - 6 with a parallel edge
+    src = np.array([2, 1, 4, 7, 6])
+    tgt = np.array([1, 0, 3, 6, 7])
+    labels = _connected_components(src, tgt, 8)
+    assert labels.tolist() == [0, 0, 0, 3, 3, 5, 6, 6]
+
+
+def test_connected_components_match_networkx():
+    rng = random.Random(0)
+    num_nodes = 300
+    pairs = [(rng.randrange(num_nodes), rng.randrange(num_nodes)) for _ in range(200)]
+    src, tgt = np.array(pairs).T
+    labels = _connected_components(src, tgt, num_nodes)
+
+    graph = nx.Graph()
+    graph.add_nodes_from(range(num_nodes))
+    graph.add_edges_from(pairs)
+    for component in nx.connected_components(graph):
+        assert {labels[node] for node in component} == {min(component)}
+
+
+def test_processes_match_single_process():
+    rng = random.Random(0)
+    nodes = [(str(i), {"loss": rng.random(), "length": 3}) for i in range(200)]
+    edges = [
+        (str(rng.randrange(200)), str(rng.randrange(200)), {"loss": rng.random()})
+        for _ in range(300)
+    ]
+    strategy = {
+        **MAX_WIDTH,
+        "max_depth": 2,
+        "max_extra_edges": 4,
+        "edge_sampling": "min_loss",
+        "loss_strategy": "both",
+    }
+    assert partition_edges(nodes, edges, strategy, num_workers=2) == (
+        partition_edges(nodes, edges, strategy)
+    )
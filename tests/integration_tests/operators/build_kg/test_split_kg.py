@@ -0,0 +1,69 @@
+import asyncio
+import random
+
+from graphgen.operators.build_kg.split_kg import iter_batches_with_strategy
+
+STRATEGY = {
+    "expand_method": "max_width",
+    "max_depth": 2,
+    "bidirectional": True,
+    "max_extra_edges": 3,
+    "edge_sampling": "max_loss",
+    "loss_strategy": "only_edge",
+    "isolated_node_strategy": "ignore",
+}
+
+
+def _components_graph(num_components: int, size: int):
+    """num_components random trees of size nodes each, edges shuffled."""
+    rng = random.Random(0)
+    nodes, edges = [], []
+    for c in range(num_components):
+        ids = [f"{c}-{i}" for i in range(size)]
+        nodes.extend((node_id, {"description": node_id}) for node_id in ids)
+        for i in range(1, size):
+            edges.append(
+                (ids[rng.randrange(i)], ids[i], {"loss": rng.choice([0.1, 0.5, 0.9])})
+            )
+    rng.shuffle(edges)
+    return nodes, edges
+
+
+async def _partition_with_ticker(nodes, edges, num_workers):
+    """Batches, and how often a concurrent coroutine ran before the first one."""
+    ticks = 0
+    first_batch_at = None
+    done = False
+
+    async def _ticker():
+        nonlocal ticks
+        while not done:
+            ticks += 1
+            await asyncio.sleep(0.001)
+
+    ticker = asyncio.create_task(_ticker())
+    batches = []
+    try:
+        async for batch_nodes, batch_edges in iter_batches_with_strategy(
+            nodes, edges, None, {**STRATEGY, "num_workers": num_workers}
+        ):
+            if first_batch_at is None:
+                first_batch_at = ticks
+            batches.append(
+                ([n["node_id"] for n in batch_nodes], [e[:2] for e in batch_edges])
+            )
+    finally:
+        done = True
+        await ticker
+    return batches, first_batch_at
+
+
+def test_workers_match_single_process():
+    nodes, edges = _components_graph(num_components=12, size=30)
+    single, _ = asyncio.run(_partition_with_ticker(nodes, edges, 0))
+    multi, first_batch_at = asyncio.run(_partition_with_ticker(nodes, edges, 2))
+
+    assert multi == single
+    assert sum(len(batch_edges) for _, batch_edges in multi) == len(edges)
+    # the event loop keeps running while the process pool partitions
+    assert first_batch_at > 1
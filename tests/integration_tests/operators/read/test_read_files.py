@@ -0,0 +1,82 @@
+import gzip
+import json
+import logging
+
+import pytest
+
+from graphgen.models.reader import json_reader
+from graphgen.operators.read.read_files import iter_read_files, read_files
+
+
+def _write_jsonl(path, contents, open_fn=open):
+    with open_fn(path, "wt", encoding="utf-8") as f:
+        for content in contents:
+            f.write(json.dumps({"content": content}) + "\n")
+
+
+def _make_tree(tmp_path):
+    (tmp_path / "sub").mkdir()
+    _write_jsonl(tmp_path / "b.jsonl", ["b1", "b2"])
+    (tmp_path / "a.txt").write_text("a1\n\na2\n", encoding="utf-8")
+    (tmp_path / "sub" / "c.json").write_text(
+        json.dumps([{"content": "c1"}]), encoding="utf-8"
+    )
+    (tmp_path / "notes.md").write_text("# not an input", encoding="utf-8")
+
+
+def test_directory_in_sorted_order(tmp_path, caplog):
+    _make_tree(tmp_path)
+
+    with caplog.at_level(logging.WARNING, logger="graphgen"):
+        docs = read_files(str(tmp_path))
+
+    assert [doc["content"] for doc in docs] == ["a1", "a2", "b1", "b2", "c1"]
+    assert "notes.md" in caplog.text
+
+
+def test_glob_pattern(tmp_path):
+    _make_tree(tmp_path)
+
+    docs = read_files(str(tmp_path / "**" / "*.json*"))
+
+    assert [doc["content"] for doc in docs] == ["b1", "b2", "c1"]
+
+
+def test_no_matching_files(tmp_path, caplog):
+    with caplog.at_level(logging.WARNING, logger="graphgen"):
+        assert read_files(str(tmp_path / "*.jsonl")) == []
+    assert "No files of supported formats" in caplog.text
+
+
+def test_gzip_inputs(tmp_path):
+    _write_jsonl(tmp_path / "a.jsonl.gz", ["a1", "a2"], open_fn=gzip.open)
+    with gzip.open(tmp_path / "b.json.gz", "wt", encoding="utf-8") as f:
+        json.dump([{"content": "b1"}], f)
+
+    docs = iter_read_files(str(tmp_path))
+
+    assert [doc["content"] for doc in docs] == ["a1", "a2", "b1"]
+
+
+def test_zstd_input(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    data = "".join(json.dumps({"content": c}) + "\n" for c in ["a1", "a2"])
+    (tmp_path / "a.jsonl.zst").write_bytes(
+        zstandard.ZstdCompressor().compress(data.encode("utf-8"))
+    )
+
+    docs = read_files(str(tmp_path / "a.jsonl.zst"))
+
+    assert [doc["content"] for doc in docs] == ["a1", "a2"]
+
+
+def test_json_without_ijson(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(json_reader, "_IJSON_AVAILABLE", False)
+    path = tmp_path / "a.json"
+    path.write_text(json.dumps([{"content": "a1"}, {"content": "a2"}]))
+
+    with caplog.at_level(logging.WARNING, logger="graphgen"):
+        docs = read_files(str(path))
+
+    assert [doc["content"] for doc in docs] == ["a1", "a2"]
+    assert "ijson is not installed" in caplog.text
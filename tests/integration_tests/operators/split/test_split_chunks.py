@@ -0,0 +1,59 @@
+import asyncio
+import random
+from typing import List
+
+from graphgen.operators.split.split_chunks import chunk_documents
+
+
+class WordTokenizer:
+    """Counts whitespace separated words, picklable for worker processes."""
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return len(text.split())
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        return [self.count_tokens(text) for text in texts]
+
+
+def _docs(num_docs: int) -> dict:
+    rng = random.Random(0)
+    words = ["graph", "node", "edge", "知识", "图谱", "实体", "关系"]
+    docs = {}
+    for i in range(num_docs):
+        # words are numbered by doc, so that no two docs share a chunk
+        sentences = [
+            " ".join(f"{rng.choice(words)}{i}" for _ in range(rng.randrange(3, 12)))
+            + "."
+            for _ in range(rng.randrange(1, 40))
+        ]
+        docs[f"doc-{i}"] = {"content": "\n".join(sentences)}
+    return docs
+
+
+def _chunk(docs: dict, num_workers: int, **kwargs):
+    progress = []
+    chunks = asyncio.run(
+        chunk_documents(
+            docs,
+            chunk_size=40,
+            chunk_overlap=5,
+            progress_bar=lambda fraction, desc: progress.append(fraction),
+            num_workers=num_workers,
+            **kwargs,
+        )
+    )
+    return chunks, progress
+
+
+def test_workers_match_sequential_chunking():
+    docs = _docs(30)
+    for kwargs in ({}, {"tokenizer_instance": WordTokenizer(), "length_unit": "token"}):
+        sequential, _ = _chunk(docs, 0, **kwargs)
+        parallel, progress = _chunk(docs, 2, **kwargs)
+
+        # same chunks, in the order of the docs
+        assert list(parallel.items()) == list(sequential.items())
+        doc_ids = [chunk["full_doc_id"] for chunk in parallel.values()]
+        assert doc_ids == sorted(doc_ids, key=lambda d: int(d.split("-")[1]))
+        assert progress == sorted(progress) and progress[-1] == 1
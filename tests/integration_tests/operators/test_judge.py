@@ -0,0 +1,99 @@
+import asyncio
+import zlib
+from typing import List
+
+import pytest
+
+from graphgen.bases.base_llm_client import BaseLLMClient
+from graphgen.bases.datatypes import Token
+from graphgen.models import JsonKVStorage, NetworkXStorage
+from graphgen.operators.judge import DEFAULT_LOSS, judge_statement
+from graphgen.templates import STATEMENT_JUDGEMENT_PROMPT
+from graphgen.utils import yes_no_loss_entropy
+
+
+class StubTrainee(BaseLLMClient):
+    """Scores a statement with a P(yes) derived from its text, records batch sizes."""
+
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    async def generate_answer(self, text, history=None, **extra):
+        raise NotImplementedError
+
+    async def generate_topk_per_token(self, text, history=None, **extra):
+        yes = 0.05 + 0.9 * (zlib.crc32(text.encode()) % 1000) / 1000
+        return [Token("yes", yes, top_candidates=[Token("yes", yes)])]
+
+    async def generate_topk_per_token_batch(self, texts, history=None, **extra):
+        self.batch_sizes.append(len(texts))
+        return await super().generate_topk_per_token_batch(texts, history, **extra)
+
+    async def generate_inputs_prob(self, text, history=None, **extra):
+        raise NotImplementedError
+
+
+REPHRASED = {
+    f"{kind} {i}": [
+        [f"{kind} {i} statement {j}", "yes" if j % 2 == 0 else "no"]
+        for j in range(i % 3 + 1)
+    ]
+    for kind in ("edge", "node")
+    for i in range(8)
+}
+
+
+async def _judge(working_dir, batch_size: int):
+    graph = NetworkXStorage(str(working_dir), namespace="graph")
+    for i in range(8):
+        await graph.upsert_node(str(i), {"description": f"node {i}"})
+        await graph.upsert_edge(str(i), str((i + 1) % 8), {"description": f"edge {i}"})
+    # judged without rephrasings
+    await graph.upsert_node("x", {"description": "no rephrasing"})
+
+    rephrase = JsonKVStorage(str(working_dir), namespace="rephrase")
+    await rephrase.upsert(REPHRASED)
+
+    trainee = StubTrainee()
+    await judge_statement(trainee, graph, rephrase, batch_size=batch_size)
+    edges = {
+        data["description"]: data["loss"] for _, _, data in await graph.get_all_edges()
+    }
+    nodes = {
+        data["description"]: data["loss"] for _, data in await graph.get_all_nodes()
+    }
+    return edges, nodes, trainee.batch_sizes
+
+
+async def _sequential_loss(description: str) -> float:
+    """The loss of the former per-statement path."""
+    trainee = StubTrainee()
+    judgements, gts = [], []
+    for statement, gt in REPHRASED[description]:
+        judgement = await trainee.generate_topk_per_token(
+            STATEMENT_JUDGEMENT_PROMPT["TEMPLATE"].format(statement=statement)
+        )
+        judgements.append(judgement[0].top_candidates)
+        gts.append(gt)
+    return yes_no_loss_entropy(judgements, gts)
+
+
+def test_batches_match_sequential_scoring(tmp_path):
+    edges, nodes, batch_sizes = asyncio.run(_judge(tmp_path / "batched", 4))
+    single_edges, single_nodes, single_sizes = asyncio.run(
+        _judge(tmp_path / "single", 1)
+    )
+
+    assert edges == single_edges
+    assert nodes == single_nodes
+    assert set(single_sizes) == {1}
+    # statements of several descriptions share a request
+    assert max(batch_sizes) == 4
+    assert len(batch_sizes) < len(single_sizes)
+
+    for description, loss in {**edges, **nodes}.items():
+        if description == "no rephrasing":
+            assert loss == DEFAULT_LOSS
+        else:
+            assert loss == pytest.approx(asyncio.run(_sequential_loss(description)))
@@ -0,0 +1,33 @@
+import asyncio
+
+from graphgen.models import NetworkXStorage
+from graphgen.operators.quiz import _memoize_languages
+
+
+def test_languages_are_backfilled(tmp_path):
+    # pylint: disable=protected-access
+    graph = NetworkXStorage(str(tmp_path), namespace="graph")
+
+    async def _run():
+        await graph.upsert_node("A", {"description": "node in English"})
+        await graph.upsert_node("B", {"description": "中文节点", "language": "en"})
+        await graph.upsert_edge("A", "B", {"description": "中文的边"})
+        await graph.index_done_callback()
+
+        edges = await graph.get_all_edges()
+        nodes = await graph.get_all_nodes()
+        await _memoize_languages(graph, edges, nodes)
+        return edges, nodes
+
+    edges, nodes = asyncio.run(_run())
+    assert [data["language"] for _, _, data in edges] == ["zh"]
+    assert {node_id: data["language"] for node_id, data in nodes} == {
+        "A": "en",
+        "B": "en",
+    }
+
+    # the backfilled languages are persisted, recorded ones are kept
+    reloaded = NetworkXStorage(str(tmp_path), namespace="graph")
+    assert asyncio.run(reloaded.get_node("A"))["language"] == "en"
+    assert asyncio.run(reloaded.get_node("B"))["language"] == "en"
+    assert asyncio.run(reloaded.get_edge("A", "B"))["language"] == "zh"
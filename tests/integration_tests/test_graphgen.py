@@ -0,0 +1,133 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import List
+
+import pytest
+
+import graphgen.graphgen as graphgen_module
+from graphgen.bases import BaseTokenizer
+from graphgen.graphgen import GraphGen
+
+
+@dataclass
+class CharTokenizer(BaseTokenizer):
+    model_name: str = "char"
+
+    def encode(self, text: str) -> List[int]:
+        return [ord(c) for c in text]
+
+    def decode(self, token_ids: List[int]) -> str:
+        return "".join(chr(i) for i in token_ids)
+
+
+def _graph_gen(working_dir: str) -> GraphGen:
+    return GraphGen(
+        working_dir=working_dir,
+        tokenizer_instance=CharTokenizer(),
+        # never called, build_kg is replaced
+        synthesizer_llm_client=object(),
+        trainee_llm_client=object(),
+    )
+
+
+def test_insert_after_clear_with_dedup(tmp_path, monkeypatch):
+    extracted = []
+
+    async def fake_build_kg(chunks, extraction_storage, **_):
+        extracted.append([chunk.id for chunk in chunks])
+        await extraction_storage.update(
+            {chunk.id: {"status": "merged"} for chunk in chunks}
+        )
+        return True
+
+    monkeypatch.setattr(graphgen_module, "build_kg", fake_build_kg)
+    input_file = tmp_path / "input.jsonl"
+    input_file.write_text(
+        json.dumps({"content": "A short document about knowledge graphs."}) + "\n",
+        encoding="utf-8",
+    )
+    read_config = {"input_file": str(input_file)}
+    split_config = {"chunk_size": 1024, "chunk_overlap": 0}
+    dedup_config = {"enabled": True}
+
+    graph_gen = _graph_gen(str(tmp_path / "cache"))
+    graph_gen.insert(read_config, split_config, dedup_config=dedup_config)
+    graph_gen.clear()
+    graph_gen.insert(read_config, split_config, dedup_config=dedup_config)
+
+    assert len(extracted) == 2
+    assert extracted[0] == extracted[1] and len(extracted[0]) == 1
+
+
+def test_resume_unmerged_chunks(tmp_path, monkeypatch):
+    extracted = []
+
+    async def failing_build_kg(chunks, **_):
+        raise RuntimeError("interrupted")
+
+    async def fake_build_kg(chunks, extraction_storage, **_):
+        extracted.append([chunk.id for chunk in chunks])
+        await extraction_storage.update(
+            {chunk.id: {"status": "merged"} for chunk in chunks}
+        )
+        return True
+
+    input_file = tmp_path / "input.jsonl"
+    input_file.write_text(
+        json.dumps({"content": "A short document about knowledge graphs."}) + "\n",
+        encoding="utf-8",
+    )
+    read_config = {"input_file": str(input_file)}
+    split_config = {"chunk_size": 1024, "chunk_overlap": 0}
+
+    monkeypatch.setattr(graphgen_module, "build_kg", failing_build_kg)
+    graph_gen = _graph_gen(str(tmp_path / "cache"))
+    with pytest.raises(RuntimeError):
+        graph_gen.insert(read_config, split_config)
+
+    monkeypatch.setattr(graphgen_module, "build_kg", fake_build_kg)
+    # a new instance finds the pending chunk in the storage
+    graph_gen = _graph_gen(str(tmp_path / "cache"))
+    graph_gen.insert(read_config, split_config)
+    graph_gen.insert(read_config, split_config)
+
+    assert len(extracted) == 1 and len(extracted[0]) == 1
+
+
+class FakeLLMClient:
+    async def generate_answer(self, text: str, **_) -> str:
+        return f"Question: What is it? Answer: {text.split(':')[-1].strip()}"
+
+
+def test_generate_stores_formatted_qas(tmp_path):
+    graph_gen = GraphGen(
+        working_dir=str(tmp_path / "cache"),
+        tokenizer_instance=CharTokenizer(),
+        synthesizer_llm_client=FakeLLMClient(),
+        trainee_llm_client=object(),
+        qa_backend="jsonl",
+    )
+
+    async def _build_graph():
+        await graph_gen.graph_storage.upsert_node(
+            "A", {"description": "the first node", "language": "en"}
+        )
+        await graph_gen.graph_storage.upsert_node(
+            "B", {"description": "the second node", "language": "en"}
+        )
+
+    asyncio.run(_build_graph())
+    graph_gen.generate(
+        {"method_params": {}}, {"mode": "atomic", "data_format": "Alpaca"}
+    )
+
+    items = graph_gen.qa_storage.data
+    assert sorted(item["output"] for item in items) == [
+        "the first node",
+        "the second node",
+    ]
+    with pytest.raises(ValueError):
+        graph_gen.generate(
+            {"method_params": {}}, {"mode": "atomic", "data_format": "Unknown"}
+        )
@@ -0,0 +1,58 @@
+import random
+
+# graphgen.utils cannot be the first graphgen package imported
+import graphgen.bases  # pylint: disable=unused-import
+from graphgen.utils.detect_lang import (
+    MAX_DETECT_CHARS,
+    detect_main_language,
+    detect_main_language_batch,
+    get_language,
+)
+
+
+def _old_detect_main_language(text: str) -> str:
+    """The per-character counting used before the regexes."""
+    text = "".join(char for char in text if char.strip())
+    chinese_count = sum(1 for char in text if "一" <= char <= "鿿")
+    english_count = sum(1 for char in text if char.isascii() and char.isalpha())
+    total = chinese_count + english_count
+    if total == 0:
+        return "en"
+    return "zh" if chinese_count / total >= 0.5 else "en"
+
+
+def _mixed_texts(num_texts: int):
+    rng = random.Random(0)
+    # letters, chinese, full-width, accented, digits, punctuation and spaces
+    alphabet = "abcXYZ一二三龥鿿〇Ａé0 ，。!?\n"
+    texts = ["", " ", "123", "中文 and English", "中文English"]
+    texts += [
+        "".join(rng.choice(alphabet) for _ in range(rng.randrange(1, 60)))
+        for _ in range(num_texts)
+    ]
+    return texts
+
+
+def test_matches_old_counting():
+    texts = _mixed_texts(2000)
+    expected = [_old_detect_main_language(text) for text in texts]
+
+    assert [detect_main_language(text) for text in texts] == expected
+    assert detect_main_language_batch(texts, max_chars=None) == expected
+    assert "zh" in expected and "en" in expected
+
+
+def test_only_the_head_is_counted():
+    text = "中" * MAX_DETECT_CHARS + "a" * (MAX_DETECT_CHARS + 1)
+
+    assert detect_main_language(text) == "zh"
+    assert detect_main_language(text, max_chars=None) == "en"
+    assert detect_main_language_batch([text, "abc"]) == ["zh", "en"]
+    assert detect_main_language_batch([text], max_chars=None) == ["en"]
+    assert detect_main_language_batch([]) == []
+
+
+def test_get_language_prefers_the_recorded_attribute():
+    assert get_language({"description": "English text", "language": "zh"}) == "zh"
+    assert get_language({"description": "English text"}) == "en"
+    assert get_language({"description": "中文描述"}) == "zh"
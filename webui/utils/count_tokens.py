@@ -38,14 +38,14 @@ def count_tokens(file, tokenizer_name, data_frame):
     tokenizer = Tokenizer(tokenizer_name)
 
     # Count tokens
-    token_count = 0
-
-    for item in data:
-        if isinstance(item, dict):
-            content = item.get("content", "")
-        else:
-            content = item
-        token_count += len(tokenizer.encode(content))
+    token_count = sum(
+        tokenizer.count_tokens_batch(
+            [
+                item.get("content", "") if isinstance(item, dict) else item
+                for item in data
+            ]
+        )
+    )
 
     _update_data = [[str(token_count), str(token_count * 50), "N/A"]]
 